@@ -0,0 +1,60 @@
+import gc
+
+
+class AllocProbe:
+    """Measure heap bytes allocated inside a with-block.
+
+    On MicroPython the probe disables the collector for the block and
+    takes the gc.mem_alloc() delta, which counts every allocation. On
+    CPython (no mem_alloc) it falls back to tracemalloc's peak, so host
+    numbers are only indicative.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.last = 0
+        self.min = None
+        self.max = 0
+        self.total = 0
+        self.count = 0
+        self._start = 0
+        self._tracemalloc = None
+        if not hasattr(gc, "mem_alloc"):
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+
+    def __enter__(self):
+        if self._tracemalloc is None:
+            gc.disable()
+            self._start = gc.mem_alloc()
+        else:
+            if not self._tracemalloc.is_tracing():
+                self._tracemalloc.start()
+            self._tracemalloc.reset_peak()
+            self._start = self._tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._tracemalloc is None:
+            used = gc.mem_alloc() - self._start
+            gc.enable()
+        else:
+            used = self._tracemalloc.get_traced_memory()[1] - self._start
+        self.last = used
+        self.total += used
+        self.count += 1
+        if self.min is None or used < self.min:
+            self.min = used
+        if used > self.max:
+            self.max = used
+        return False
+
+    def stats(self):
+        """Return allocation statistics in bytes"""
+        return {
+            "name": self.name,
+            "last": self.last,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total // self.count if self.count else 0,
+        }
@@ -0,0 +1,304 @@
+import json
+import numpy as np
+import compact
+
+# Host-side analytics over the weather_readings history (needs NumPy;
+# not for the Pico). Readings are held as sorted columnar arrays so
+# range queries, resampling, rolling windows and per-station aggregates
+# run as vectorized NumPy operations instead of Python loops over dicts.
+#
+#     history = History.from_file("export.json")
+#     hourly = history.between(start, end).resample(3600)
+#     per_station = history.aggregate()
+
+FIELDS = ("temperature", "humidity", "light_raw")
+
+# Same bands as get_light_level/get_weather_description/get_weather_quality
+# in weather_station.py - keep them in sync
+LIGHT_BOUNDS = (5000, 15000, 30000, 50000)        # level rises when raw > bound
+LIGHT_LEVELS = ("Very Dark", "Dark", "Dim", "Bright", "Very Bright")
+DESCRIPTION_BOUNDS = (5, 15, 25, 30)              # description rises when temp >= bound
+DESCRIPTIONS = ("Very Cold", "Cold", "Mild", "Warm", "Hot")
+QUALITIES = ("nice", "okay", "bad")
+
+
+def light_level(raw):
+    """Vectorized get_light_level: raw ADC values -> label array"""
+    raw = np.asarray(raw, dtype=np.float64)
+    codes = np.searchsorted(LIGHT_BOUNDS, raw, side="left")
+    codes[np.isnan(raw)] = 0             # NaN compares False everywhere
+    return np.asarray(LIGHT_LEVELS)[codes]
+
+
+def weather_description(temp, humidity=None):
+    """Vectorized get_weather_description (humidity is unused, as there)"""
+    temp = np.asarray(temp, dtype=np.float64)
+    codes = np.searchsorted(DESCRIPTION_BOUNDS, temp, side="right")
+    return np.asarray(DESCRIPTIONS)[codes]
+
+
+def weather_quality(temp, humidity):
+    """Vectorized get_weather_quality -> array of "nice"/"okay"/"bad" """
+    temp = np.asarray(temp, dtype=np.float64)
+    humidity = np.asarray(humidity, dtype=np.float64)
+    bad = (temp < 5) | (temp > 35) | (humidity > 80)
+    okay = (temp < 10) | (temp > 30) | (humidity > 70)
+    codes = np.where(bad, 2, np.where(okay, 1, 0))
+    return np.asarray(QUALITIES)[codes]
+
+
+def _reduce_runs(values, starts):
+    """Aggregate consecutive runs of values beginning at starts.
+
+    NaN (missing) values are left out; runs with no values give NaN.
+    """
+    if not len(values):
+        empty = np.zeros(0)
+        return {"count": np.zeros(0, np.int64), "mean": empty, "min": empty, "max": empty}
+    valid = ~np.isnan(values)
+    count = np.add.reduceat(valid.astype(np.int64), starts)
+    total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    low = np.minimum.reduceat(np.where(valid, values, np.inf), starts)
+    high = np.maximum.reduceat(np.where(valid, values, -np.inf), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    none = count == 0
+    low[none] = np.nan
+    high[none] = np.nan
+    return {"count": count, "mean": mean, "min": low, "max": high}
+
+
+class History:
+    """Weather readings as columnar arrays sorted by timestamp.
+
+    Columns: timestamp (int64 seconds), temperature, humidity and
+    light_raw (float64, NaN where a reading lacked the field) and
+    station (int32 index into stations). Slices returned by between()
+    are views, so narrowing a range does not copy the data.
+    """
+
+    def __init__(self, timestamp, temperature, humidity, light_raw,
+                 station=None, stations=("default",), presorted=False):
+        timestamp = np.asarray(timestamp, dtype=np.int64)
+        if station is None:
+            station = np.zeros(len(timestamp), dtype=np.int32)
+        columns = [timestamp,
+                   np.asarray(temperature, dtype=np.float64),
+                   np.asarray(humidity, dtype=np.float64),
+                   np.asarray(light_raw, dtype=np.float64),
+                   np.asarray(station, dtype=np.int32)]
+        if not presorted:
+            order = np.argsort(timestamp, kind="stable")
+            columns = [column[order] for column in columns]
+        self.timestamp, self.temperature, self.humidity, self.light_raw, self.station = columns
+        self.stations = tuple(stations)
+
+    # Loading --------------------------------------------------------------
+
+    @classmethod
+    def from_records(cls, records, station="default"):
+        """Build from reading dicts; a "station" field overrides station"""
+        records = list(records)
+        names = [station]
+        index = {station: 0}
+        codes = np.zeros(len(records), dtype=np.int32)
+        for i, record in enumerate(records):
+            name = record.get("station")
+            if name is not None and name != station:
+                if name not in index:
+                    index[name] = len(names)
+                    names.append(name)
+                codes[i] = index[name]
+
+        def column(field):
+            return np.fromiter((np.nan if r.get(field) is None else r[field] for r in records),
+                               dtype=np.float64, count=len(records))
+
+        return cls(column("timestamp").astype(np.int64), column("temperature"),
+                   column("humidity"), column("light_raw"), codes, names)
+
+    @classmethod
+    def from_firebase(cls, tree, station="default"):
+        """Build from a Firebase export or the weather_readings node.
+
+        tree may be the whole database (readings under weather_readings,
+        and optionally stations/<id>/weather_readings) or just the
+        push-key -> reading mapping. Compact records are expanded.
+        """
+        if not isinstance(tree, dict):
+            return cls.from_records([], station)
+        records = []
+        if "weather_readings" in tree or "stations" in tree:
+            records.extend(compact.decode_node(tree.get("weather_readings")))
+            for name, node in (tree.get("stations") or {}).items():
+                for reading in compact.decode_node((node or {}).get("weather_readings")):
+                    if "station" not in reading:
+                        reading = dict(reading, station=name)
+                    records.append(reading)
+        else:
+            records = compact.decode_node(tree)
+        records = [r for r in records if isinstance(r, dict) and "timestamp" in r]
+        return cls.from_records(records, station)
+
+    @classmethod
+    def from_file(cls, path, station="default"):
+        """Load a Firebase JSON export from disk"""
+        with open(path) as f:
+            return cls.from_firebase(json.load(f), station)
+
+    @classmethod
+    def concat(cls, histories):
+        """Merge several histories, unifying their station names"""
+        names = []
+        index = {}
+        parts = []
+        for history in histories:
+            remap = np.empty(len(history.stations), dtype=np.int32)
+            for i, name in enumerate(history.stations):
+                if name not in index:
+                    index[name] = len(names)
+                    names.append(name)
+                remap[i] = index[name]
+            parts.append((history, remap[history.station]))
+        if not parts:
+            return cls([], [], [], [])
+        return cls(np.concatenate([h.timestamp for h, _ in parts]),
+                   np.concatenate([h.temperature for h, _ in parts]),
+                   np.concatenate([h.humidity for h, _ in parts]),
+                   np.concatenate([h.light_raw for h, _ in parts]),
+                   np.concatenate([s for _, s in parts]), names)
+
+    # Queries ----------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def column(self, name):
+        """Return one column array by name"""
+        return getattr(self, name)
+
+    def _take(self, index, presorted=True):
+        return History(self.timestamp[index], self.temperature[index], self.humidity[index],
+                       self.light_raw[index], self.station[index], self.stations, presorted)
+
+    def between(self, start=None, end=None):
+        """Readings with start <= timestamp < end (binary search, no copy)"""
+        lo = 0 if start is None else np.searchsorted(self.timestamp, start, side="left")
+        hi = len(self) if end is None else np.searchsorted(self.timestamp, end, side="left")
+        return self._take(slice(lo, hi))
+
+    def for_station(self, name):
+        """Readings of one station"""
+        if name not in self.stations:
+            return self._take(slice(0, 0))
+        return self._take(self.station == self.stations.index(name))
+
+    def resample(self, interval, fields=FIELDS, origin=0, fill=False):
+        """Aggregate into buckets [origin + k*interval, origin + (k+1)*interval).
+
+        Returns {"start": bucket starts, field: {"count", "mean", "min",
+        "max"}}. Only buckets holding readings are returned, unless fill
+        is True: then every bucket between the first and last reading is
+        returned, with count 0 and NaN stats for the empty ones.
+        """
+        bucket = (self.timestamp - origin) // interval
+        # Timestamps are sorted, so each bucket is one run of rows
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]]) if len(bucket) else \
+            np.zeros(0, dtype=np.int64)
+        keys = bucket[starts]
+        result = {"start": keys * interval + origin}
+        for field in fields:
+            result[field] = _reduce_runs(self.column(field), starts)
+        if fill and len(keys):
+            grid = np.arange(keys[0], keys[-1] + 1)
+            slot = keys - keys[0]
+            result["start"] = grid * interval + origin
+            for field in fields:
+                stats = result[field]
+                filled = {"count": np.zeros(len(grid), dtype=np.int64)}
+                filled["count"][slot] = stats["count"]
+                for name in ("mean", "min", "max"):
+                    filled[name] = np.full(len(grid), np.nan)
+                    filled[name][slot] = stats[name]
+                result[field] = filled
+        return result
+
+    def rolling(self, field, window):
+        """Trailing time-window statistics for every reading.
+
+        For each row, the window covers readings with timestamp in
+        (t - window, t]. Returns {"count", "mean", "std", "min", "max"}.
+        Mean and std use prefix sums (O(n)); min/max reduce each window.
+        """
+        values = self.column(field)
+        n = len(values)
+        if not n:
+            empty = np.zeros(0)
+            return {"count": np.zeros(0, np.int64), "mean": empty, "std": empty,
+                    "min": empty, "max": empty}
+        lo = np.searchsorted(self.timestamp, self.timestamp - window, side="right")
+        hi = np.searchsorted(self.timestamp, self.timestamp, side="right")
+
+        valid = ~np.isnan(values)
+        clean = np.where(valid, values, 0.0)
+        count = np.r_[0, np.cumsum(valid)]
+        total = np.r_[0.0, np.cumsum(clean)]
+        squares = np.r_[0.0, np.cumsum(clean * clean)]
+        count = count[hi] - count[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (total[hi] - total[lo]) / count
+            var = (squares[hi] - squares[lo]) / count - mean * mean
+        std = np.sqrt(np.maximum(var, 0.0))
+
+        # reduceat over interleaved [lo, hi) pairs; a sentinel covers hi == n
+        bounds = np.empty(2 * n, dtype=np.int64)
+        bounds[0::2] = lo
+        bounds[1::2] = hi
+        low = np.minimum.reduceat(np.r_[np.where(valid, values, np.inf), np.inf], bounds)[0::2]
+        high = np.maximum.reduceat(np.r_[np.where(valid, values, -np.inf), -np.inf], bounds)[0::2]
+        low[count == 0] = np.nan
+        high[count == 0] = np.nan
+        return {"count": count, "mean": mean, "std": std, "min": low, "max": high}
+
+    def aggregate(self, fields=FIELDS, interval=None, origin=0):
+        """Per-station aggregates, optionally per station and time bucket.
+
+        Returns {"station": names, ["start": bucket starts,] field:
+        {"count", "mean", "min", "max"}} with one entry per group.
+        """
+        if interval is None:
+            keys = self.station.astype(np.int64)
+        else:
+            bucket = (self.timestamp - origin) // interval
+            base = bucket.min() if len(bucket) else 0
+            span = (bucket.max() - base + 1) if len(bucket) else 1
+            keys = self.station.astype(np.int64) * span + (bucket - base)
+
+        # Sort once by group so every group becomes one run of rows
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else \
+            np.zeros(0, dtype=np.int64)
+        group_keys = keys[starts]
+        result = {}
+        for field in fields:
+            result[field] = _reduce_runs(self.column(field)[order], starts)
+        if interval is None:
+            station = group_keys
+        else:
+            station = group_keys // span
+            result["start"] = (group_keys % span + base) * interval + origin
+        result["station"] = np.asarray(self.stations, dtype=object)[station] if len(station) else \
+            np.zeros(0, dtype=object)
+        return result
+
+    # Derived labels ---------------------------------------------------------
+
+    def light_levels(self):
+        return light_level(self.light_raw)
+
+    def descriptions(self):
+        return weather_description(self.temperature)
+
+    def qualities(self):
+        return weather_quality(self.temperature, self.humidity)
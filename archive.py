@@ -0,0 +1,492 @@
+import csv
+import json
+import os
+import struct
+from json_stream import LIGHT_LEVELS
+import compact
+try:
+    import numpy as np
+except ImportError:
+    np = None                        # Writing works without NumPy; reading needs it
+
+# Long-term archive of readings in append-only binary segment files
+# (host side). Each station has its own directory of segments:
+#
+#   <root>/<station>/<first timestamp>-<n>.wseg   header + fixed records
+#   <root>/<station>/<first timestamp>-<n>.widx   sparse timestamp index
+#
+# Records within a segment never go back in time, so a segment can be
+# searched by timestamp. The index holds (timestamp, record number) for
+# every INDEX_STRIDE-th record: a seek is a binary search of the small
+# index and then of one stride of records. Segments are read through
+# numpy.memmap, so range queries return views of the page cache without
+# copying or parsing anything.
+
+MAGIC = b"WA01"
+VERSION = 1
+HEADER_FORMAT = "<4sHHI32s"          # magic, version, record size, created, station
+HEADER_SIZE = 64
+
+# One reading: timestamp, temperature x10, humidity x10, light_raw,
+# light level (index into LIGHT_LEVELS, 255 = unknown), flags
+RECORD_FORMAT = "<IhHHBB"
+# Flag bits for values the reading did not have (a failed sensor); the
+# value itself is stored as 0
+NO_TEMPERATURE = 1
+NO_HUMIDITY = 2
+NO_LIGHT = 4
+MISSING_FLAGS = (("temperature", NO_TEMPERATURE), ("humidity", NO_HUMIDITY),
+                 ("light_raw", NO_LIGHT))
+SCALES = {"temperature": 10, "humidity": 10, "light_raw": 1}
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+INDEX_FORMAT = "<II"                 # timestamp, record number
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+INDEX_STRIDE = 4096                  # Records per index entry
+
+SEGMENT_RECORDS = 1 << 22            # Rotate after ~4M records (48 MB)
+SEGMENT_SUFFIX = ".wseg"
+INDEX_SUFFIX = ".widx"
+NO_LEVEL = 255
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ("timestamp", "<u4"), ("temperature", "<i2"), ("humidity", "<u2"),
+        ("light_raw", "<u2"), ("light_level", "u1"), ("flags", "u1"),
+    ])
+    INDEX_DTYPE = np.dtype([("timestamp", "<u4"), ("record", "<u4")])
+
+
+def _scaled(value, scale=10):
+    """Scale a sensor value for fixed-point storage (None is stored as 0)"""
+    return 0 if value is None else int(round(value * scale))
+
+
+def _missing(reading):
+    """Flag bits for the fields a reading lacks"""
+    flags = 0
+    for field, bit in MISSING_FLAGS:
+        if reading.get(field) is None:
+            flags |= bit
+    return flags
+
+
+def values(records, field):
+    """temperature, humidity or light_raw of a RECORD_DTYPE array as float64.
+
+    Values are unscaled (C, %, ADC counts), with NaN where the reading
+    lacked the field.
+    """
+    _require_numpy()
+    result = records[field] / SCALES[field]
+    result[(records["flags"] & dict(MISSING_FLAGS)[field]) != 0] = np.nan
+    return result
+
+
+def _level_code(level):
+    """Index of a light level label (NO_LEVEL if unknown)"""
+    try:
+        return LIGHT_LEVELS.index(level)
+    except ValueError:
+        return NO_LEVEL
+
+
+def _check_station(station):
+    """Station IDs become directory names, so keep them plain"""
+    if not station or not all(c.isalnum() or c in "-_" for c in station):
+        raise ValueError(f"Invalid station ID: {station!r}")
+    return station
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Reading the archive needs NumPy")
+
+
+class SegmentWriter:
+    """Appends records to one segment and its sparse index.
+
+    Opening an existing segment drops a torn trailing record (from a
+    crash mid-write) and adds index entries that were not written.
+    """
+
+    def __init__(self, path, station="", created=0):
+        self.path = path
+        self.index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        if not os.path.exists(path):
+            header = bytearray(HEADER_SIZE)
+            struct.pack_into(HEADER_FORMAT, header, 0, MAGIC, VERSION, RECORD_SIZE,
+                             int(created), station.encode())
+            with open(path, "wb") as f:
+                f.write(header)
+            open(self.index_path, "wb").close()
+
+        size = os.path.getsize(path)
+        self.count = (size - HEADER_SIZE) // RECORD_SIZE
+        if size != HEADER_SIZE + self.count * RECORD_SIZE:
+            os.truncate(path, HEADER_SIZE + self.count * RECORD_SIZE)
+        self.data = open(path, "ab")
+        self.last_timestamp = None
+        if self.count:
+            self.last_timestamp = self._read_timestamp(self.count - 1)
+
+        # Complete the index up to the current record count
+        entries = 0
+        if os.path.exists(self.index_path):
+            entries = os.path.getsize(self.index_path) // INDEX_SIZE
+            os.truncate(self.index_path, entries * INDEX_SIZE)
+        self.index = open(self.index_path, "ab")
+        expected = (self.count + INDEX_STRIDE - 1) // INDEX_STRIDE
+        for entry in range(entries, expected):
+            record = entry * INDEX_STRIDE
+            self.index.write(struct.pack(INDEX_FORMAT, self._read_timestamp(record), record))
+
+    def _read_timestamp(self, record):
+        with open(self.path, "rb") as f:
+            f.seek(HEADER_SIZE + record * RECORD_SIZE)
+            return struct.unpack("<I", f.read(4))[0]
+
+    def append(self, timestamp, temperature, humidity, light_raw, level=NO_LEVEL, flags=0):
+        """Append one record (values already in storage units)"""
+        if self.count % INDEX_STRIDE == 0:
+            self.index.write(struct.pack(INDEX_FORMAT, timestamp, self.count))
+        self.data.write(struct.pack(RECORD_FORMAT, timestamp, temperature, humidity,
+                                    light_raw, level, flags))
+        self.count += 1
+        self.last_timestamp = timestamp
+
+    def append_array(self, records):
+        """Append a sorted RECORD_DTYPE array in one write"""
+        _require_numpy()
+        first = self.count
+        stride = np.arange((-first) % INDEX_STRIDE, len(records), INDEX_STRIDE)
+        index = np.empty(len(stride), dtype=INDEX_DTYPE)
+        index["timestamp"] = records["timestamp"][stride]
+        index["record"] = stride + first
+        self.data.write(records.tobytes())
+        self.index.write(index.tobytes())
+        self.count += len(records)
+        if len(records):
+            self.last_timestamp = int(records["timestamp"][-1])
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class Segment:
+    """Read-only, memory-mapped view of one segment file"""
+
+    def __init__(self, path):
+        _require_numpy()
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, record_size, created, station = struct.unpack(
+                HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC or record_size != RECORD_SIZE:
+            raise ValueError(f"Not an archive segment: {path}")
+        self.station = station.rstrip(b"\0").decode()
+        self.created = created
+        self.count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+        if self.count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r",
+                                     offset=HEADER_SIZE, shape=(self.count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+        # Sparse index; entries missing after a crash are taken from the data
+        index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        try:
+            index = np.fromfile(index_path, dtype=INDEX_DTYPE)
+        except OSError:
+            index = np.zeros(0, dtype=INDEX_DTYPE)
+        expected = (self.count + INDEX_STRIDE - 1) // INDEX_STRIDE
+        if len(index) < expected:
+            index = np.zeros(expected, dtype=INDEX_DTYPE)
+            index["record"] = np.arange(expected) * INDEX_STRIDE
+            index["timestamp"] = self.records["timestamp"][index["record"]]
+        self.index = index[:expected]
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def first_timestamp(self):
+        return int(self.records["timestamp"][0]) if self.count else None
+
+    @property
+    def last_timestamp(self):
+        return int(self.records["timestamp"][-1]) if self.count else None
+
+    def seek(self, timestamp):
+        """Number of the first record with a timestamp >= timestamp"""
+        if not self.count:
+            return 0
+        # The index narrows the search to one stride of records
+        entry = int(np.searchsorted(self.index["timestamp"], timestamp, side="left"))
+        if entry == 0:
+            return 0
+        lo = int(self.index["record"][entry - 1])
+        hi = min(lo + INDEX_STRIDE, self.count) if entry == len(self.index) else \
+            int(self.index["record"][entry])
+        return lo + int(np.searchsorted(self.records["timestamp"][lo:hi], timestamp, side="left"))
+
+    def range(self, start=None, end=None):
+        """Records with start <= timestamp < end, as a memmap view"""
+        lo = 0 if start is None else self.seek(start)
+        hi = self.count if end is None else self.seek(end)
+        return self.records[lo:hi]
+
+
+class Archive:
+    """Per-station directories of rotating, append-only segments.
+
+    Appends go to the newest segment of the station. A new segment is
+    started when it reaches max_records or when a reading is older than
+    the last one written (e.g. replayed from the offline queue), so
+    every segment stays sorted by time.
+    """
+
+    def __init__(self, root, max_records=SEGMENT_RECORDS):
+        self.root = root
+        self.max_records = max_records
+        self.writers = {}
+        os.makedirs(root, exist_ok=True)
+
+    # Writing ----------------------------------------------------------------
+
+    def _segment_paths(self, station):
+        directory = os.path.join(self.root, _check_station(station))
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return []
+        return [os.path.join(directory, name) for name in names if name.endswith(SEGMENT_SUFFIX)]
+
+    def _new_segment(self, station, timestamp):
+        """Open a writer on a new segment starting at timestamp"""
+        directory = os.path.join(self.root, station)
+        os.makedirs(directory, exist_ok=True)
+        n = 0
+        while True:
+            path = os.path.join(directory, "%010d-%04d%s" % (timestamp, n, SEGMENT_SUFFIX))
+            if not os.path.exists(path):
+                break
+            n += 1
+        return SegmentWriter(path, station, timestamp)
+
+    def _writer(self, station, timestamp, count=1):
+        """Writer that can take count records starting at timestamp"""
+        writer = self.writers.get(station)
+        if writer is None:
+            paths = self._segment_paths(station)
+            if paths:
+                writer = SegmentWriter(paths[-1], station)
+        if writer is not None and (
+                writer.count + count > self.max_records or
+                (writer.last_timestamp is not None and timestamp < writer.last_timestamp)):
+            writer.close()
+            writer = None
+        if writer is None:
+            writer = self._new_segment(station, timestamp)
+        self.writers[station] = writer
+        return writer
+
+    def append(self, station, reading):
+        """Archive one reading dict (as returned by collect_sensor_data)"""
+        timestamp = int(reading["timestamp"])
+        writer = self._writer(_check_station(station), timestamp)
+        writer.append(timestamp, _scaled(reading.get("temperature")),
+                      _scaled(reading.get("humidity")), _scaled(reading.get("light_raw"), 1),
+                      _level_code(reading.get("light_level")), _missing(reading))
+
+    def append_array(self, station, records):
+        """Archive a RECORD_DTYPE array (sorted here if needed)"""
+        _require_numpy()
+        _check_station(station)
+        if len(records) > 1 and np.any(np.diff(records["timestamp"].astype(np.int64)) < 0):
+            records = records[np.argsort(records["timestamp"], kind="stable")]
+        done = 0
+        while done < len(records):
+            writer = self._writer(station, int(records["timestamp"][done]))
+            n = min(len(records) - done, self.max_records - writer.count)
+            writer.append_array(records[done:done + n])
+            done += n
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Reading ----------------------------------------------------------------
+
+    def stations(self):
+        """Station IDs that have a directory in the archive"""
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    def segments(self, station):
+        """Memory-mapped segments of a station, oldest first"""
+        self.flush()
+        return [Segment(path) for path in self._segment_paths(station)]
+
+    def scan(self, station=None, start=None, end=None):
+        """Yield (station, memmap view) for every segment overlapping the range.
+
+        Views come segment by segment; segments started after an
+        out-of-order reading may overlap in time with earlier ones.
+        """
+        for name in ([station] if station else self.stations()):
+            for segment in self.segments(name):
+                if not segment.count:
+                    continue
+                if end is not None and segment.first_timestamp >= end:
+                    continue
+                if start is not None and segment.last_timestamp < start:
+                    continue
+                view = segment.range(start, end)
+                if len(view):
+                    yield name, view
+
+    def read(self, station, start=None, end=None):
+        """Records of one station in a time range as one sorted array (copied)"""
+        _require_numpy()
+        views = [view for _, view in self.scan(station, start, end)]
+        if not views:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        records = np.concatenate(views)
+        if len(views) > 1:
+            records = records[np.argsort(records["timestamp"], kind="stable")]
+        return records
+
+    def history(self, start=None, end=None):
+        """All stations in a time range as an analytics.History"""
+        from analytics import History
+        parts = []
+        for name in self.stations():
+            records = self.read(name, start, end)
+            parts.append(History(records["timestamp"], values(records, "temperature"),
+                                 values(records, "humidity"), values(records, "light_raw"),
+                                 stations=(name,), presorted=True))
+        return History.concat(parts)
+
+
+def to_records(readings):
+    """Convert reading dicts to a RECORD_DTYPE array"""
+    _require_numpy()
+    records = np.zeros(len(readings), dtype=RECORD_DTYPE)
+    records["timestamp"] = [int(r["timestamp"]) for r in readings]
+    for field, bit in MISSING_FLAGS:
+        column = np.array([np.nan if r.get(field) is None else r[field] for r in readings],
+                          dtype=np.float64)
+        missing = np.isnan(column)
+        records[field] = np.round(np.where(missing, 0, column) * SCALES[field])
+        records["flags"] |= np.where(missing, bit, 0).astype(np.uint8)
+    records["light_level"] = [_level_code(r.get("light_level")) for r in readings]
+    return records
+
+
+def import_firebase(archive, source, station="default"):
+    """Import a Firebase export (path or parsed tree); return rows imported.
+
+    Readings under weather_readings go to station (or to their own
+    "station" field); readings under stations/<id>/weather_readings go
+    to <id>. Compact records are expanded. Readings without a timestamp
+    are skipped; other missing values are flagged (see values()).
+    """
+    if isinstance(source, str):
+        with open(source) as f:
+            source = json.load(f)
+    groups = {}
+
+    def add(name, readings):
+        for reading in compact.decode_node(readings):
+            if isinstance(reading, dict) and reading.get("timestamp") is not None:
+                groups.setdefault(reading.get("station") or name, []).append(reading)
+
+    if isinstance(source, dict) and ("weather_readings" in source or "stations" in source):
+        add(station, source.get("weather_readings"))
+        for name, node in (source.get("stations") or {}).items():
+            add(name, (node or {}).get("weather_readings"))
+    elif isinstance(source, dict):
+        add(station, source)
+
+    total = 0
+    for name, readings in groups.items():
+        archive.append_array(name, to_records(readings))
+        total += len(readings)
+    archive.flush()
+    return total
+
+
+def _cells(column, integer=False):
+    """CSV cells for a values() column: missing values become empty cells"""
+    return [None if value != value else int(value) if integer else value
+            for value in column.tolist()]
+
+
+def export_csv(archive, out, station=None, start=None, end=None, chunk=65536):
+    """Stream records as CSV to a file object; return rows written"""
+    _require_numpy()
+    writer = csv.writer(out)
+    writer.writerow(("station", "timestamp", "temperature", "humidity", "light_raw", "light_level"))
+    levels = list(LIGHT_LEVELS) + [""] * (256 - len(LIGHT_LEVELS))
+    rows = 0
+    for name, view in archive.scan(station, start, end):
+        for lo in range(0, len(view), chunk):
+            block = view[lo:lo + chunk]
+            writer.writerows(zip(
+                [name] * len(block),
+                block["timestamp"].tolist(),
+                _cells(values(block, "temperature")),
+                _cells(values(block, "humidity")),
+                _cells(values(block, "light_raw"), integer=True),
+                [levels[code] for code in block["light_level"].tolist()],
+            ))
+            rows += len(block)
+    return rows
+
+
+def main(argv=None):
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Binary readings archive")
+    parser.add_argument("root", help="archive directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="import a Firebase JSON export")
+    imp.add_argument("export")
+    imp.add_argument("--station", default="default")
+    exp = sub.add_parser("export", help="write CSV to stdout")
+    exp.add_argument("--station")
+    exp.add_argument("--start", type=int)
+    exp.add_argument("--end", type=int)
+    sub.add_parser("info", help="list stations and segments")
+    args = parser.parse_args(argv)
+
+    with Archive(args.root) as archive:
+        if args.command == "import":
+            print(f"Imported {import_firebase(archive, args.export, args.station)} readings")
+        elif args.command == "export":
+            export_csv(archive, sys.stdout, args.station, args.start, args.end)
+        else:
+            for name in archive.stations():
+                for segment in archive.segments(name):
+                    print(f"{name} {os.path.basename(segment.path)} {segment.count} records "
+                          f"{segment.first_timestamp}..{segment.last_timestamp}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Bytes allocated per upload body: json.dumps vs the streaming JsonWriter.
+Runs on CPython (tracemalloc) and on the Pico (gc.mem_alloc deltas).
+"""
+
+import sys
+import json
+import gc
+
+try:
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+except (ImportError, AttributeError):
+    pass                                 # On the Pico all modules sit in /
+
+from json_stream import JsonWriter
+
+READING = {
+    "timestamp": 1735689600,
+    "temperature": 23,
+    "humidity": 45,
+    "light_raw": 32000,
+    "light_level": "Bright",
+}
+PATCH = {
+    "weather_readings/-OFx3nYdxq2mVb8hQz1a": READING,
+    "latest_reading": READING,
+}
+
+
+def bytes_allocated(fn, arg, rounds=100):
+    """Average bytes allocated by fn(arg) over rounds calls"""
+    fn(arg)                              # Warm up caches and buffers
+    if hasattr(gc, "mem_alloc"):
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        for _ in range(rounds):
+            fn(arg)
+        used = gc.mem_alloc() - before
+        gc.enable()
+        return used // rounds
+
+    import tracemalloc
+    total = 0
+    tracemalloc.start()
+    for _ in range(rounds):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn(arg)
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return total // rounds
+
+
+def encode_before(payload):
+    """What the requests path does: dict -> str -> bytes"""
+    body = json.dumps(payload).encode()
+    return len(body)
+
+
+writer = JsonWriter()
+
+
+def encode_after(payload):
+    """Streaming encode into the reused buffer"""
+    return len(writer.encode(payload))
+
+
+def main():
+    print("payload        before  after  (bytes allocated per upload)")
+    for name, payload in (("reading", READING), ("multi-path", PATCH)):
+        before = bytes_allocated(encode_before, payload)
+        after = bytes_allocated(encode_after, payload)
+        print(f"{name:<14}{before:>7}{after:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Ingest-path benchmark suite, run on the host against the simulator.
+
+    python benchmarks/suite.py                        # compare with baseline.json
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --save-baseline        # accept current numbers
+
+Cases:
+    collect      collect_sensor_data() + LED classification per reading
+    encode       JsonWriter encoding of one reading / one multi-path PATCH
+    wire         upload bytes per reading, full vs compact schema
+    push, set    FirebaseClient round trips against FirebaseStandIn
+    loop         one full main() cycle (sensor, upload, rollups, gc)
+
+Times are wall-clock on the host, allocations are tracemalloc peaks,
+so both are only comparable between runs on the same machine. The
+process exits with status 1 if a metric regressed past the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINE = os.path.join(HERE, "baseline.json")
+
+# Allowed slowdown before a metric counts as a regression. Tail
+# latencies (p99) are reported but not gated; they are too noisy.
+TIME_TOLERANCE = 0.5                 # Timings are noisy, allow +50%
+ALLOC_TOLERANCE = 0.1                # Allocations are nearly deterministic
+
+perf_counter = time.perf_counter     # Not patched by the virtual clock
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(prefix, samples_s):
+    """p50/p99/mean in microseconds for a list of durations in seconds"""
+    samples = [s * 1e6 for s in samples_s]
+    return {
+        prefix + "_p50_us": round(percentile(samples, 50), 1),
+        prefix + "_p99_us": round(percentile(samples, 99), 1),
+        prefix + "_mean_us": round(sum(samples) / len(samples), 1),
+    }
+
+
+def allocated(fn, rounds=50):
+    """Mean tracemalloc peak (bytes) of fn() over rounds calls"""
+    fn()
+    total = 0
+    tracemalloc.start()
+    for _ in range(rounds):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return total // rounds
+
+
+def bench_collect(ws, clock, rounds):
+    """collect_sensor_data() including weather quality and LEDs"""
+    def collect():
+        clock.sleep(2)                   # Respect the DHT11 minimum interval
+        ws.collect_sensor_data()
+
+    samples = []
+    for _ in range(rounds):
+        clock.sleep(2)
+        start = perf_counter()
+        ws.collect_sensor_data()
+        samples.append(perf_counter() - start)
+    results = summarize("collect", samples)
+    results["collect_alloc_bytes"] = allocated(collect)
+    return results
+
+
+def bench_encode(ws, rounds):
+    """Body encoding for a single reading and a history + latest PATCH"""
+    reading = ws.current_reading         # Filled by bench_collect
+    patch = {
+        "weather_readings/" + ws.firebase.generate_push_key(): reading,
+        "latest_reading": reading,
+    }
+    writer = ws.firebase.writer
+    results = {}
+    for name, payload in (("encode_reading", reading), ("encode_patch", patch)):
+        samples = []
+        for _ in range(rounds):
+            start = perf_counter()
+            writer.encode(payload)
+            samples.append(perf_counter() - start)
+        results.update(summarize(name, samples))
+        results[name + "_alloc_bytes"] = allocated(lambda: writer.encode(payload))
+    return results
+
+
+def bench_wire(ws, clock, count=400):
+    """Upload bytes per reading for simulated readings (deterministic)"""
+    import compact
+    readings = []
+    for _ in range(count):
+        clock.sleep(ws.READING_INTERVAL)
+        reading = ws.read_sensor_data()
+        if reading:
+            readings.append(reading)
+    return {"wire_%s_bytes" % name: value
+            for name, value in compact.measure(readings).items()}
+
+
+def bench_requests(client, reading, rounds):
+    """push/set round trips over one keep-alive connection"""
+    results = {}
+    for name, call in (("push", client.push), ("set", client.set)):
+        path = "weather_readings" if name == "push" else "latest_reading"
+        call(path, reading)              # Connect outside the measurement
+        samples = []
+        started = perf_counter()
+        for _ in range(rounds):
+            start = perf_counter()
+            success, message = call(path, reading)
+            samples.append(perf_counter() - start)
+            if not success:
+                raise RuntimeError(f"{name} failed: {message}")
+        elapsed = perf_counter() - started
+        results.update(summarize(name, samples))
+        results[name + "_per_s"] = round(rounds / elapsed, 1)
+    return results
+
+
+def bench_loop(ws, clock, cycles, alloc_cycles):
+    """Time and allocation of whole main() cycles (sleeps excluded)"""
+    times = []
+    allocs = []
+    state = {"start": None, "count": 0}
+
+    class TimedScheduler(ws.DeadlineScheduler):
+        def wait(self, *args):
+            # Everything between two wait() calls is one cycle of work
+            if state["start"] is not None:
+                if tracemalloc.is_tracing():
+                    allocs.append(tracemalloc.get_traced_memory()[1] - state["base"])
+                else:
+                    times.append(perf_counter() - state["start"])
+            state["count"] += 1
+            if state["count"] == cycles + 1:
+                tracemalloc.start()
+            slot = super().wait(*args)
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+                state["base"] = tracemalloc.get_traced_memory()[0]
+            state["start"] = perf_counter()
+            return slot
+
+    # Upload every reading so each cycle does the same work
+    ws.DEADBAND_ENABLED = False
+    ws.REMOTE_CONTROL = False
+    ws.DeadlineScheduler = TimedScheduler
+    clock.duration = clock.monotonic() + (cycles + alloc_cycles + 2) * ws.READING_INTERVAL
+
+    with open(os.devnull, "w") as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            ws.main()
+        finally:
+            sys.stdout = stdout
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    # The first cycle includes the initial connect
+    results = summarize("loop", times[1:])
+    results["loop_alloc_bytes"] = sum(allocs) // len(allocs)
+    return results
+
+
+def run(rounds, cycles):
+    """Run every case and return a flat {metric: value} dict"""
+    sys.path.insert(0, ROOT)
+    import sim
+
+    server = sim.FirebaseStandIn().start()
+    clock = sim.install(server.url)
+    os.chdir(tempfile.mkdtemp(prefix="weather-bench-"))
+    import weather_station as ws
+    from firebase_client import FirebaseClient
+
+    metrics = {}
+    try:
+        metrics.update(bench_collect(ws, clock, rounds))
+        metrics.update(bench_encode(ws, rounds))
+        metrics.update(bench_wire(ws, clock))
+        client = FirebaseClient(keep_alive=True)
+        metrics.update(bench_requests(client, ws.current_reading.as_dict(), rounds))
+        client.close()
+        metrics.update(bench_loop(ws, clock, cycles, max(5, cycles // 10)))
+    finally:
+        server.stop()
+    return metrics
+
+
+def tolerance(name, time_tolerance, alloc_tolerance):
+    """Allowed relative regression for a metric"""
+    return alloc_tolerance if name.endswith("_bytes") else time_tolerance
+
+
+def compare(metrics, baseline, time_tolerance, alloc_tolerance):
+    """Return a list of (name, baseline, current, change) regressions"""
+    regressions = []
+    for name, old in sorted(baseline.items()):
+        new = metrics.get(name)
+        if new is None or not old or "_p99_" in name:
+            continue
+        if name.endswith("_per_s"):
+            change = old / new - 1 if new else float("inf")   # Higher is better
+        else:
+            change = new / old - 1
+        if change > tolerance(name, time_tolerance, alloc_tolerance):
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest-path benchmark suite")
+    parser.add_argument("--rounds", type=int, default=500, help="iterations per micro-benchmark")
+    parser.add_argument("--cycles", type=int, default=100, help="main() cycles to time")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--alloc-tolerance", type=float, default=ALLOC_TOLERANCE)
+    args = parser.parse_args(argv)
+    baseline_path = os.path.abspath(args.baseline)
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    metrics = run(args.rounds, args.cycles)
+    from sim.clock import real_time      # time.time() is virtual now
+    results = {
+        "timestamp": int(real_time()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "rounds": args.rounds,
+        "cycles": args.cycles,
+        "metrics": metrics,
+    }
+
+    for name in sorted(metrics):
+        print(f"{name:<28}{metrics[name]:>12}")
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    try:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["metrics"]
+    except OSError:
+        print(f"No baseline at {baseline_path}; run with --save-baseline")
+        return 0
+
+    regressions = compare(metrics, baseline, args.time_tolerance, args.alloc_tolerance)
+    for name, old, new, change in regressions:
+        print(f"REGRESSION {name}: {old} -> {new} ({change:+.0%})")
+    if not regressions:
+        print("No regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
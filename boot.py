@@ -1,21 +1,38 @@
 import keys
 import network
-from time import sleep
+from time import sleep_ms, ticks_ms, ticks_diff
 
+# Fast boot: only start associating here and return at once, so
+# main.py can warm up the sensors and take the first reading while the
+# radio connects (weather_station.FAST_START waits for the link later)
+FAST_BOOT = True
+CHECK_INTERNET = False                  # detectportal request, adds a round trip
+CONNECT_TIMEOUT_MS = 20000
 
-def connect():
+
+def start_connect():
     wlan = network.WLAN(network.STA_IF)         # Put modem on Station mode
     if not wlan.isconnected():                  # Check if already connected
         print('connecting to network...')
         wlan.active(True)                       # Activate network interface
-        # set power mode to get WiFi power-saving off (if needed)
-        wlan.config(pm=0xa11140)
+        # The power mode is set by the link manager once connected
+        # (weather_station.WIFI_POWER_MODE)
         wlan.connect(keys.WIFI_SSID, keys.WIFI_PASS)  # Your WiFi Credential
-        print('Waiting for connection...', end='')
-        # Check if it is connected otherwise wait
-        while not wlan.isconnected() and wlan.status() >= 0:
-            print('.', end='')
-            sleep(1)
+    return wlan
+
+
+def connect():
+    wlan = start_connect()
+    print('Waiting for connection...', end='')
+    # Poll the link status often and stop as soon as it changes, instead
+    # of sleeping in whole seconds; a negative status is a hard failure
+    start = ticks_ms()
+    while not wlan.isconnected() and wlan.status() >= 0:
+        if ticks_diff(ticks_ms(), start) > CONNECT_TIMEOUT_MS:
+            raise OSError('WiFi connect timeout')
+        sleep_ms(50)
+    if not wlan.isconnected():
+        raise OSError('WiFi connect failed, status %d' % wlan.status())
     # Print the IP assigned by router
     ip = wlan.ifconfig()[0]
     print('\nConnected on {}'.format(ip))
@@ -24,29 +41,36 @@ def connect():
 
 def http_get(url='http://detectportal.firefox.com/'):
     import socket                           # Used by HTML get request
-    import time                             # Used for delay
     _, _, host, path = url.split('/', 3)    # Separate URL request
     addr = socket.getaddrinfo(host, 80)[0][-1]  # Get IP address of host
     s = socket.socket()                     # Initialise the socket
-    s.connect(addr)                         # Try connecting to host address
-    # Send HTTP request to the host with specific path
-    s.send(bytes('GET /%s HTTP/1.0\r\nHost: %s\r\n\r\n' % (path, host), 'utf8'))
-    time.sleep(1)                           # Sleep for a second
-    rec_bytes = s.recv(10000)               # Receve response
-    print(rec_bytes)                        # Print the response
-    s.close()                               # Close connection
-
-
-# WiFi Connection
-try:
-    ip = connect()
-    print(f"✅ WiFi connected successfully! IP: {ip}")
-except KeyboardInterrupt:
-    print("Keyboard interrupt")
-
-# HTTP request test
-try:
-    http_get()
-    print("✅ Internet connection verified!")
-except (Exception, KeyboardInterrupt) as err:
-    print("❌ No Internet connection:", err)
+    s.settimeout(5)                         # Wait for data, not a fixed delay
+    try:
+        s.connect(addr)                     # Try connecting to host address
+        # Send HTTP request to the host with specific path
+        s.send(bytes('GET /%s HTTP/1.0\r\nHost: %s\r\n\r\n' % (path, host), 'utf8'))
+        rec_bytes = s.recv(10000)           # Returns as soon as the reply arrives
+        print(rec_bytes)                    # Print the response
+    finally:
+        s.close()                           # Close connection
+
+
+if FAST_BOOT:
+    start_connect()
+else:
+    # WiFi Connection
+    try:
+        ip = connect()
+        print(f"✅ WiFi connected successfully! IP: {ip}")
+    except KeyboardInterrupt:
+        print("Keyboard interrupt")
+    except OSError as err:
+        print("❌ WiFi connection failed:", err)
+
+    # HTTP request test
+    if CHECK_INTERNET:
+        try:
+            http_get()
+            print("✅ Internet connection verified!")
+        except (Exception, KeyboardInterrupt) as err:
+            print("❌ No Internet connection:", err)
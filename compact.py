@@ -0,0 +1,203 @@
+# Compact wire schema for readings (opt-in with COMPACT_UPLOAD in
+# weather_station.py). Runs on the Pico for encoding and on any Python
+# reader for decoding back to the usual reading shape.
+#
+# One reading:   {"t": 1718000000, "c": 215, "h": 450, "l": 31000}
+# A batch:       {"v": 1, "t": [1718000000, 30, 30], "c": [215, 1, -2], ...}
+#
+# t is the timestamp in seconds, c and h are temperature and humidity in
+# tenths, l is light_raw, n/x/s the light window's min/max/std and p the
+# chip temperature in whole degrees (left out for readings that lack
+# them). A field without a key here is not sent.
+# light_level is not sent; decoders derive it from l. In a batch each
+# list holds the first value followed by the differences between
+# neighbours, so regular timestamps and slowly changing values turn into
+# runs of small numbers. A missing value (sensor failed) is null and
+# does not break the chain of differences.
+
+import json
+
+SCHEMA_VERSION = 1
+
+# Wire key, reading field and integer scale
+KEYS = (
+    ("t", "timestamp", 1),
+    ("c", "temperature", 10),
+    ("h", "humidity", 10),
+    ("l", "light_raw", 1),
+)
+OPTIONAL_KEYS = (
+    ("n", "light_min", 1),
+    ("x", "light_max", 1),
+    ("s", "light_std", 1),
+    ("p", "chip_temperature", 1),
+)
+
+# Default light bands of get_light_level in weather_station.py
+LIGHT_BANDS = (
+    (50000, "Very Bright"),
+    (30000, "Bright"),
+    (15000, "Dim"),
+    (5000, "Dark"),
+)
+
+
+def light_level(raw):
+    """Light label for a raw ADC value, using the default bands"""
+    for bound, level in LIGHT_BANDS:
+        if raw > bound:
+            return level
+    return "Very Dark"
+
+
+def _scaled(value, scale):
+    if value is None:
+        return None
+    if scale == 1:
+        return int(value)
+    return int(round(value * scale))
+
+
+def _unscaled(value, scale):
+    if value is None or scale == 1:
+        return value
+    value = value / scale
+    # Whole numbers come back as ints, like the DHT11 reports them
+    return int(value) if value == int(value) else value
+
+
+def _level(level, raw):
+    return None if raw is None else level(raw)
+
+
+def encode_reading(reading):
+    """Compact dict for one reading (dict or Reading)"""
+    record = {}
+    for key, field, scale in KEYS:
+        record[key] = _scaled(reading[field], scale)
+    for key, field, scale in OPTIONAL_KEYS:
+        if field in reading:
+            record[key] = _scaled(reading[field], scale)
+    return record
+
+
+def encode_batch(readings):
+    """Delta-encoded batch for a list of readings (oldest first)"""
+    batch = {"v": SCHEMA_VERSION}
+    keys = KEYS + tuple(k for k in OPTIONAL_KEYS
+                        if all(k[1] in reading for reading in readings))
+    for key, field, scale in keys:
+        column = []
+        previous = 0
+        for reading in readings:
+            value = _scaled(reading[field], scale)
+            if value is None:
+                column.append(None)      # Missing: delta chain skips it
+                continue
+            column.append(value - previous)
+            previous = value
+        batch[key] = column
+    return batch
+
+
+def is_compact(record):
+    """True if record uses the compact schema"""
+    return isinstance(record, dict) and "t" in record and "timestamp" not in record
+
+
+def decode(record, level=light_level):
+    """Expand a stored record into a list of readings in the usual shape.
+
+    Accepts full readings (returned unchanged), compact readings and
+    compact batches. level(raw) derives light_level.
+    """
+    if not isinstance(record, dict):
+        return []
+    if not is_compact(record):
+        return [record] if "timestamp" in record else []
+    if "v" not in record:
+        reading = {}
+        for key, field, scale in KEYS + OPTIONAL_KEYS:
+            if key in record:
+                reading[field] = _unscaled(record[key], scale)
+        reading["light_level"] = _level(level, reading["light_raw"])
+        return [reading]
+    if record["v"] != SCHEMA_VERSION:
+        raise ValueError("Unknown compact schema version %r" % record["v"])
+
+    readings = [{} for _ in record["t"]]
+    for key, field, scale in KEYS + OPTIONAL_KEYS:
+        if key not in record:
+            continue
+        value = 0
+        for reading, delta in zip(readings, record[key]):
+            if delta is None:
+                reading[field] = None
+                continue
+            value += delta
+            reading[field] = _unscaled(value, scale)
+    for reading in readings:
+        reading["light_level"] = _level(level, reading["light_raw"])
+    return readings
+
+
+def decode_node(node, level=light_level):
+    """Expand a weather_readings node ({push key: record}) into readings.
+
+    Readings come back sorted by timestamp; full, compact and batched
+    records may be mixed in one node.
+    """
+    readings = []
+    for record in (node or {}).values():
+        readings.extend(decode(record, level))
+    readings.sort(key=lambda reading: reading["timestamp"])
+    return readings
+
+
+def wire_size(value):
+    """Bytes of value as JSON without spaces, as the station sends it"""
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+def measure(readings, batch_sizes=(8, 50)):
+    """Upload bytes per reading, full vs compact, for a list of readings.
+
+    Single uploads are the history entry plus latest_reading in one
+    PATCH; batches are one multi-path PATCH per batch_size readings.
+    """
+    key = "weather_readings/" + "-" * 20        # Push keys are 20 chars
+    results = {}
+
+    def per_reading(total):
+        return round(total / len(readings), 1)
+
+    results["single_full"] = per_reading(sum(
+        wire_size({key: r, "latest_reading": r}) for r in readings))
+    results["single_compact"] = per_reading(sum(
+        wire_size({key: encode_reading(r), "latest_reading": encode_reading(r)})
+        for r in readings))
+    for size in batch_sizes:
+        batches = [readings[i:i + size] for i in range(0, len(readings), size)]
+        results["batch%d_full" % size] = per_reading(sum(
+            wire_size({key[:-2] + "%02d" % i: r for i, r in enumerate(b)}) for b in batches))
+        results["batch%d_compact" % size] = per_reading(sum(
+            wire_size({key: encode_batch(b)}) for b in batches))
+    return results
+
+
+if __name__ == "__main__":
+    # A synthetic day of 30 s readings with a daily temperature/light cycle
+    import math
+    readings = []
+    for i in range(2880):
+        phase = i / 2880 * 2 * math.pi
+        light = max(0, int(45000 * math.sin(phase - math.pi / 2))) + 1000 + i % 7
+        readings.append({
+            "timestamp": 1718000000 + 30 * i,
+            "temperature": int(18 + 6 * math.sin(phase)),
+            "humidity": int(55 - 10 * math.sin(phase)),
+            "light_raw": light,
+            "light_level": light_level(light),
+        })
+    for name, value in measure(readings).items():
+        print(f"{name:<20}{value:>8} bytes/reading")
@@ -0,0 +1,246 @@
+import json
+import os
+import time
+import compact
+from rollups import Aggregate, FIELDS
+
+# Retention job for the weather_readings tree (host side). Raw readings
+# older than a cutoff are folded into exact per-minute and per-hour
+# rollups under <rollup root>/<window>/<start> and then deleted:
+#
+#   python compaction.py --keep-days 30
+#
+# The tree is read page by page in push-key (time) order. A window is
+# written once the pages have moved LAG seconds past its end, and a raw
+# node is deleted once every window it contributes to is written, so
+# only the last LAG seconds or so are held in memory. Rollups are
+# written before the deletes. A checkpoint file records where to resume,
+# which deletes are in flight and which nodes were late, so an
+# interrupted run can be restarted, and running it again recomputes the
+# same values.
+#
+# The station's own rollups/ tree is left alone: it also counts the
+# readings the deadband filter kept off the wire.
+
+WINDOWS = (("minute", 60), ("hour", 3600))
+LAG = 3600                           # Seconds past a window's end before it is written
+CHECKPOINT_FILE = "compaction.json"
+PAGE_SIZE = 500                      # Raw nodes per GET
+BATCH_SIZE = 500                     # Paths per multi-path PATCH
+
+
+class Compactor:
+    """Fold old raw readings into rollups and delete them, in bounded memory.
+
+    run(cutoff) compacts nodes whose push key is older than cutoff (unix
+    seconds). Windows must close in order, so a node that brings
+    readings for an already written window (a replay that arrived
+    late) is left as it is and counted in late. Late keys are kept in
+    the checkpoint so a later run that reads them again leaves them too.
+    """
+
+    def __init__(self, client, path="weather_readings", rollup_root="compacted",
+                 checkpoint=CHECKPOINT_FILE, windows=WINDOWS, fields=FIELDS, lag=LAG,
+                 page_size=PAGE_SIZE, batch_size=BATCH_SIZE, dry_run=False):
+        self.client = client
+        self.path = path
+        self.rollup_root = rollup_root
+        self.checkpoint = checkpoint
+        self.windows = windows
+        self.fields = fields
+        self.lag = lag
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+        self.open = {}                   # (window, start) -> {field: Aggregate}
+        self.pending = []                # [key, last window end] of undeleted nodes
+        self.writes = {}                 # Rollup path -> summary, not yet written
+        self.deletes = []                # Keys whose windows are all written
+        self.closed_until = {}           # Window -> end of the last written window
+        self.resume = None               # First key to read on the next run
+        self.seen = None                 # Last key read by any run
+        self.late = set()                # Late keys at or after resume
+        self.totals = {"nodes": 0, "readings": 0, "windows": 0, "deleted": 0, "late": 0}
+        self.load()
+
+    def load(self):
+        """Restore the checkpoint, finishing deletes a crash interrupted"""
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("path") != self.path:
+            raise ValueError(f"{self.checkpoint} belongs to {state.get('path')}, not {self.path}")
+        self.resume = state["resume"]
+        self.seen = state["seen"]
+        self.closed_until = state["closed_until"]
+        self.late = set(state.get("late", ()))
+        self.totals.update(state["totals"])
+        if state["deleting"] and not self.dry_run:
+            self._delete(state["deleting"])
+            self.save()
+
+    def save(self, deleting=()):
+        """Write the checkpoint to a temp file and rename it over the old one"""
+        if self.dry_run:
+            return
+        state = {
+            "path": self.path,
+            "resume": self.resume,
+            "seen": self.seen,
+            "closed_until": self.closed_until,
+            "late": sorted(self.late),
+            "deleting": list(deleting),
+            "totals": self.totals,
+        }
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint)
+
+    def _patch(self, values):
+        """Multi-path PATCH in batches of batch_size paths"""
+        items = list(values.items())
+        for i in range(0, len(items), self.batch_size):
+            success, message = self.client.update("", dict(items[i:i + self.batch_size]))
+            if not success:
+                raise OSError(message)
+
+    def _delete(self, keys):
+        self._patch({f"{self.path}/{key}": None for key in keys})
+        self.totals["deleted"] += len(keys)
+
+    def _closed(self, name, start, seconds):
+        return start + seconds <= self.closed_until.get(name, 0)
+
+    def add(self, key, record):
+        """Fold one raw node into the open windows"""
+        readings = [r for r in compact.decode(record) if r.get("timestamp") is not None]
+        if not readings:
+            return
+        revisit = self.seen is not None and key <= self.seen
+        if key in self.late:
+            return                       # Late on an earlier read: its windows never saw it
+        if not revisit:
+            for reading in readings:
+                timestamp = int(reading["timestamp"])
+                for name, seconds in self.windows:
+                    if self._closed(name, timestamp - timestamp % seconds, seconds):
+                        self.totals["late"] += 1
+                        self.late.add(key)
+                        return
+        last_end = 0
+        for reading in readings:
+            timestamp = int(reading["timestamp"])
+            for name, seconds in self.windows:
+                start = timestamp - timestamp % seconds
+                last_end = max(last_end, start + seconds)
+                if self._closed(name, start, seconds):
+                    continue             # Revisited node: already in a written window
+                aggregates = self.open.get((name, start))
+                if aggregates is None:
+                    aggregates = {}
+                    for field in self.fields:
+                        aggregates[field] = Aggregate()
+                    self.open[(name, start)] = aggregates
+                for field in self.fields:
+                    value = reading.get(field)
+                    if value is not None:
+                        aggregates[field].add(value)
+        self.pending.append([key, last_end])
+        if not revisit:
+            self.totals["nodes"] += 1
+            self.totals["readings"] += len(readings)
+
+    def close(self, now):
+        """Move windows (and nodes) at least lag seconds older than now out"""
+        horizon = now - self.lag
+        for (name, start) in sorted(self.open):
+            seconds = dict(self.windows)[name]
+            if start + seconds > horizon:
+                continue
+            aggregates = self.open.pop((name, start))
+            summary = {}
+            for field in aggregates:
+                summary[field] = aggregates[field].summary()
+                summary[field]["sum"] = aggregates[field].total
+            self.writes[f"{self.rollup_root}/{name}/{start}"] = summary
+            self.closed_until[name] = max(self.closed_until.get(name, 0), start + seconds)
+        keep = []
+        for node in self.pending:
+            if node[1] <= horizon:
+                self.deletes.append(node[0])
+            else:
+                keep.append(node)
+        self.pending = keep
+
+    def flush(self):
+        """Write rollups, checkpoint, then delete the nodes they cover"""
+        if self.pending:
+            self.resume = self.pending[0][0]
+        elif self.seen is not None:
+            self.resume = self.seen
+        # Keys before resume are never read again
+        self.late = set(key for key in self.late if key >= self.resume)
+        if self.dry_run:
+            self.totals["windows"] += len(self.writes)
+            self.totals["deleted"] += len(self.deletes)
+        else:
+            self._patch(self.writes)
+            self.totals["windows"] += len(self.writes)
+            # Deletes are recorded first so a crash cannot strand them
+            # below the resume point
+            self.save(self.deletes)
+            self._delete(self.deletes)
+            self.save()
+        self.writes = {}
+        self.deletes = []
+
+    def run(self, cutoff):
+        """Compact raw nodes pushed before cutoff; return the totals"""
+        end_at = self.client.time_key(int(cutoff) * 1000)
+        now = None
+        for key, record in self.client.iter_children(self.path, page_size=self.page_size,
+                                                     start_at=self.resume, end_at=end_at):
+            self.add(key, record)
+            if self.seen is None or key > self.seen:
+                self.seen = key
+            ms = self.client.key_time(key)
+            if ms is not None:
+                now = ms // 1000
+                self.close(now)
+            if len(self.deletes) + len(self.writes) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return dict(self.totals, open_windows=len(self.open), kept_nodes=len(self.pending))
+
+
+def main(argv=None):
+    import argparse
+    from firebase_client import FirebaseClient
+    parser = argparse.ArgumentParser(description="Fold old raw readings into rollups and delete them")
+    parser.add_argument("--keep-days", type=float, required=True,
+                        help="keep raw readings this many days")
+    parser.add_argument("--path", default="weather_readings")
+    parser.add_argument("--rollup-root", default="compacted")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--url", help="database URL (default: keys.FIREBASE_URL)")
+    parser.add_argument("--dry-run", action="store_true", help="read and report, change nothing")
+    args = parser.parse_args(argv)
+
+    cutoff = time.time() - args.keep_days * 86400
+    cutoff -= cutoff % 3600              # Whole hours only
+    compactor = Compactor(FirebaseClient(keep_alive=True, url=args.url), args.path,
+                          args.rollup_root, args.checkpoint, page_size=args.page_size,
+                          batch_size=args.batch_size, dry_run=args.dry_run)
+    totals = compactor.run(cutoff)
+    print(json.dumps(totals, indent=2))
+    return totals
+
+
+if __name__ == "__main__":
+    main()
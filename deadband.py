@@ -0,0 +1,63 @@
+class DeadbandFilter:
+    """Report-by-exception filter for readings.
+
+    A reading is reported when a numeric field moved by at least its
+    threshold since the last reported reading, when a label field
+    changed, or when heartbeat seconds passed since the last report.
+    Everything else is suppressed.
+    """
+
+    def __init__(self, thresholds, labels=(), heartbeat=600):
+        self.thresholds = thresholds     # {field: minimum change}
+        self.labels = labels             # Fields reported on any change
+        self.heartbeat = heartbeat
+        self.last = None                 # Last reported values
+
+        # Counters for monitoring
+        self.sent = 0
+        self.suppressed = 0
+        self.heartbeats = 0
+
+    def _changed(self, data):
+        """Check whether data moved past any threshold"""
+        last = self.last
+        for field in self.thresholds:
+            value = data[field]
+            if value is None or last[field] is None:
+                if value is not last[field]:
+                    return True          # A sensor dropped out or came back
+            elif abs(value - last[field]) >= self.thresholds[field]:
+                return True
+        for field in self.labels:
+            if data[field] != last[field]:
+                return True
+        return False
+
+    def check(self, data):
+        """Return True if the reading should be uploaded"""
+        if self.last is None or self._changed(data):
+            report = True
+        elif data["timestamp"] - self.last["timestamp"] >= self.heartbeat:
+            report = True
+            self.heartbeats += 1
+        else:
+            report = False
+
+        if report:
+            self.sent += 1
+            self.last = {"timestamp": data["timestamp"]}
+            for field in self.thresholds:
+                self.last[field] = data[field]
+            for field in self.labels:
+                self.last[field] = data[field]
+        else:
+            self.suppressed += 1
+        return report
+
+    def stats(self):
+        """Return sent/suppressed counters"""
+        return {
+            "sent": self.sent,
+            "suppressed": self.suppressed,
+            "heartbeats": self.heartbeats,
+        }
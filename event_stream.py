@@ -0,0 +1,374 @@
+import json
+import time
+import random
+from firebase_client import (KeepAliveConnection, AsyncKeepAliveConnection,
+                             _split_url, _import_asyncio)
+
+# Firebase REST streaming, used only by the control stream. It lives
+# apart from firebase_client so a station imports it when it first
+# opens a stream (FirebaseClient.stream()), not at boot.
+
+
+class SSEParser:
+    """Incremental text/event-stream parser with bounded memory.
+
+    feed() takes bytes as they arrive and returns the completed
+    (event, data) pairs. A line longer than max_line drops its whole
+    event instead of growing the buffer (counted in dropped).
+    """
+
+    def __init__(self, max_line=2048):
+        self.max_line = max_line
+        self._buf = b""
+        self._event = None
+        self._data = None
+        self._skip = False               # Discarding an oversized event
+        self.dropped = 0
+
+    def reset(self):
+        """Forget any partial event (after a reconnect)"""
+        self._buf = b""
+        self._event = None
+        self._data = None
+        self._skip = False
+
+    def feed(self, chunk):
+        """Parse a chunk of the stream; return a list of (event, data)"""
+        events = []
+        buf = self._buf + chunk if self._buf else chunk
+        start = 0
+        while True:
+            end = buf.find(b"\n", start)
+            if end < 0:
+                break
+            line = buf[start:end]
+            start = end + 1
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            self._line(line, events)
+
+        rest = buf[start:]
+        if len(rest) > self.max_line:
+            # Never hold more than max_line of an unfinished line
+            if not self._skip:
+                self.dropped += 1
+            self._skip = True
+            rest = b""
+        self._buf = rest
+        return events
+
+    def _line(self, line, events):
+        """Handle one complete line"""
+        if not line:
+            # Blank line: dispatch the event unless it was dropped
+            if not self._skip and self._data is not None:
+                events.append((self._event or "message", self._data))
+            self._event = None
+            self._data = None
+            self._skip = False
+            return
+        if self._skip or line.startswith(b":"):
+            return                       # Dropped event or comment
+        if len(line) > self.max_line:
+            self.dropped += 1
+            self._skip = True
+            return
+        name, _, value = line.partition(b":")
+        if value.startswith(b" "):
+            value = value[1:]
+        if name == b"event":
+            self._event = value.decode()
+        elif name == b"data":
+            value = value.decode()
+            self._data = value if self._data is None else self._data + "\n" + value
+            if len(self._data) > self.max_line:
+                self.dropped += 1
+                self._skip = True
+
+
+def _would_block(e):
+    """True if a non-blocking read failed only because no data was ready"""
+    if e.args and e.args[0] in (11, 35):  # EAGAIN / EWOULDBLOCK
+        return True
+    return type(e).__name__ in ("BlockingIOError", "SSLWantReadError")
+
+
+class EventStream:
+    """Firebase REST streaming listener (Accept: text/event-stream).
+
+    poll() never waits for data: it reads what has arrived, parses it
+    and calls on_event(event, path, data) for each "put" or "patch".
+    Call it from the main loop or while idle. Dropped connections,
+    redirects, "auth_revoked" and a silent stream (Firebase sends a
+    keep-alive every 30 s) all lead to a reconnect, with exponential
+    backoff and jitter between failed attempts. Under (u)asyncio use
+    poll_async() instead, which also connects without blocking.
+    """
+
+    def __init__(self, url, on_event, timeout=10, max_line=2048,
+                 min_backoff=1, max_backoff=60, idle_timeout=90):
+        self.url = url
+        self.on_event = on_event
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self.parser = SSEParser(max_line)
+        self.connection = None
+        self._chunked = False
+        self._chunk_left = 0
+        self._size_line = b""
+        self._backoff = min_backoff
+        self._retry_at = 0
+        self._last_data = 0
+
+        # Counters for monitoring
+        self.connects = 0
+        self.failures = 0
+        self.events = 0
+        self.cancelled = False
+
+    def _request(self, path, host):
+        return ("GET %s HTTP/1.1\r\nHost: %s\r\nAccept: text/event-stream\r\n"
+                "Cache-Control: no-cache\r\n\r\n" % (path, host)).encode()
+
+    def _follow(self, status, headers):
+        """URL to retry at after a redirect, or None once the stream is open"""
+        if status in (301, 302, 307, 308) and b"location" in headers:
+            # Firebase sends streams to the database's own server
+            return headers[b"location"].decode()
+        if status != 200:
+            raise OSError("Stream HTTP %d" % status)
+        self._chunked = headers.get(b"transfer-encoding", b"").lower() == b"chunked"
+        return None
+
+    def _open(self):
+        """Connect, follow redirects and read the response headers"""
+        url = self.url
+        for _ in range(4):
+            scheme, host, port, path = _split_url(url)
+            connection = KeepAliveConnection(host, port, use_ssl=(scheme == 'https'),
+                                             timeout=self.timeout)
+            connection._connect()
+            try:
+                connection._send(self._request(path, host))
+                status = int(connection._readline().split(b" ", 2)[1])
+                headers = {}
+                while True:
+                    line = connection._readline()
+                    if not line:
+                        break
+                    name, _, value = line.partition(b":")
+                    headers[name.strip().lower()] = value.strip()
+                url = self._follow(status, headers)
+            except Exception:
+                connection.close()
+                raise
+            if url is None:
+                return connection
+            connection.close()
+        raise OSError("Too many redirects")
+
+    async def _open_async(self):
+        """_open() with every socket wait yielding to the event loop"""
+        asyncio = _import_asyncio()
+        url = self.url
+        for _ in range(4):
+            scheme, host, port, path = _split_url(url)
+            connection = AsyncKeepAliveConnection(host, port, use_ssl=(scheme == 'https'),
+                                                  timeout=self.timeout)
+            try:
+                await asyncio.wait_for(connection._connect(), self.timeout)
+                connection.writer.write(self._request(path, host))
+                await connection.writer.drain()
+                status = int((await asyncio.wait_for(
+                    connection._readline(), self.timeout)).split(b" ", 2)[1])
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(connection._readline(), self.timeout)
+                    if not line:
+                        break
+                    name, _, value = line.partition(b":")
+                    headers[name.strip().lower()] = value.strip()
+                url = self._follow(status, headers)
+            except Exception:
+                await connection.close()
+                raise
+            if url is None:
+                return connection
+            await connection.close()
+        raise OSError("Too many redirects")
+
+    def _opened(self, connection):
+        """Reset the stream state for a new connection"""
+        self.connection = connection
+        self.connects += 1
+        self._backoff = self.min_backoff
+        self._chunk_left = 0
+        self._size_line = b""
+        self.parser.reset()
+        self._last_data = time.time()
+
+    def _failed(self, e):
+        self.failures += 1
+        print(f"Stream connect failed: {e}")
+        self._schedule_retry()
+
+    def _connect(self):
+        """Open the stream; schedule a retry with backoff on failure"""
+        try:
+            connection = self._open()
+        except Exception as e:
+            self._failed(e)
+            return False
+        self._opened(connection)
+        self.connection.sock.setblocking(False)
+
+        # Body bytes that arrived together with the headers
+        buffered = self.connection._buf
+        self.connection._buf = b""
+        if buffered:
+            self._handle(buffered)
+        return True
+
+    def _schedule_retry(self):
+        """Wait an exponentially growing, jittered delay before reconnecting"""
+        delay = self._backoff * (0.5 + random.getrandbits(8) / 256)
+        self._retry_at = time.time() + delay
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def close(self):
+        """Drop the connection (poll() will reconnect later)"""
+        connection = self.connection
+        self.connection = None
+        if isinstance(connection, AsyncKeepAliveConnection):
+            connection.abort()
+        elif connection is not None:
+            connection.close()
+
+    def _disconnect(self):
+        self.close()
+        self._schedule_retry()
+
+    def poll(self, max_bytes=4096):
+        """Process whatever has arrived; return the number of events handled"""
+        if self.cancelled:
+            return 0
+        if self.connection is None:
+            if time.time() < self._retry_at or not self._connect():
+                return 0
+        handled = 0
+        received = 0
+        while received < max_bytes:
+            try:
+                chunk = self.connection._recv(512)
+            except OSError as e:
+                if _would_block(e):
+                    break
+                self._disconnect()
+                return handled
+            if chunk is None:
+                break                    # MicroPython: no data on a non-blocking socket
+            if not chunk:
+                self._disconnect()       # Server closed the stream
+                return handled
+            received += len(chunk)
+            self._last_data = time.time()
+            handled += self._handle(chunk)
+            if self.connection is None:
+                return handled
+        if time.time() - self._last_data > self.idle_timeout:
+            print("Stream silent - reconnecting")
+            self._disconnect()
+        return handled
+
+    async def poll_async(self, max_bytes=512):
+        """poll() for the async runtime: connects and waits without blocking.
+
+        Returns once data arrived, the stream was closed or dropped, or
+        after idle_timeout without even a keep-alive, with the number of
+        events handled. Waits out the backoff before reconnecting.
+        """
+        asyncio = _import_asyncio()
+        if self.cancelled:
+            return 0
+        if self.connection is None:
+            delay = self._retry_at - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                connection = await self._open_async()
+            except Exception as e:
+                self._failed(e)
+                return 0
+            self._opened(connection)
+        connection = self.connection
+        try:
+            chunk = await asyncio.wait_for(connection.reader.read(max_bytes), self.idle_timeout)
+        except asyncio.TimeoutError:
+            print("Stream silent - reconnecting")
+            self._disconnect()
+            return 0
+        except Exception:
+            chunk = b""
+        if self.connection is not connection:
+            return 0                     # Closed while waiting
+        if not chunk:
+            self._disconnect()           # Server closed the stream
+            return 0
+        self._last_data = time.time()
+        return self._handle(chunk)
+
+    def _handle(self, data):
+        """Strip chunked framing if needed and feed the parser"""
+        if not self._chunked:
+            return self._dispatch(self.parser.feed(data))
+        handled = 0
+        view = memoryview(data)
+        while len(view):
+            if self._chunk_left:
+                n = min(self._chunk_left, len(view))
+                handled += self._dispatch(self.parser.feed(bytes(view[:n])))
+                view = view[n:]
+                self._chunk_left -= n
+                continue
+            # Chunk size line (the CRLF ending the previous chunk gives an empty line)
+            end = bytes(view).find(b"\n")
+            if end < 0:
+                self._size_line += bytes(view)
+                break
+            line = (self._size_line + bytes(view[:end])).strip()
+            view = view[end + 1:]
+            self._size_line = b""
+            if not line:
+                continue
+            size = int(line.split(b";")[0], 16)
+            if size == 0:
+                self._disconnect()       # End of the stream
+                break
+            self._chunk_left = size
+        return handled
+
+    def _dispatch(self, events):
+        """Decode Firebase events and pass put/patch on"""
+        handled = 0
+        for event, data in events:
+            if event in ("put", "patch"):
+                try:
+                    message = json.loads(data)
+                except ValueError:
+                    continue
+                self.events += 1
+                handled += 1
+                self.on_event(event, message.get("path", "/"), message.get("data"))
+            elif event == "auth_revoked":
+                self._disconnect()
+                break
+            elif event == "cancel":
+                # Permission denied: retrying would fail the same way
+                print(f"Stream cancelled: {data}")
+                self.cancelled = True
+                self.close()
+                break
+            # keep-alive events only refresh the idle timer
+        return handled
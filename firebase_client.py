@@ -1,47 +1,678 @@
 import keys
 import json
+import time
+import random
+from json_stream import JsonWriter
 try:
-    import urequests as requests
+    import usocket as socket
+except ImportError:
+    import socket
+try:
+    import ussl as ssl
 except ImportError:
     try:
-        import requests
+        import ssl
     except ImportError:
-        print("❌ Neither urequests nor requests module found")
-        print("Please install urequests for MicroPython")
-        requests = None
+        ssl = None
+try:
+    import uselect as select
+except ImportError:
+    import select
 
 
-class FirebaseClient:
+def _split_url(url):
+    """Split a URL into (scheme, host, port, path)"""
+    scheme, _, rest = url.partition('://')
+    hostport, slash, path = rest.partition('/')
+    host, _, port = hostport.partition(':')
+    if port:
+        port = int(port)
+    else:
+        port = 443 if scheme == 'https' else 80
+    return scheme, host, port, slash + path
+
+
+# Optional resolve(host, port, fresh) -> address used instead of
+# getaddrinfo, e.g. startup.DnsCache.resolve to skip DNS lookups after a
+# reboot. fresh is True after connecting to the last address failed.
+resolver = None
+
+# Optional reserve(nbytes) called before a large allocation (a TLS
+# handshake, decoding a response), e.g. memory.MemoryManager.ensure to
+# collect first instead of failing with a fragmented heap
+reserve = None
+TLS_HEAP = 24576                     # Heap a TLS handshake needs, roughly
+
+_requests = None
+
+
+def _import_requests():
+    """Import urequests/requests on first use; only the non-keep-alive path needs it"""
+    global _requests
+    if _requests is None:
+        try:
+            import urequests as requests
+        except ImportError:
+            try:
+                import requests
+            except ImportError:
+                print("❌ Neither urequests nor requests module found")
+                print("Please install urequests for MicroPython")
+                requests = False
+        _requests = requests
+    return _requests or None
+
+
+def _resolve(host, port, fresh=False):
+    """Socket address for host:port, through the resolver if one is set"""
+    if resolver is not None:
+        return resolver(host, port, fresh)
+    return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+
+
+def _reserve(nbytes):
+    if reserve is not None:
+        reserve(nbytes)
+
+
+def _wrap_ssl(sock, host):
+    """Wrap a connected socket in TLS (MicroPython and CPython)"""
+    if hasattr(ssl, 'create_default_context'):
+        return ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+    return ssl.wrap_socket(sock, server_hostname=host)
+
+
+class StaleConnection(OSError):
+    """Raised when a reused connection was closed by the server"""
+
+
+class _NoTimer:
+    """Stand-in stage timer used when no metrics are attached"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+class _BaseConnection:
+    """Shared settings, request building and reuse statistics"""
+
+    def __init__(self, host, port=443, use_ssl=True, timeout=10):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+
+        # Times DNS + TCP + TLS setup when metrics are attached
+        self.connect_timer = _NO_TIMER
+
+        # Extra header lines ("Name: value\r\n") sent with every request
+        self.headers = ""
+
+        # Connection reuse statistics
+        self.requests = 0
+        self.connects = 0
+        self.reused = 0
+        self.reconnects = 0
+
+    def _build_request(self, method, path, body, content_type):
+        """Build the request line and headers"""
+        head = "%s %s HTTP/1.1\r\nHost: %s\r\nConnection: keep-alive\r\n%s" % (
+            method, path, self.host, self.headers)
+        if body is not None:
+            head += "Content-Type: %s\r\nContent-Length: %d\r\n" % (
+                content_type, len(body))
+        return (head + "\r\n").encode()
+
+    def stats(self):
+        """Return connection reuse statistics"""
+        return {
+            "requests": self.requests,
+            "connects": self.connects,
+            "reused": self.reused,
+            "reconnects": self.reconnects,
+        }
+
+
+class KeepAliveConnection(_BaseConnection):
+    """Persistent HTTP/1.1 connection to a single host.
+
+    The socket is kept open between requests. Before a reused socket is
+    written to, it is polled: a connection the server has half-closed
+    shows up as readable with no pending response. If a reused socket
+    fails before any response bytes arrive, the request is retried once
+    on a fresh connection.
+    """
+
+    def __init__(self, host, port=443, use_ssl=True, timeout=10):
+        super().__init__(host, port, use_ssl, timeout)
+        self.sock = None
+        self._addr = None
+        self._addr_failed = False
+        self._buf = b""
+
+    def _connect(self):
+        """Open a new socket to the host (DNS is resolved only once)"""
+        with self.connect_timer:
+            if self._addr is None:
+                self._addr = _resolve(self.host, self.port, self._addr_failed)
+                self._addr_failed = False
+            sock = socket.socket()
+            sock.settimeout(self.timeout)
+            try:
+                # Head and body go out as separate writes; don't let Nagle
+                # hold the body back waiting for a delayed ACK
+                if hasattr(socket, 'TCP_NODELAY'):
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.connect(self._addr)
+                if self.use_ssl:
+                    _reserve(TLS_HEAP)
+                    sock = _wrap_ssl(sock, self.host)
+            except Exception:
+                sock.close()
+                # The address may be stale (cached DNS); look it up again
+                self._addr = None
+                self._addr_failed = True
+                raise
+        self.sock = sock
+        self._buf = b""
+        if self.connects:
+            self.reconnects += 1
+        self.connects += 1
+
+    def close(self):
+        """Close the underlying socket"""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self._buf = b""
+
+    def _is_stale(self):
+        """Check whether the idle socket was closed by the server"""
+        try:
+            poller = select.poll()
+            poller.register(self.sock, select.POLLIN)
+            events = poller.poll(0)
+        except Exception:
+            return False
+        # An idle keep-alive socket must not be readable: either the
+        # server closed it (EOF pending) or sent something unexpected.
+        return bool(events)
+
+    def _send(self, data):
+        """Write all bytes to the socket"""
+        sock = self.sock
+        if hasattr(sock, 'sendall'):
+            sock.sendall(data)
+            return
+        view = memoryview(data)
+        while len(view):
+            sent = sock.write(view)
+            if sent is None:
+                sent = len(view)
+            view = view[sent:]
+
+    def _recv(self, size=1024):
+        """Read up to size bytes from the socket"""
+        sock = self.sock
+        if hasattr(sock, 'recv'):
+            return sock.recv(size)
+        return sock.read(size)
+
+    def _fill(self):
+        """Append more data to the read buffer"""
+        chunk = self._recv()
+        if not chunk:
+            raise StaleConnection("Connection closed by server")
+        self._buf += chunk
+
+    def _readline(self):
+        """Read one CRLF-terminated line (without the terminator)"""
+        while True:
+            end = self._buf.find(b"\r\n")
+            if end >= 0:
+                line = self._buf[:end]
+                self._buf = self._buf[end + 2:]
+                return line
+            self._fill()
+
+    def _read(self, size):
+        """Read exactly size bytes"""
+        while len(self._buf) < size:
+            self._fill()
+        data = self._buf[:size]
+        self._buf = self._buf[size:]
+        return data
+
+    def _read_until_close(self):
+        """Read until the server closes the connection"""
+        chunks = [self._buf]
+        self._buf = b""
+        while True:
+            chunk = self._recv()
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _read_response(self):
+        """Read status line, headers and body; return (status, headers, body)"""
+        status_line = self._readline()
+        status = int(status_line.split(b" ", 2)[1])
+
+        headers = {}
+        while True:
+            line = self._readline()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get(b"transfer-encoding", b"").lower() == b"chunked":
+            chunks = []
+            while True:
+                size = int(self._readline().split(b";")[0], 16)
+                if size == 0:
+                    # Skip optional trailers up to the final blank line
+                    while self._readline():
+                        pass
+                    break
+                chunks.append(self._read(size))
+                self._readline()
+            body = b"".join(chunks)
+        elif b"content-length" in headers:
+            body = self._read(int(headers[b"content-length"]))
+        elif status in (204, 304) or 100 <= status < 200:
+            body = b""
+        else:
+            body = self._read_until_close()
+            headers[b"connection"] = b"close"
+
+        return status, headers, body
+
+    def request(self, method, path, body=None, content_type='application/json'):
+        """Send a request and return (status, body bytes)"""
+        if isinstance(body, str):
+            body = body.encode()
+
+        reused = self.sock is not None
+        if reused and self._is_stale():
+            self.close()
+            reused = False
+
+        for attempt in (0, 1):
+            if self.sock is None:
+                self._connect()
+            received = False
+            try:
+                self._send(self._build_request(method, path, body, content_type))
+                if body:
+                    self._send(body)
+                self._fill()
+                received = True
+                status, headers, data = self._read_response()
+            except OSError:
+                self.close()
+                # Only a reused socket that died before answering is
+                # retried; a fresh connection failing is a real error.
+                if attempt or not reused or received:
+                    raise
+                reused = False
+                continue
+
+            self.requests += 1
+            if reused:
+                self.reused += 1
+            if headers.get(b"connection", b"").lower() == b"close":
+                self.close()
+            return status, data
+
+
+def _import_asyncio():
+    """Import uasyncio/asyncio lazily so sync-only users don't pay for it"""
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    return asyncio
+
+
+class AsyncKeepAliveConnection(_BaseConnection):
+    """Persistent HTTP/1.1 connection driven by (u)asyncio streams.
+
+    Same protocol handling as KeepAliveConnection, but every socket wait
+    yields to the event loop, so a slow server never blocks other tasks.
+    """
+
+    def __init__(self, host, port=443, use_ssl=True, timeout=10):
+        super().__init__(host, port, use_ssl, timeout)
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        """Open a new stream connection to the host"""
+        asyncio = _import_asyncio()
+        if self.use_ssl:
+            _reserve(TLS_HEAP)
+        with self.connect_timer:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=True if self.use_ssl else None)
+        if self.connects:
+            self.reconnects += 1
+        self.connects += 1
+
+    async def close(self):
+        """Close the underlying stream"""
+        writer = self.writer
+        self.reader = None
+        self.writer = None
+        if writer is not None:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def abort(self):
+        """Close the stream without waiting (from outside a coroutine)"""
+        writer = self.writer
+        self.reader = None
+        self.writer = None
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _readline(self):
+        """Read one CRLF-terminated line (without the terminator)"""
+        line = await self.reader.readline()
+        if not line:
+            raise StaleConnection("Connection closed by server")
+        return line.rstrip(b"\r\n")
+
+    async def _read_response(self):
+        """Read status line, headers and body; return (status, headers, body)"""
+        status = int((await self._readline()).split(b" ", 2)[1])
+
+        headers = {}
+        while True:
+            line = await self._readline()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get(b"transfer-encoding", b"").lower() == b"chunked":
+            chunks = []
+            while True:
+                size = int((await self._readline()).split(b";")[0], 16)
+                if size == 0:
+                    while await self._readline():
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self._readline()
+            body = b"".join(chunks)
+        elif b"content-length" in headers:
+            body = await self.reader.readexactly(int(headers[b"content-length"]))
+        elif status in (204, 304) or 100 <= status < 200:
+            body = b""
+        else:
+            body = await self.reader.read(-1)
+            headers[b"connection"] = b"close"
+
+        return status, headers, body
+
+    async def _exchange(self, head, body):
+        """Send one request and read its response"""
+        self.writer.write(head)
+        if body:
+            self.writer.write(body)
+        await self.writer.drain()
+        return await self._read_response()
+
+    async def request(self, method, path, body=None, content_type='application/json'):
+        """Send a request and return (status, body bytes)"""
+        asyncio = _import_asyncio()
+        if isinstance(body, str):
+            body = body.encode()
+        head = self._build_request(method, path, body, content_type)
+
+        reused = self.writer is not None
+        for attempt in (0, 1):
+            if self.writer is None:
+                await asyncio.wait_for(self._connect(), self.timeout)
+            try:
+                status, headers, data = await asyncio.wait_for(
+                    self._exchange(head, body), self.timeout)
+            except (OSError, EOFError) as e:
+                await self.close()
+                # Retry once only if a reused connection had gone stale
+                if attempt or not reused or not isinstance(e, (StaleConnection, EOFError)):
+                    raise
+                reused = False
+                continue
+
+            self.requests += 1
+            if reused:
+                self.reused += 1
+            if headers.get(b"connection", b"").lower() == b"close":
+                await self.close()
+            return status, data
+
+
+# Alphabet used by Firebase push IDs, in ASCII order so keys sort by time
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+
+# Characters that need no percent-encoding in a query value
+_UNRESERVED = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.~"
+
+
+def _quote(text):
+    """Percent-encode a query parameter value"""
+    out = []
+    for byte in text.encode():
+        if byte in _UNRESERVED:
+            out.append(chr(byte))
+        else:
+            out.append("%%%02X" % byte)
+    return "".join(out)
+
+
+def _child(value, path):
+    """Value of a child path inside a node (None if missing)"""
+    for part in path.split("/"):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _sort_key(value):
+    """Firebase ordering: null < false < true < numbers < strings < objects"""
+    if value is None:
+        return (0, 0)
+    if value is False or value is True:
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+
+def _now_ms():
+    """Current wall-clock time in milliseconds"""
+    if hasattr(time, 'time_ns'):
+        return time.time_ns() // 1000000
+    return int(time.time() * 1000)
+
+
+def encode_push_time(timestamp_ms):
+    """The 8-char time prefix of a push key for timestamp_ms"""
+    now = int(timestamp_ms)
+    chars = []
+    for _ in range(8):
+        chars.append(PUSH_CHARS[now % 64])
+        now //= 64
+    chars.reverse()
+    return ''.join(chars)
+
+
+def decode_push_time(key):
+    """Creation time in ms encoded in a push key (None if it is not one)"""
+    if len(key) != 20:
+        return None
+    ms = 0
+    for char in key[:8]:
+        digit = PUSH_CHARS.find(char)
+        if digit < 0:
+            return None
+        ms = ms * 64 + digit
+    return ms
+
+
+class PushKeyGenerator:
+    """Firebase push IDs: 8 chars of milliseconds + 12 random chars.
+
+    Keys generated in the same millisecond increment the random part,
+    so they still sort in generation order.
+    """
+
     def __init__(self):
-        self.base_url = keys.FIREBASE_URL.rstrip('/')
+        self._last_ms = 0
+        self._last_rand = [0] * 12
+
+    def generate(self, timestamp_ms=None):
+        """Return a new key for timestamp_ms (default: now)"""
+        now = _now_ms() if timestamp_ms is None else int(timestamp_ms)
+        rand = self._last_rand
+        if now == self._last_ms:
+            # Same millisecond: increment the random part to keep ordering
+            i = 11
+            while i >= 0 and rand[i] == 63:
+                rand[i] = 0
+                i -= 1
+            if i >= 0:
+                rand[i] += 1
+        else:
+            for i in range(12):
+                rand[i] = random.getrandbits(6)
+        self._last_ms = now
+
+        chars = [encode_push_time(now)]
+        for i in range(12):
+            chars.append(PUSH_CHARS[rand[i]])
+        return ''.join(chars)
+
+
+class FirebaseClient:
+    def __init__(self, keep_alive=False, metrics=None, url=None, station_id=None):
+        # url overrides the Firebase URL, e.g. to send through a LAN
+        # gateway (gateway.py) over plain HTTP instead of TLS
+        self.base_url = (url or keys.FIREBASE_URL).rstrip('/')
         self.secret = keys.FIREBASE_SECRET
+        self.firebase_url = keys.FIREBASE_URL.rstrip('/')
+
+        # Sent as X-Station-Id so a gateway can keep per-station stats
+        self.station_id = station_id
+        self.headers = ""
+        if station_id:
+            self.headers = "X-Station-Id: %s\r\n" % station_id
+
+        # Client-side push key generation
+        self.push_keys = PushKeyGenerator()
 
-    def _build_url(self, path):
-        """Build complete Firebase URL"""
-        url = f"{self.base_url}/{path}.json"
-        if self.secret:
-            url += f"?auth={self.secret}"
+        # Optional persistent connection to the Firebase host
+        self.connection = None
+        self.async_connection = None
+        self.async_writer = None         # Own buffer: a sync encode must not overwrite a body being sent
+        self._async_lock = None
+
+        # Reused request body buffer for the keep-alive transports
+        self.writer = JsonWriter()
+
+        # Optional Metrics instance timing encode/connect/http stages
+        self.metrics = metrics
+        if keep_alive:
+            scheme, host, port, _ = _split_url(self.base_url)
+            self.connection = KeepAliveConnection(
+                host, port, use_ssl=(scheme == 'https'))
+            self.connection.headers = self.headers
+            if metrics is not None:
+                self.connection.connect_timer = metrics.stage("connect")
+
+    def _build_url(self, path, query=None, base_url=None):
+        """Build complete Firebase URL
+
+        query is a list of (name, value) pairs, already JSON-encoded
+        where the REST API expects it. base_url replaces the client's.
+        The secret is only sent straight to Firebase, never to a gateway
+        (which adds its own and may be reached over plain HTTP).
+        """
+        base = (base_url or self.base_url).rstrip('/')
+        url = f"{base}/{path}.json"
+        params = []
+        if self.secret and base == self.firebase_url:
+            params.append(f"auth={self.secret}")
+        if query:
+            for name, value in query:
+                params.append(f"{name}={_quote(value)}")
+        if params:
+            url += "?" + "&".join(params)
         return url
 
-    def _make_request(self, method, url, data=None):
-        """Make HTTP request to Firebase"""
+    def _timer(self, name):
+        """Stage timer for name, or a no-op when metrics are off"""
+        if self.metrics is None:
+            return _NO_TIMER
+        return self.metrics.stage(name)
+
+    def _make_request(self, method, url, data=None, parse=False):
+        """Make HTTP request to Firebase
+
+        With parse=True a successful request returns (True, decoded JSON).
+        """
+        if self.connection is not None:
+            return self._make_keep_alive_request(method, url, data, parse)
+
+        requests = _import_requests()
         if requests is None:
             return False, "Requests module not available"
 
         try:
             headers = {'Content-Type': 'application/json'}
+            if self.station_id:
+                headers['X-Station-Id'] = self.station_id
+            with self._timer("encode"):
+                body = None if data is None else bytes(self.writer.encode(data))
 
-            if method == 'POST':
-                response = requests.post(url, json=data, headers=headers)
-            elif method == 'PUT':
-                response = requests.put(url, json=data, headers=headers)
-            elif method == 'GET':
-                response = requests.get(url, headers=headers)
-            else:
-                return False, f"Unsupported method: {method}"
+            with self._timer("http"):
+                if method == 'POST':
+                    response = requests.post(url, data=body, headers=headers)
+                elif method == 'PUT':
+                    response = requests.put(url, data=body, headers=headers)
+                elif method == 'PATCH':
+                    response = requests.patch(url, data=body, headers=headers)
+                elif method == 'GET':
+                    response = requests.get(url, headers=headers)
+                else:
+                    return False, f"Unsupported method: {method}"
 
             # Check response
             if response.status_code in [200, 201]:
+                if parse:
+                    return True, response.json()
                 return True, "Success"
             else:
                 return False, f"HTTP {response.status_code}: {response.text[:100]}"
@@ -52,6 +683,83 @@ class FirebaseClient:
             if 'response' in locals():
                 response.close()
 
+    def _make_keep_alive_request(self, method, url, data=None, parse=False):
+        """Make HTTP request over the persistent connection"""
+        if method not in ('POST', 'PUT', 'PATCH', 'GET'):
+            return False, f"Unsupported method: {method}"
+
+        try:
+            path = _split_url(url)[3]
+            with self._timer("encode"):
+                body = None if data is None else self.writer.encode(data)
+            with self._timer("http"):
+                status, text = self.connection.request(method, path, body)
+
+            # Check response
+            if status in [200, 201]:
+                if parse:
+                    # Decoded objects take a few times the text's size
+                    _reserve(3 * len(text))
+                    return True, json.loads(text)
+                return True, "Success"
+            else:
+                return False, f"HTTP {status}: {text.decode()[:100]}"
+
+        except Exception as e:
+            self.connection.close()
+            return False, f"Request error: {e}"
+
+    async def _make_async_request(self, method, url, data=None):
+        """Make HTTP request without blocking the event loop"""
+        if self.async_connection is None:
+            scheme, host, port, _ = _split_url(self.base_url)
+            self.async_connection = AsyncKeepAliveConnection(
+                host, port, use_ssl=(scheme == 'https'))
+            self.async_connection.headers = self.headers
+            self.async_writer = JsonWriter()
+            self._async_lock = _import_asyncio().Lock()
+            if self.metrics is not None:
+                self.async_connection.connect_timer = self.metrics.stage("connect")
+
+        # One request at a time: tasks share the connection and the buffer
+        async with self._async_lock:
+            return await self._async_exchange(method, url, data)
+
+    async def _async_exchange(self, method, url, data):
+        """Encode, send and check one request on the async connection"""
+        try:
+            path = _split_url(url)[3]
+            with self._timer("encode"):
+                body = None if data is None else self.async_writer.encode(data)
+            with self._timer("http"):
+                status, text = await self.async_connection.request(method, path, body)
+
+            # Check response
+            if status in [200, 201]:
+                return True, "Success"
+            else:
+                return False, f"HTTP {status}: {text.decode()[:100]}"
+
+        except Exception as e:
+            await self.async_connection.close()
+            return False, f"Request error: {e}"
+
+    async def update_async(self, path, values):
+        """Multi-path PATCH (see update) from an asyncio task"""
+        url = self._build_url(path)
+        return await self._make_async_request('PATCH', url, values)
+
+    def connection_stats(self):
+        """Return keep-alive reuse/reconnect counts (None if disabled)"""
+        if self.connection is None:
+            return None
+        return self.connection.stats()
+
+    def close(self):
+        """Close the persistent connection, if any"""
+        if self.connection is not None:
+            self.connection.close()
+
     def push(self, path, data):
         """Push data to Firebase (creates new entry with auto-generated key)"""
         url = self._build_url(path)
@@ -62,10 +770,115 @@ class FirebaseClient:
         url = self._build_url(path)
         return self._make_request('PUT', url, data)
 
-    def get(self, path):
-        """Get data from Firebase path"""
+    def update(self, path, values):
+        """Write several child paths in one atomic multi-path PATCH.
+
+        values maps paths relative to path to their new value, e.g.
+        {"weather_readings/<key>": reading, "latest_reading": reading}.
+        A value of None deletes that path.
+        """
         url = self._build_url(path)
-        return self._make_request('GET', url)
+        return self._make_request('PATCH', url, values)
+
+    def generate_push_key(self, timestamp_ms=None):
+        """Generate a chronologically ordered Firebase push key locally.
+
+        timestamp_ms defaults to the current time; replayed readings pass
+        their own timestamp so they sort where they were measured.
+        """
+        return self.push_keys.generate(timestamp_ms)
+
+    def get(self, path, order_by=None, start_at=None, end_at=None, equal_to=None,
+            limit_to_first=None, limit_to_last=None, shallow=False):
+        """Get data from Firebase path; returns (True, data) or (False, error)
+
+        The filters map to the REST query parameters: order_by is "$key",
+        "$value" or a child name such as "timestamp" (which needs an
+        .indexOn rule). start_at/end_at are inclusive. shallow=True
+        returns {key: True} for the children instead of their contents
+        and cannot be combined with the other filters. Firebase returns
+        filtered results as an object in no particular order.
+        """
+        query = []
+        if shallow:
+            query.append(("shallow", "true"))
+        if order_by is not None:
+            query.append(("orderBy", json.dumps(order_by)))
+        if start_at is not None:
+            query.append(("startAt", json.dumps(start_at)))
+        if end_at is not None:
+            query.append(("endAt", json.dumps(end_at)))
+        if equal_to is not None:
+            query.append(("equalTo", json.dumps(equal_to)))
+        if limit_to_first is not None:
+            query.append(("limitToFirst", str(int(limit_to_first))))
+        if limit_to_last is not None:
+            query.append(("limitToLast", str(int(limit_to_last))))
+        url = self._build_url(path, query)
+        return self._make_request('GET', url, parse=True)
+
+    def iter_children(self, path, page_size=50, order_by="$key", start_at=None, end_at=None):
+        """Yield (key, value) for every child of path in order, one page at a time.
+
+        Each request fetches at most page_size children (plus any already
+        seen ties), so memory stays bounded however large the path is.
+        order_by is "$key" or a child name. Raises OSError if a page
+        cannot be fetched.
+        """
+        by_key = order_by == "$key"
+        last = None                      # (value, key) of the last child yielded
+        limit = page_size
+        while True:
+            success, page = self.get(path, order_by=order_by,
+                                     start_at=start_at if last is None else last[0],
+                                     end_at=end_at, limit_to_first=limit)
+            if not success:
+                raise OSError(page)
+            if not page:
+                return
+            items = []
+            for key in page:
+                value = page[key]
+                order = key if by_key else _child(value, order_by)
+                items.append((_sort_key(order), key, value))
+            page = None
+            items.sort(key=lambda item: (item[0], item[1]))
+
+            fresh = 0
+            for order, key, value in items:
+                # The page restarts at the last value; skip what was already yielded
+                if last is not None and (order, key) <= (_sort_key(last[0]), last[1]):
+                    continue
+                fresh += 1
+                last = (key if by_key else _child(value, order_by), key)
+                yield key, value
+            if len(items) < limit:
+                return
+            # A page of nothing but ties with the last value: fetch more at once
+            limit = limit * 2 if not fresh else page_size + (len(items) - fresh)
+
+    def stream(self, path, on_event, base_url=None, **options):
+        """Return an EventStream for path; call its poll() regularly.
+
+        on_event(event, path, data) receives Firebase "put"/"patch"
+        events; path is relative to the streamed location. base_url
+        overrides the client's URL (a gateway cannot relay streams).
+        """
+        from event_stream import EventStream
+        return EventStream(self._build_url(path, base_url=base_url), on_event, **options)
+
+    def time_key(self, timestamp_ms):
+        """Push-key prefix for a time, for order_by="$key" range queries.
+
+        Push keys start with their creation time, so
+        get("weather_readings", order_by="$key", start_at=client.time_key(t))
+        returns the readings pushed since t without needing an index.
+        """
+        return encode_push_time(timestamp_ms)
+
+    def key_time(self, key):
+        """Creation time in ms encoded in a push key (None if it is not one)"""
+        return decode_push_time(key)
 
 
 def test_firebase_connection():
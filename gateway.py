@@ -0,0 +1,479 @@
+import argparse
+import asyncio
+import json
+import socket
+import time
+import keys
+from firebase_client import AsyncKeepAliveConnection, PushKeyGenerator, _split_url
+from metrics import Metrics
+
+# LAN ingest gateway (runs on a computer with CPython, not on the Pico).
+# Stations send their Firebase REST requests here over plain HTTP by
+# setting GATEWAY_URL in keys.py. Writes from all stations are merged
+# into time-bounded batches and sent upstream as multi-path PATCHes over
+# a small pool of keep-alive TLS connections. A station gets its answer
+# once its batch is written, so failed writes still land in its offline
+# queue. GETs are passed straight through.
+#
+#     python gateway.py --port 8080 --pool 4
+
+LISTEN_PORT = 8080
+POOL_SIZE = 4                        # Upstream connections (= batches in flight)
+BATCH_MAX_PATHS = 500                # Paths per upstream PATCH
+BATCH_MAX_DELAY = 0.05               # Seconds a batch stays open
+MAX_PENDING = 20000                  # Paths accepted but not yet written
+MAX_BODY = 64 * 1024                 # Largest request body accepted
+UPSTREAM_TIMEOUT = 10                # Seconds per upstream request
+STATS_INTERVAL = 60                  # Seconds between status lines
+
+REASONS = {200: b"OK", 400: b"Bad Request", 405: b"Method Not Allowed",
+           413: b"Payload Too Large", 502: b"Bad Gateway", 503: b"Service Unavailable"}
+
+
+def _nested(path, paths):
+    """True if path is, contains or is inside one of paths"""
+    if path in paths:
+        return True
+    parent = path
+    while "/" in parent:
+        parent = parent[:parent.rindex("/")]
+        if parent in paths:
+            return True
+    prefix = path + "/"
+    for other in paths:
+        if other.startswith(prefix):
+            return True
+    return False
+
+
+def _join(path, key):
+    """Join a base path and a relative key into one database path"""
+    key = key.strip("/")
+    if not path:
+        return key
+    return path + "/" + key if key else path
+
+
+class _Batch:
+    """Writes waiting to go upstream together in one multi-path PATCH"""
+
+    def __init__(self):
+        self.values = {}                 # Database path -> value
+        self.parents = set()             # Every proper ancestor of those paths
+        self.entries = []                # (values, future) per station request
+        self.writers = {}                # Station -> paths it wrote here
+        self.size = 0                    # Paths counted against MAX_PENDING
+        self.timer = None
+        self.done = asyncio.Event()
+
+    def conflicts(self, path):
+        """True if path is an ancestor or descendant of a path in the batch.
+
+        Firebase rejects multi-path updates containing nested paths.
+        """
+        if path in self.parents:
+            return True
+        parent = path
+        while "/" in parent:
+            parent = parent[:parent.rindex("/")]
+            if parent in self.values:
+                return True
+        return False
+
+    def overlaps(self, other):
+        """True if a station in other writes a path it also wrote here.
+
+        Paths nested with each other count as the same. Writes from
+        different stations are not ordered against each other (they
+        race on the way in anyway), so shared paths like
+        latest_reading do not hold batches back.
+        """
+        for station in other.writers:
+            ours = self.writers.get(station)
+            if ours is None:
+                continue
+            for path in other.writers[station]:
+                if _nested(path, ours):
+                    return True
+        return False
+
+    def add(self, values, future, station=None):
+        """Merge one request's paths into the batch"""
+        written = self.writers.get(station)
+        if written is None:
+            written = self.writers[station] = set()
+        for path in values:
+            self.values[path] = values[path]
+            written.add(path)
+            parent = path
+            while "/" in parent:
+                parent = parent[:parent.rindex("/")]
+                if parent in self.parents:
+                    break                # Its ancestors are already there
+                self.parents.add(parent)
+        self.entries.append((values, future))
+        self.size += len(values)
+
+
+class Gateway:
+    """Fan-in of station writes into batched upstream multi-path PATCHes.
+
+    A batch is sealed when it reaches max_paths, after max_delay seconds,
+    or when a new path would nest with one already in it. Sealed batches
+    wait for a free pooled connection. A batch in which a station
+    touches paths it also wrote in a batch still in flight waits for
+    it, so each station's writes land in arrival order. Once max_pending paths are waiting, new writes are refused
+    with HTTP 503 and stations fall back to their offline queue.
+    """
+
+    def __init__(self, upstream_url=None, secret=None, pool_size=POOL_SIZE,
+                 max_paths=BATCH_MAX_PATHS, max_delay=BATCH_MAX_DELAY,
+                 max_pending=MAX_PENDING, timeout=UPSTREAM_TIMEOUT):
+        scheme, host, port, path = _split_url((upstream_url or keys.FIREBASE_URL).rstrip("/"))
+        self.base_path = path.rstrip("/")
+        self.secret = keys.FIREBASE_SECRET if secret is None else secret
+        self.max_paths = max_paths
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+
+        self.connections = []
+        for _ in range(pool_size):
+            self.connections.append(AsyncKeepAliveConnection(
+                host, port, use_ssl=(scheme == "https"), timeout=timeout))
+        self.pool = None                 # asyncio.Queue of idle connections
+        self.ready = None                # asyncio.Queue of sealed batches
+        self.batch = None                # Batch currently being filled
+        self.inflight = set()            # Batches being written upstream
+        self.pending = 0
+        self.push_keys = PushKeyGenerator()
+        self.metrics = Metrics()
+        self.server = None
+        self.loop = None
+        self._tasks = set()
+
+        # Totals and per-station counters
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.paths_written = 0
+        self.failed = 0
+        self.stations = {}
+
+    # Batching ---------------------------------------------------------------
+
+    def submit(self, values, station=None):
+        """Queue {path: value} for upload; return a future or None if full.
+
+        The future resolves to (status, response body) of the upstream write.
+        """
+        if self.pending + len(values) > self.max_pending:
+            return None
+        batch = self.batch
+        if batch is not None:
+            if len(batch.values) + len(values) > self.max_paths:
+                self._seal()
+            else:
+                for path in values:
+                    if batch.conflicts(path):
+                        self._seal()
+                        break
+        if self.batch is None:
+            self.batch = _Batch()
+            self.batch.timer = self.loop.call_later(self.max_delay, self._seal, self.batch)
+
+        future = self.loop.create_future()
+        self.batch.add(values, future, station)
+        self.pending += len(values)
+        self.accepted += len(values)
+        if len(self.batch.values) >= self.max_paths:
+            self._seal()
+        return future
+
+    def _seal(self, batch=None):
+        """Close the open batch (only if it is still batch) and queue it"""
+        current = self.batch
+        if current is None or (batch is not None and batch is not current):
+            return
+        current.timer.cancel()
+        self.batch = None
+        self.ready.put_nowait(current)
+
+    async def _dispatch(self):
+        """Hand each sealed batch to the next idle upstream connection"""
+        while True:
+            batch = await self.ready.get()
+            for other in list(self.inflight):
+                if other.overlaps(batch):
+                    await other.done.wait()
+            connection = await self.pool.get()
+            self.inflight.add(batch)
+            task = asyncio.create_task(self._write(batch, connection))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch, connection):
+        """Write one batch and resolve the futures of its requests"""
+        try:
+            status, data = await self._patch(connection, batch.values)
+            if status in (500, 502, 503, 504, 0):
+                status, data = await self._patch(connection, batch.values)
+            if status == 400 and len(batch.entries) > 1:
+                # One bad request must not fail the rest: write them one by one
+                for values, future in batch.entries:
+                    self._resolve(future, await self._patch(connection, values))
+            else:
+                for values, future in batch.entries:
+                    self._resolve(future, (status, data))
+            if status in (200, 201):
+                self.batches += 1
+                self.paths_written += len(batch.values)
+        finally:
+            self.pending -= batch.size
+            self.inflight.discard(batch)
+            batch.done.set()
+            self.pool.put_nowait(connection)
+
+    @staticmethod
+    def _resolve(future, result):
+        if not future.done():
+            future.set_result(result)
+
+    async def _patch(self, connection, values):
+        """Send one multi-path PATCH; return (status, response body)"""
+        body = json.dumps(values, separators=(",", ":")).encode()
+        start = time.monotonic()
+        try:
+            status, data = await connection.request("PATCH", self._url("", ""), body)
+        except Exception as e:
+            await connection.close()
+            self.metrics.fail("upstream")
+            return 0, json.dumps({"error": f"Upstream error: {e}"}).encode()
+        self.metrics.stage("upstream").record(int((time.monotonic() - start) * 1000000))
+        if status not in (200, 201):
+            self.metrics.fail("upstream")
+        return status, data
+
+    def _url(self, path, query):
+        """Upstream request target for a database path and query string"""
+        params = []
+        for param in query.split("&"):
+            if param and not param.startswith("auth="):
+                params.append(param)
+        if self.secret:
+            params.append("auth=" + self.secret)
+        target = self.base_path + "/" + path + ".json"
+        return target + "?" + "&".join(params) if params else target
+
+    async def _passthrough(self, method, path, query, body):
+        """Forward a request that cannot be batched (GET, root writes)"""
+        connection = await self.pool.get()
+        try:
+            return await connection.request(method, self._url(path, query), body or None)
+        except Exception as e:
+            await connection.close()
+            self.metrics.fail("upstream")
+            return 503, json.dumps({"error": f"Upstream error: {e}"}).encode()
+        finally:
+            self.pool.put_nowait(connection)
+
+    # Station-facing HTTP ------------------------------------------------------
+
+    def _station(self, station):
+        """Counters for one station, created on first contact"""
+        stats = self.stations.get(station)
+        if stats is None:
+            stats = {"requests": 0, "paths": 0, "bytes": 0, "rejected": 0,
+                     "failed": 0, "last_seen": 0}
+            self.stations[station] = stats
+        return stats
+
+    async def handle(self, method, target, body, station):
+        """Serve one station request; return (status, response body)"""
+        stats = self._station(station)
+        stats["requests"] += 1
+        stats["bytes"] += len(body)
+        stats["last_seen"] = int(time.time())
+
+        path, _, query = target.partition("?")
+        path = path.strip("/")
+        if path.endswith(".json"):
+            path = path[:-5].rstrip("/")
+
+        if method == "GET":
+            if path == ".stats":
+                return 200, json.dumps(self.stats()).encode()
+            return await self._passthrough(method, path, query, None)
+        if method not in ("PUT", "PATCH", "POST", "DELETE"):
+            return 405, b'{"error":"Method not allowed"}'
+
+        try:
+            value = json.loads(body) if body else None
+        except ValueError:
+            return 400, b'{"error":"Invalid JSON"}'
+
+        if method == "POST":
+            key = self.push_keys.generate()
+            values = {_join(path, key): value}
+            out = b'{"name":"%s"}' % key.encode()
+        elif method == "PATCH":
+            if not isinstance(value, dict):
+                return 400, b'{"error":"PATCH body must be an object"}'
+            values = {}
+            for key in value:
+                values[_join(path, key)] = value[key]
+            out = body
+        elif not path:
+            # A root PUT/DELETE replaces everything; don't batch it
+            return await self._passthrough(method, path, query, body)
+        else:
+            values = {path: value}
+            out = body if method == "PUT" else b"null"
+
+        future = self.submit(values, station)
+        if future is None:
+            stats["rejected"] += 1
+            self.rejected += 1
+            return 503, b'{"error":"Gateway busy"}'
+        stats["paths"] += len(values)
+
+        status, data = await future
+        if status in (200, 201):
+            return 200, out
+        stats["failed"] += 1
+        self.failed += 1
+        # Firebase's error for bad data; anything else is worth a retry
+        return (400 if status == 400 else 503), data
+
+    async def _serve(self, reader, writer):
+        """HTTP/1.1 keep-alive loop for one station connection"""
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        peer = writer.get_extra_info("peername")
+        default_station = peer[0] if peer else "unknown"
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+
+                length = 0
+                station = default_station
+                close = False
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.partition(b":")
+                    name = name.strip().lower()
+                    if name == b"content-length":
+                        length = int(value)
+                    elif name == b"x-station-id":
+                        station = value.strip().decode()
+                    elif name == b"connection":
+                        close = value.strip().lower() == b"close"
+
+                if length > MAX_BODY:
+                    status, out = 413, b'{"error":"Body too large"}'
+                    close = True
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, out = await self.handle(method, target, body, station)
+
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n%s\r\n%s" % (
+                                 status, REASONS.get(status, b"OK"), len(out),
+                                 b"Connection: close\r\n" if close else b"", out))
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass                         # Malformed request or station went away
+        finally:
+            writer.close()
+
+    # Lifecycle ----------------------------------------------------------------
+
+    async def start(self, host="0.0.0.0", port=LISTEN_PORT):
+        """Start listening and dispatching; returns the bound port"""
+        self.loop = asyncio.get_running_loop()
+        self.pool = asyncio.Queue()
+        self.ready = asyncio.Queue()
+        for connection in self.connections:
+            self.pool.put_nowait(connection)
+        dispatcher = asyncio.create_task(self._dispatch())
+        self._tasks.add(dispatcher)
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self, timeout=5):
+        """Stop accepting, flush what is queued, close upstream connections"""
+        if self.server is not None:
+            self.server.close()
+        self._seal()
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        for task in list(self._tasks):
+            task.cancel()
+        for connection in self.connections:
+            await connection.close()
+
+    def stats(self):
+        """Totals, upstream latency and per-station counters"""
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "pending": self.pending,
+            "batches": self.batches,
+            "paths_written": self.paths_written,
+            "mean_batch": self.paths_written // self.batches if self.batches else 0,
+            "upstream": self.metrics.stage("upstream").snapshot(),
+            "upstream_failures": self.metrics.failures.get("upstream", 0),
+            "connections": [connection.stats() for connection in self.connections],
+            "stations": self.stations,
+        }
+
+
+async def _report(gateway, interval):
+    """Print a status line every interval seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        stats = gateway.stats()
+        print(f"{len(stats['stations'])} stations | {stats['accepted']} accepted | "
+              f"{stats['batches']} batches (mean {stats['mean_batch']} paths) | "
+              f"{stats['rejected']} rejected | {stats['failed']} failed | "
+              f"upstream mean {stats['upstream']['mean_ms']} ms")
+
+
+async def serve(args):
+    gateway = Gateway(args.upstream, pool_size=args.pool, max_paths=args.max_paths,
+                      max_delay=args.max_delay, max_pending=args.max_pending)
+    port = await gateway.start(args.host, args.port)
+    print(f"Gateway listening on {args.host}:{port}")
+    try:
+        await _report(gateway, STATS_INTERVAL)
+    finally:
+        await gateway.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-station Firebase ingest gateway")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=LISTEN_PORT)
+    parser.add_argument("--upstream", help="Firebase URL (default: keys.FIREBASE_URL)")
+    parser.add_argument("--pool", type=int, default=POOL_SIZE, help="upstream connections")
+    parser.add_argument("--max-paths", type=int, default=BATCH_MAX_PATHS)
+    parser.add_argument("--max-delay", type=float, default=BATCH_MAX_DELAY)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\nGateway stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import json
+from reading import Reading, FIELDS
+
+# Pre-encoded strings for the reading record, so encoding a reading
+# copies bytes into the buffer without creating any new objects
+LIGHT_LEVELS = ("Very Bright", "Bright", "Dim", "Dark", "Very Dark")
+
+COMPACT_KEYS = ("t", "c", "h", "l", "n", "x", "s", "p", "v")   # compact.py wire keys
+
+_ENCODED = {}
+for _s in FIELDS + LIGHT_LEVELS + COMPACT_KEYS + ("latest_reading",):
+    _ENCODED[_s] = ('"%s"' % _s).encode()
+
+_DIGITS = b"0123456789"
+_INF = float("inf")
+
+
+class JsonWriter:
+    """JSON encoder that writes straight into a reusable bytearray.
+
+    encode() returns a memoryview of the encoded bytes; its length is
+    the Content-Length. Integers, booleans, None and the pre-encoded
+    reading keys and light labels are written without allocating.
+    Other strings and floats fall back to a small temporary encoding.
+    The buffer doubles in size if a payload does not fit.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.pos = 0
+
+    def _reserve(self, n):
+        """Make room for n more bytes"""
+        if self.pos + n > len(self.buf):
+            size = len(self.buf) * 2
+            while self.pos + n > size:
+                size *= 2
+            buf = bytearray(size)
+            buf[:self.pos] = self.view[:self.pos]
+            self.buf = buf
+            self.view = memoryview(buf)
+
+    def shrink(self):
+        """Drop a grown buffer back to its initial size (frees memory)"""
+        if len(self.buf) > self.size:
+            self.buf = bytearray(self.size)
+            self.view = memoryview(self.buf)
+            self.pos = 0
+
+    def raw(self, data):
+        """Append bytes as-is"""
+        n = len(data)
+        self._reserve(n)
+        self.view[self.pos:self.pos + n] = data
+        self.pos += n
+
+    def byte(self, value):
+        """Append a single byte value"""
+        self._reserve(1)
+        self.buf[self.pos] = value
+        self.pos += 1
+
+    def write_int(self, value):
+        """Append an integer in decimal without building a string"""
+        if value < 0:
+            self.byte(45)                      # '-'
+            value = -value
+        digits = 1
+        scale = 10
+        while value >= scale:
+            digits += 1
+            scale *= 10
+        self._reserve(digits)
+        end = self.pos + digits
+        i = end
+        while True:
+            i -= 1
+            self.buf[i] = _DIGITS[value % 10]
+            value //= 10
+            if i == self.pos:
+                break
+        self.pos = end
+
+    def write_str(self, value):
+        """Append a JSON string"""
+        encoded = _ENCODED.get(value)
+        if encoded is None:
+            encoded = json.dumps(value).encode()
+        self.raw(encoded)
+
+    def write_value(self, value):
+        """Append any JSON-serializable value"""
+        if value is None:
+            self.raw(b"null")
+        elif value is True:
+            self.raw(b"true")
+        elif value is False:
+            self.raw(b"false")
+        elif isinstance(value, int):
+            self.write_int(value)
+        elif isinstance(value, float):
+            if value != value or abs(value) == _INF:
+                # JSON has no NaN or infinity; one bad value must not
+                # fail the whole upload
+                self.raw(b"null")
+            elif value == int(value) and abs(value) < 1e15:
+                self.write_int(int(value))
+                self.raw(b".0")
+            else:
+                self.raw(repr(value).encode())
+        elif isinstance(value, str):
+            self.write_str(value)
+        elif isinstance(value, Reading):
+            self.byte(123)                     # '{'
+            for i in range(len(FIELDS)):
+                if i:
+                    self.byte(44)              # ','
+                self.write_str(FIELDS[i])
+                self.byte(58)                  # ':'
+                self.write_value(getattr(value, FIELDS[i]))
+            self.byte(125)                     # '}'
+        elif isinstance(value, dict):
+            self.byte(123)                     # '{'
+            first = True
+            for key in value:
+                if not first:
+                    self.byte(44)              # ','
+                first = False
+                self.write_str(key)
+                self.byte(58)                  # ':'
+                self.write_value(value[key])
+            self.byte(125)                     # '}'
+        elif isinstance(value, (list, tuple)):
+            self.byte(91)                      # '['
+            for i in range(len(value)):
+                if i:
+                    self.byte(44)
+                self.write_value(value[i])
+            self.byte(93)                      # ']'
+        else:
+            raise TypeError("Unsupported JSON type")
+
+    def encode(self, value):
+        """Encode value from the start of the buffer; return a memoryview"""
+        self.pos = 0
+        self.write_value(value)
+        return self.view[:self.pos]
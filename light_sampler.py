@@ -0,0 +1,169 @@
+from array import array
+import math
+from machine import Timer
+
+
+class LightSampler:
+    """High-rate ADC sampling with a ring buffer and window statistics.
+
+    A timer reads the ADC rate times a second into a preallocated
+    array('H') ring. The timer callback only stores the sample and
+    moves the write index, so it never allocates and takes a few
+    microseconds. drain() moves new samples from the ring into integer
+    running sums (count, min, max, sum and sum of squares relative to
+    the window's first sample), optionally through a median-of-N filter
+    to drop single-sample spikes. Small ints do not allocate, so
+    draining creates no garbage; mean and std are worked out as floats
+    once per summary(). Call drain() often enough that the ring does not wrap
+    (size / rate seconds); samples lost to a wrap are counted in
+    overruns. summary() returns the window since the last summary.
+    """
+
+    def __init__(self, adc, rate=100, size=256, median=1, timer_id=-1):
+        self.adc = adc
+        self.rate = rate
+        self.size = size
+        self.ring = array("H", bytes(2 * size))
+        # Indexes count up to a multiple of size, then wrap to 0, so
+        # they stay small ints (no allocation) and head - tail modulo
+        # _wrap is the number of unread samples
+        self._wrap = size * 1024
+        self.head = 0                    # Next slot the timer writes
+        self.tail = 0                    # Next slot drain() reads
+        self.timer = None
+        self.timer_id = timer_id
+        self._tick_cb = self._tick       # Bound once; binding allocates
+
+        # Median-of-N filter state (N odd, 1 = off)
+        self.median = median | 1
+        self._window = array("H", bytes(2 * self.median))
+        self._sorted = array("H", bytes(2 * self.median))
+        self._filled = 0
+        self._next = 0
+
+        self.overruns = 0
+        self.samples = 0                 # Samples drained since start
+        self.reset()
+
+    def reset(self):
+        """Start a new statistics window"""
+        self.count = 0
+        self.min = 65535
+        self.max = 0
+        # Offset d = value - first sample of the window. The square of d
+        # is summed in three parts (d = 256 * a + b) so every term stays
+        # a small int on rp2 (below 2**30), even at full-scale swings.
+        self._offset = None
+        self._sum = 0                    # Sum of d
+        self._aa = 0                     # Sum of a * a
+        self._ab = 0                     # Sum of a * b
+        self._bb = 0                     # Sum of b * b
+
+    def start(self):
+        """Start sampling from the timer"""
+        if self.timer is None:
+            self.timer = Timer(self.timer_id)
+            self.timer.init(mode=Timer.PERIODIC, freq=self.rate, callback=self._tick_cb)
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    def _tick(self, timer):
+        """Timer callback: store one sample (no allocation)"""
+        head = self.head
+        self.ring[head % self.size] = self.adc.read_u16()
+        head += 1
+        self.head = head if head < self._wrap else 0
+
+    def _filter(self, value):
+        """Median of the last N samples (insertion sort, N is small)"""
+        window = self._window
+        n = self.median
+        window[self._next] = value
+        self._next = (self._next + 1) % n
+        if self._filled < n:
+            self._filled += 1
+            return value                 # Not enough samples yet
+        ordered = self._sorted
+        for i in range(n):
+            v = window[i]
+            j = i
+            while j and ordered[j - 1] > v:
+                ordered[j] = ordered[j - 1]
+                j -= 1
+            ordered[j] = v
+        return ordered[n // 2]
+
+    def drain(self):
+        """Fold unread ring samples into the window; return how many"""
+        head = self.head
+        tail = self.tail
+        unread = (head - tail) % self._wrap
+        if unread >= self.size:
+            # The timer lapped us and overwrote the oldest samples. Keep
+            # one slot spare for the timer to write while we read.
+            self.overruns += unread - (self.size - 1)
+            tail = (head - (self.size - 1)) % self._wrap
+            unread = self.size - 1
+        ring = self.ring
+        size = self.size
+        if unread and self._offset is None:
+            self._offset = ring[tail % size]
+        offset = self._offset
+        for _ in range(unread):
+            value = ring[tail % size]
+            tail += 1
+            if tail == self._wrap:
+                tail = 0
+            if self.median > 1:
+                value = self._filter(value)
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+            self.count += 1
+            d = value - offset
+            a = d >> 8
+            b = d & 0xFF
+            self._sum += d
+            self._aa += a * a
+            self._ab += a * b
+            self._bb += b * b
+        self.tail = tail
+        self.samples += unread
+        return unread
+
+    def mean(self):
+        """Mean of the current window"""
+        if not self.count:
+            return 0.0
+        return self._offset + self._sum / self.count
+
+    def std(self):
+        """Standard deviation of the current window"""
+        n = self.count
+        if n < 2:
+            return 0.0
+        squares = (self._aa << 16) + (self._ab << 9) + self._bb
+        # Exact in ints, so float rounding cannot cancel the variance away
+        return math.sqrt((n * squares - self._sum * self._sum) / (n * (n - 1)))
+
+    def summary(self):
+        """Drain, then return (count, mean, min, max, std) and reset.
+
+        count is 0 if no samples arrived since the last summary.
+        """
+        self.drain()
+        result = (self.count, self.mean(), self.min, self.max, self.std())
+        self.reset()
+        return result
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "samples": self.samples,
+            "overruns": self.overruns,
+            "window": self.count,
+        }
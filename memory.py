@@ -0,0 +1,218 @@
+import gc
+
+# Memory pressure levels
+OK = 0
+LOW = 1                              # Shed optional work, shrink buffers
+CRITICAL = 2                         # Only read, queue and upload readings
+
+MIN_BUDGET = 4096                    # Bytes allocated between collections at least
+PROBE_RATIO = 0.8                    # Size ladder step of the largest-block probe
+PROBE_MIN = 512                      # Smallest block the probe tries
+FRAG_HISTORY = 8                     # Fragmentation samples kept for the trend
+ERROR_HOLD = 3                       # Collections CRITICAL is held after a MemoryError
+
+
+class MemoryManager:
+    """Garbage collection by allocation budget, with fragmentation tracking.
+
+    cycle() is called once per main-loop cycle. It measures how many
+    bytes the cycle allocated (gc.mem_alloc() growth, averaged) and sets
+    the budget to about cycles_per_collect cycles' worth, capped at
+    the free heap minus reserve. It collects only once the budget is
+    used up. maybe_collect() is called while idle and collects early
+    if the next cycle would cross the budget, so collections happen
+    between readings instead of in the middle of an upload.
+    gc.threshold() is set a quarter above the budget as a backstop for
+    an unusually hungry cycle. ensure(nbytes) collects before a known
+    large allocation (TLS handshake, parsing a response) if it may
+    not fit.
+
+    Every probe_every collections, and on each one while only
+    fragmentation can explain the pressure, the largest free block is
+    found by trial allocations with the collector off. The dead trial
+    block would count towards the budget and gc.threshold(), so a
+    probe ends with a collection of its own; a short heap needs no
+    probe to explain the pressure. Fragmentation is
+    1 - largest block / free heap.
+    pressure is LOW when the heap after a collection is below low_water
+    or the largest block is smaller than largest_needed. It is CRITICAL
+    below critical and for a few collections after a MemoryError.
+    """
+
+    def __init__(self, reserve=16384, low_water=40960, critical=20480,
+                 largest_needed=24576, cycles_per_collect=10, probe_every=10, timer=None):
+        self.reserve = reserve
+        self.low_water = low_water
+        self.critical = critical
+        self.largest_needed = largest_needed
+        self.cycles_per_collect = cycles_per_collect
+        self.probe_every = probe_every
+        self.timer = timer               # Optional metrics stage for collections
+        self.native = hasattr(gc, "threshold")  # MicroPython
+
+        self.rate = None                 # Bytes allocated per cycle (average)
+        self.budget = MIN_BUDGET
+        self.pressure = OK
+        self.free_after = gc.mem_free()  # Free heap after the last collection
+        self.largest_free = None         # Largest free block at the last probe
+        self.fragmentation = 0.0
+        self.frag_history = []
+        self._after = gc.mem_alloc()     # mem_alloc() after the last collection
+        self._mark = self._after         # mem_alloc() at the last cycle()
+        self._threshold = None
+        self._hold = 0
+
+        # Counters for monitoring
+        self.collections = 0
+        self.auto_collections = 0        # Started by the allocator, not by us
+        self.forced = 0                  # By ensure() or after a MemoryError
+        self.probe_collections = 0       # Freeing a probe's trial block
+        self.errors = 0
+        self.cycles = 0
+
+    def allocated(self):
+        """Bytes allocated since the last collection"""
+        alloc = gc.mem_alloc()
+        if alloc < self._after:
+            # The allocator collected on its own since
+            self._after = alloc
+        return alloc - self._after
+
+    def collect(self, forced=False, probe=False):
+        """Collect now and re-evaluate fragmentation and pressure"""
+        if self.timer is not None:
+            with self.timer:
+                gc.collect()
+        else:
+            gc.collect()
+        self.collections += 1
+        if forced:
+            self.forced += 1
+        free = gc.mem_free()
+        self.free_after = free
+        # Probe now and then, and every time while fragmentation may be
+        # what keeps the pressure up, so a recovery is noticed
+        if probe or (self.pressure != OK and free >= self.low_water) or \
+                (self.collections - 1) % self.probe_every == 0:
+            self.probe()
+        self._after = self._mark = gc.mem_alloc()
+        self._update_pressure()
+
+    def probe(self):
+        """Measure the largest free block (call right after a collection)"""
+        free = gc.mem_free()
+        largest = 0
+        if self.native:
+            # Trial allocations from large to small; with the collector
+            # off a failed attempt costs a scan, not a collection
+            size = free
+            gc.disable()
+            try:
+                while size >= PROBE_MIN:
+                    try:
+                        block = bytearray(size)
+                        block = None
+                        largest = size
+                        break
+                    except MemoryError:
+                        size = int(size * PROBE_RATIO)
+            finally:
+                gc.enable()
+            if largest:
+                # Free the trial block before it triggers a collection
+                gc.collect()
+                self.probe_collections += 1
+        else:
+            largest = free               # No fragmentation to see on the host
+        self.largest_free = largest
+        self.fragmentation = 1 - largest / free if free else 0.0
+        self.frag_history.append(round(self.fragmentation, 3))
+        if len(self.frag_history) > FRAG_HISTORY:
+            self.frag_history.pop(0)
+        return largest
+
+    def _update_pressure(self):
+        free = self.free_after
+        if free < self.critical or self._hold:
+            level = CRITICAL
+        elif free < self.low_water or (
+                self.largest_free is not None and self.largest_free < self.largest_needed):
+            level = LOW
+        else:
+            level = OK
+        if self._hold:
+            self._hold -= 1
+        self.pressure = level
+
+    def _set_budget(self):
+        ceiling = self.free_after - self.reserve
+        budget = ceiling if self.rate is None else int(self.rate * self.cycles_per_collect)
+        budget = max(MIN_BUDGET, min(budget, ceiling))
+        self.budget = budget
+        threshold = budget + budget // 4
+        # Only touch the allocator when the threshold moves noticeably
+        if self.native and (self._threshold is None or
+                            abs(threshold - self._threshold) > self._threshold // 8):
+            gc.threshold(threshold)
+            self._threshold = threshold
+
+    def cycle(self):
+        """Once per main-loop cycle: update the rate and budget, collect if over"""
+        self.cycles += 1
+        alloc = gc.mem_alloc()
+        grown = alloc - self._mark
+        if grown < 0:
+            self.auto_collections += 1   # Allocator collected mid-cycle
+        elif self.rate is None:
+            self.rate = grown
+        else:
+            self.rate += (grown - self.rate) // 4
+        self._mark = alloc
+        self._set_budget()
+        if self.allocated() >= self.budget:
+            self.collect()
+            self._set_budget()
+
+    def maybe_collect(self):
+        """Collect now (while idle) if the next cycle would cross the budget"""
+        rate = self.rate or 0
+        if self.allocated() + rate + rate // 2 >= self.budget:
+            self.collect()
+            self._set_budget()
+            return True
+        return False
+
+    def ensure(self, nbytes):
+        """Make room before allocating about nbytes; return False if short.
+
+        Fits firebase_client.reserve.
+        """
+        free = gc.mem_free()
+        largest = self.largest_free
+        if free - nbytes >= self.reserve and (largest is None or largest >= nbytes):
+            return True
+        self.collect(forced=True, probe=True)
+        return (self.free_after - nbytes >= self.reserve and
+                self.largest_free >= nbytes)
+
+    def memory_error(self):
+        """Recover from a MemoryError: collect and hold CRITICAL for a while"""
+        self.errors += 1
+        self._hold = ERROR_HOLD
+        self.collect(forced=True)
+
+    def stats(self):
+        return {
+            "pressure": self.pressure,
+            "budget": self.budget,
+            "rate": self.rate,
+            "free_after": self.free_after,
+            "largest_free": self.largest_free,
+            "fragmentation": round(self.fragmentation, 3),
+            "frag_history": list(self.frag_history),
+            "collections": self.collections,
+            "auto_collections": self.auto_collections,
+            "forced": self.forced,
+            "probe_collections": self.probe_collections,
+            "errors": self.errors,
+        }
@@ -0,0 +1,109 @@
+import gc
+from scheduler import ticks_us, ticks_diff
+
+# Histogram bucket upper bounds in microseconds (last bucket is overflow)
+BUCKETS_US = (100, 1000, 5000, 10000, 50000, 100000, 500000, 1000000, 5000000)
+
+
+class Stage:
+    """Fixed-bucket latency histogram, usable as a reusable with-block timer"""
+
+    def __init__(self, name):
+        self.name = name
+        self.buckets = [0] * (len(BUCKETS_US) + 1)
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self._start = 0
+
+    def record(self, elapsed_us):
+        """Add one duration to the histogram"""
+        i = 0
+        while i < len(BUCKETS_US) and elapsed_us > BUCKETS_US[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.total_us += elapsed_us
+        if elapsed_us > self.max_us:
+            self.max_us = elapsed_us
+
+    def __enter__(self):
+        self._start = ticks_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record(ticks_diff(ticks_us(), self._start))
+        return False
+
+    def snapshot(self):
+        """Compact form: count, mean/max in ms and bucket counts"""
+        return {
+            "n": self.count,
+            "mean_ms": self.total_us // self.count // 1000 if self.count else 0,
+            "max_ms": self.max_us // 1000,
+            "buckets": list(self.buckets),
+        }
+
+
+class Metrics:
+    """Per-stage latency histograms, memory watermarks and failure counters.
+
+    Stage timers are created once and reused, so timing a stage costs two
+    tick reads and a short bucket scan. Use as:
+
+        with metrics.stage("sensor"):
+            dht_sensor.measure()
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.failures = {}
+        self.mem_free_low = None
+        self.mem_free_high = None
+        self.mem_alloc_low = None
+        self.mem_alloc_high = None
+
+    def stage(self, name):
+        """Return the (reusable) timer for a stage"""
+        timer = self.stages.get(name)
+        if timer is None:
+            timer = Stage(name)
+            self.stages[name] = timer
+        return timer
+
+    def fail(self, name):
+        """Count a failure of the given kind"""
+        self.failures[name] = self.failures.get(name, 0) + 1
+
+    def sample_memory(self):
+        """Update mem_free/mem_alloc high and low watermarks"""
+        if not hasattr(gc, "mem_alloc"):
+            return
+        free = gc.mem_free()
+        used = gc.mem_alloc()
+        if self.mem_free_low is None or free < self.mem_free_low:
+            self.mem_free_low = free
+        if self.mem_free_high is None or free > self.mem_free_high:
+            self.mem_free_high = free
+        if self.mem_alloc_low is None or used < self.mem_alloc_low:
+            self.mem_alloc_low = used
+        if self.mem_alloc_high is None or used > self.mem_alloc_high:
+            self.mem_alloc_high = used
+
+    def snapshot(self, timestamp):
+        """Compact dict suitable for publishing to Firebase"""
+        stages = {}
+        for name in self.stages:
+            stages[name] = self.stages[name].snapshot()
+        return {
+            "timestamp": timestamp,
+            "bucket_bounds_us": BUCKETS_US,
+            "stages": stages,
+            "memory": {
+                "free_low": self.mem_free_low,
+                "free_high": self.mem_free_high,
+                "alloc_low": self.mem_alloc_low,
+                "alloc_high": self.mem_alloc_high,
+            },
+            "failures": dict(self.failures),
+        }
@@ -0,0 +1,400 @@
+import struct
+try:
+    import uos as os
+except ImportError:
+    import os
+
+# File layout:
+#   [header slot A][header slot B][layout][record 0]...[record capacity-1]
+# The two header slots are written alternately. Each carries a sequence
+# number and a checksum, so a power cut while writing one slot always
+# leaves the other one intact. head and tail are free-running counters
+# (index = counter % capacity), which keeps "full" and "empty" distinct.
+# The layout block names the stored fields, so a file written with other
+# fields (or another capacity) can still be read and moved over on boot.
+# Files from before the layout block (WQ01, WQ02) are moved over too.
+MAGIC = b"WQ03"
+HEADER_FORMAT = "<4sIIIIH"            # magic, seq, capacity, head, tail, check
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+HEADER_SLOT = 32                      # bytes reserved per header slot
+LAYOUT_SIZE = 256                     # length, check, "name:code:scale,..."
+DATA_OFFSET = 2 * HEADER_SLOT + LAYOUT_SIZE
+
+# Fields stored after the timestamp and flags of each record, as (name,
+# struct code, scale). A value is stored as round(value * scale). A value
+# the reading did not have (None) is stored as 0 with bit i of flags set
+# for field i, so every stored value stays valid (light_raw can be 65535).
+# light_level is not stored; it follows from light_raw. The station
+# passes the fields of its registered sensors (queue_fields() in
+# sensors.py); FIELDS matches the default sensors.
+FIELDS = (
+    ("temperature", "h", 10),
+    ("humidity", "H", 10),
+    ("light_raw", "H", 1),
+    ("light_min", "H", 1),
+    ("light_max", "H", 1),
+    ("light_std", "H", 1),
+    ("chip_temperature", "b", 1),
+)
+MAX_FIELDS = 16                       # Bits in flags
+CODES = "bBhHiI"                      # Struct codes a field may use
+
+# Formats from before the layout block, still read so their readings
+# can be moved over: the same header slots with the records right after
+# them, and fixed fields. WQ01 had no flags; it marked a missing value
+# with -32768 (temperature) or 0xFFFF.
+LEGACY_FIELDS = (("temperature", "h", 10), ("humidity", "H", 10), ("light_raw", "H", 1))
+LEGACY = {b"WQ01": False, b"WQ02": True}   # Magic -> records have flags
+LEGACY_MISSING = {"h": -32768, "H": 0xFFFF}
+
+
+def _checksum(data):
+    """Fletcher-16 checksum of a bytes-like object"""
+    a = b = 0
+    for byte in data:
+        a = (a + byte) % 255
+        b = (b + a) % 255
+    return (b << 8) | a
+
+
+def _stored(value, scale):
+    """Value as stored in a record (0 for None, which is flagged)"""
+    if value is None:
+        return 0
+    if scale == 1:
+        return int(value)
+    return int(round(value * scale))
+
+
+def _unscaled(value, scale):
+    """Undo _stored, returning an int when there is no fraction"""
+    if value % scale == 0:
+        return value // scale
+    return value / scale
+
+
+def _layout_text(fields):
+    return ",".join(f"{name}:{code}:{scale}" for name, code, scale in fields)
+
+
+def _parse_layout(text):
+    """Fields from a layout string, or None if it is not valid"""
+    if not text:
+        return ()
+    fields = []
+    try:
+        for item in text.split(","):
+            name, code, scale = item.split(":")
+            if len(code) != 1 or code not in CODES:
+                return None
+            fields.append((name, code, int(scale)))
+    except ValueError:
+        return None
+    return tuple(fields)
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def _parse_header(data):
+    """Return (seq, capacity, head, tail, magic) if the header slot is valid"""
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, seq, capacity, head, tail, check = struct.unpack(HEADER_FORMAT, data)
+    if magic != MAGIC and magic not in LEGACY:
+        return None
+    if check != _checksum(data[:HEADER_SIZE - 2]):
+        return None
+    if head < tail or head - tail > capacity:
+        return None
+    return seq, capacity, head, tail, magic
+
+
+def _record_format(fields, flagged=True):
+    return "<I" + ("H" if flagged else "") + "".join(code for _, code, _ in fields)
+
+
+def _read_file(path):
+    """Describe a valid queue file, or return None.
+
+    Returns (seq, capacity, head, tail, layout, fields, data offset,
+    flagged); layout is None for a legacy file.
+    """
+    try:
+        size = os.stat(path)[6]
+        with open(path, "rb") as f:
+            start = f.read(DATA_OFFSET)
+    except OSError:
+        return None
+    best = None
+    for offset in (0, HEADER_SLOT):
+        header = _parse_header(start[offset:offset + HEADER_SIZE])
+        if header and (best is None or header[0] > best[0]):
+            best = header
+    if best is None:
+        return None
+    seq, capacity, head, tail, magic = best
+    if magic == MAGIC:
+        if len(start) < DATA_OFFSET:
+            return None
+        length, check = struct.unpack_from("<HH", start, 2 * HEADER_SLOT)
+        if length > LAYOUT_SIZE - 4:
+            return None
+        layout = bytes(start[2 * HEADER_SLOT + 4:2 * HEADER_SLOT + 4 + length])
+        if check != _checksum(layout):
+            return None
+        fields = _parse_layout(layout.decode())
+        if fields is None:
+            return None
+        data_offset = DATA_OFFSET
+        flagged = True
+    else:
+        layout = None
+        fields = LEGACY_FIELDS
+        data_offset = 2 * HEADER_SLOT
+        flagged = LEGACY[magic]
+    if size != data_offset + capacity * struct.calcsize(_record_format(fields, flagged)):
+        return None
+    return seq, capacity, head, tail, layout, fields, data_offset, flagged
+
+
+def _decode(record, fields, flagged=True):
+    """Reading dict from an unpacked record"""
+    reading = {"timestamp": record[0]}
+    flags = record[1] if flagged else 0
+    i = 2 if flagged else 1
+    bit = 1
+    for name, code, scale in fields:
+        value = record[i]
+        if flags & bit or (not flagged and value == LEGACY_MISSING.get(code)):
+            reading[name] = None
+        else:
+            reading[name] = _unscaled(value, scale)
+        i += 1
+        bit <<= 1
+    return reading
+
+
+def _stored_readings(path, found, batch=16):
+    """Yield the unsent readings of the queue file described by found"""
+    _, capacity, head, tail, _, fields, data_offset, flagged = found
+    record_format = _record_format(fields, flagged)
+    size = struct.calcsize(record_format)
+    with open(path, "rb") as f:
+        counter = tail
+        while counter < head:
+            index = counter % capacity
+            n = min(batch, head - counter, capacity - index)
+            f.seek(data_offset + index * size)
+            block = f.read(n * size)
+            for i in range(n):
+                yield _decode(struct.unpack_from(record_format, block, i * size),
+                              fields, flagged)
+            counter += n
+
+
+class OfflineQueue:
+    """Durable ring buffer of readings stored in a fixed-size flash file.
+
+    Readings are packed into fixed-width binary records holding the
+    timestamp and the given fields (see FIELDS). To limit flash
+    wear, new readings are held in RAM and written in batches of
+    write_batch records (one data write + one header write per batch),
+    so a power cut can lose at most write_batch - 1 unflushed readings.
+    When the ring is full the oldest readings are overwritten.
+    """
+
+    def __init__(self, path, capacity=2880, write_batch=4, fields=FIELDS):
+        if len(fields) > MAX_FIELDS:
+            raise ValueError("too many queue fields")
+        self.path = path
+        self.capacity = capacity
+        self.write_batch = write_batch
+        self.fields = fields
+        self.layout = _layout_text(fields).encode()
+        if len(self.layout) > LAYOUT_SIZE - 4:
+            raise ValueError("queue layout too long")
+        self.record_format = _record_format(fields)
+        self.record_size = struct.calcsize(self.record_format)
+        self._values = [0] * len(fields)
+
+        self.seq = 0
+        self.head = 0                 # Counter of next record to write
+        self.tail = 0                 # Counter of oldest unsent record
+        self._pending = bytearray(write_batch * self.record_size)
+        self._pending_count = 0
+
+        # Counters for monitoring
+        self.enqueued = 0
+        self.dropped = 0
+        self.drained = 0
+        self.flushes = 0
+
+        self._open()
+
+    def _open(self):
+        """Load the queue file, moving readings over from another format.
+
+        A file with other fields, another capacity or a legacy format is
+        renamed to path + ".old", and its unsent readings are copied into
+        a fresh file. The old file is removed once they are all copied;
+        until then each boot starts the copy again from a fresh file, so
+        a power cut during the move neither loses nor repeats readings.
+        """
+        old = self.path + ".old"
+        if not _exists(old):
+            found = _read_file(self.path)
+            if found and found[1] == self.capacity and found[4] == self.layout:
+                self.seq, _, self.head, self.tail = found[:4]
+                return
+            if found:
+                os.rename(self.path, old)
+            else:
+                if _exists(self.path):
+                    print("Offline queue file has an unknown format - starting a new queue")
+                old = None
+        self._create()
+        if old is not None:
+            self._migrate(old)
+
+    def _migrate(self, path):
+        """Copy the unsent readings of the queue file at path, then remove it"""
+        found = _read_file(path)
+        if found:
+            moved = 0
+            for reading in _stored_readings(path, found):
+                self.push(reading)
+                moved += 1
+            self.flush()
+            self.enqueued -= moved
+            print(f"Offline queue: moved {moved} readings to the new record layout")
+        os.remove(path)
+
+    def _create(self):
+        """Preallocate the ring file so it never grows afterwards"""
+        size = DATA_OFFSET + self.capacity * self.record_size
+        zeros = bytearray(256)
+        with open(self.path, "wb") as f:
+            written = 0
+            while written < size:
+                n = min(256, size - written)
+                f.write(zeros if n == 256 else zeros[:n])
+                written += n
+        self.seq = 0
+        self.head = 0
+        self.tail = 0
+        with open(self.path, "r+b") as f:
+            f.seek(2 * HEADER_SLOT)
+            f.write(struct.pack("<HH", len(self.layout), _checksum(self.layout)))
+            f.write(self.layout)
+            self._write_header(f)
+
+    def _write_header(self, f):
+        """Write head/tail into the older of the two header slots"""
+        self.seq += 1
+        header = bytearray(HEADER_SIZE)
+        struct.pack_into(HEADER_FORMAT, header, 0, MAGIC, self.seq,
+                         self.capacity, self.head, self.tail, 0)
+        struct.pack_into("<H", header, HEADER_SIZE - 2,
+                         _checksum(header[:HEADER_SIZE - 2]))
+        f.seek((self.seq % 2) * HEADER_SLOT)
+        f.write(header)
+        f.flush()
+
+    def push(self, data):
+        """Queue one reading dict; written to flash once a batch is full"""
+        values = self._values
+        flags = 0
+        i = 0
+        for name, _, scale in self.fields:
+            value = data[name] if name in data else None
+            if value is None:
+                flags |= 1 << i
+            values[i] = _stored(value, scale)
+            i += 1
+        struct.pack_into(
+            self.record_format, self._pending, self._pending_count * self.record_size,
+            int(data["timestamp"]), flags, *values)
+        self._pending_count += 1
+        self.enqueued += 1
+        if self._pending_count >= self.write_batch:
+            self.flush()
+
+    def flush(self):
+        """Write buffered readings to flash, then commit the new head"""
+        count = self._pending_count
+        if not count:
+            return
+        view = memoryview(self._pending)
+        size = self.record_size
+        with open(self.path, "r+b") as f:
+            done = 0
+            while done < count:
+                # Write up to the end of the ring, then wrap around
+                index = (self.head + done) % self.capacity
+                n = min(count - done, self.capacity - index)
+                f.seek(DATA_OFFSET + index * size)
+                f.write(view[done * size:(done + n) * size])
+                done += n
+            f.flush()
+
+            self.head += count
+            if self.head - self.tail > self.capacity:
+                # Ring overflowed - the oldest readings were overwritten
+                lost = self.head - self.tail - self.capacity
+                self.tail += lost
+                self.dropped += lost
+            self._write_header(f)
+        self._pending_count = 0
+        self.flushes += 1
+
+    def depth(self):
+        """Number of readings waiting to be sent (including unflushed)"""
+        return self.head - self.tail + self._pending_count
+
+    def peek(self, count):
+        """Return up to count of the oldest readings without removing them"""
+        self.flush()
+        count = min(count, self.head - self.tail)
+        readings = []
+        if not count:
+            return readings
+        size = self.record_size
+        with open(self.path, "rb") as f:
+            done = 0
+            while done < count:
+                index = (self.tail + done) % self.capacity
+                n = min(count - done, self.capacity - index)
+                f.seek(DATA_OFFSET + index * size)
+                block = f.read(n * size)
+                for i in range(n):
+                    readings.append(_decode(
+                        struct.unpack_from(self.record_format, block, i * size), self.fields))
+                done += n
+        return readings
+
+    def pop(self, count):
+        """Remove count readings that were successfully sent"""
+        count = min(count, self.head - self.tail)
+        if not count:
+            return
+        self.tail += count
+        self.drained += count
+        with open(self.path, "r+b") as f:
+            self._write_header(f)
+
+    def stats(self):
+        """Return queue depth and counters for monitoring"""
+        return {
+            "depth": self.depth(),
+            "capacity": self.capacity,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "drained": self.drained,
+            "flushes": self.flushes,
+        }
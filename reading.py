@@ -0,0 +1,32 @@
+# Field order of a reading, as uploaded to Firebase. light_raw is the
+# mean of the light samples taken since the previous reading, with their
+# min, max and standard deviation (all ADC counts) next to it.
+# chip_temperature is the Pico's internal sensor (C).
+FIELDS = ("timestamp", "temperature", "humidity", "light_raw", "light_level",
+          "light_min", "light_max", "light_std", "chip_temperature")
+
+
+class Reading:
+    """One sensor reading, meant to be allocated once and refilled each cycle.
+
+    Supports reading["field"] like the old dict, so the queue, rollups and
+    deadband code accept it unchanged. Code that keeps a reading beyond
+    the current cycle must take a copy with as_dict().
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self):
+        for field in FIELDS:
+            setattr(self, field, 0)
+        self.light_level = "Very Dark"
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __contains__(self, field):
+        return field in FIELDS
+
+    def as_dict(self):
+        """Return an independent dict copy of the reading"""
+        return {field: getattr(self, field) for field in FIELDS}
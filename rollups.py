@@ -0,0 +1,162 @@
+import json
+try:
+    import uos as os
+except ImportError:
+    import os
+
+# Window name -> length in seconds; windows start on multiples of length
+WINDOWS = (("minute", 60), ("hour", 3600), ("day", 86400))
+FIELDS = ("temperature", "humidity", "light_raw")
+
+
+class Aggregate:
+    """Running count/min/max/sum/last of one field (O(1) memory)"""
+
+    def __init__(self, state=None):
+        if state:
+            self.count, self.min, self.max, self.total, self.last = state
+        else:
+            self.count = 0
+            self.min = None
+            self.max = None
+            self.total = 0
+            self.last = None
+
+    def add(self, value):
+        """Fold one value into the aggregate"""
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if self.count == 0 or value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+        self.last = value
+
+    def state(self):
+        """Compact list form used for persistence"""
+        return [self.count, self.min, self.max, self.total, self.last]
+
+    def summary(self):
+        """Published form of the aggregate"""
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else None,
+            "last": self.last,
+        }
+
+
+class Rollups:
+    """Windowed min/max/mean aggregates published to rollups/<window>/<start>.
+
+    Every reading is folded into the open window of each length. When a
+    reading falls into a new window, the finished one becomes pending
+    until it is published. Sums are kept exactly (sensor values are
+    integers). To spare the flash, the state is saved every save_every
+    changes and when a window longer than the shortest one closes, not
+    after every reading; call flush() before stopping. A power cut loses
+    at most save_every - 1 readings of the open windows (and may publish
+    a rollup twice, which writes the same path again).
+    """
+
+    def __init__(self, path, windows=WINDOWS, fields=FIELDS, max_pending=100, save_every=20):
+        self.path = path
+        self.windows = windows
+        self.fields = fields
+        self.max_pending = max_pending
+        self.save_every = save_every
+        self.open = {}                   # name -> (start, {field: Aggregate})
+        self._pending = {}               # Firebase path -> summary
+        self._unsaved = 0                # Changes since the last save
+        self.saves = 0
+        self.load()
+
+    def load(self):
+        """Restore open windows and pending rollups from flash"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, window in state.get("open", {}).items():
+            aggregates = {}
+            for field, values in window["fields"].items():
+                aggregates[field] = Aggregate(values)
+            self.open[name] = (window["start"], aggregates)
+        self._pending = state.get("pending", {})
+
+    def save(self):
+        """Write state to a temp file and rename it over the old one"""
+        state = {"open": {}, "pending": self._pending}
+        for name in self.open:
+            start, aggregates = self.open[name]
+            fields = {}
+            for field in aggregates:
+                fields[field] = aggregates[field].state()
+            state["open"][name] = {"start": start, "fields": fields}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.rename(tmp, self.path)
+        self._unsaved = 0
+        self.saves += 1
+
+    def flush(self):
+        """Save if anything changed since the last save"""
+        if self._unsaved:
+            self.save()
+
+    def _close(self, name, start, aggregates):
+        """Move a finished window to the pending set"""
+        summary = {}
+        for field in aggregates:
+            summary[field] = aggregates[field].summary()
+        self._pending[f"rollups/{name}/{start}"] = summary
+
+        # Bounded memory while offline: drop the oldest of the shortest
+        # windows first, since longer windows summarize them anyway
+        while len(self._pending) > self.max_pending:
+            del self._pending[min(self._pending, key=self._drop_order)]
+
+    def _drop_order(self, path):
+        """Sort key for pending paths: (window length, window start)"""
+        _, name, start = path.split("/")
+        for window, seconds in self.windows:
+            if window == name:
+                return seconds, int(start)
+        return 0, int(start)
+
+    def add(self, data):
+        """Fold a reading into every window, closing windows it leaves"""
+        timestamp = int(data["timestamp"])
+        checkpoint = False
+        for name, seconds in self.windows:
+            start = timestamp - timestamp % seconds
+            current = self.open.get(name)
+            if current is None or current[0] != start:
+                if current is not None:
+                    self._close(name, current[0], current[1])
+                    checkpoint = checkpoint or seconds > self.windows[0][1]
+                aggregates = {}
+                for field in self.fields:
+                    aggregates[field] = Aggregate()
+                current = (start, aggregates)
+                self.open[name] = current
+            for field in self.fields:
+                value = data[field]
+                if value is not None:        # Sensor had no value this time
+                    current[1][field].add(value)
+        self._unsaved += 1
+        if checkpoint or self._unsaved >= self.save_every:
+            self.save()
+
+    def pending(self):
+        """Return finished rollups waiting to be published (path -> value)"""
+        return dict(self._pending)
+
+    def published(self, values):
+        """Forget rollups that were written successfully"""
+        for path in values:
+            self._pending.pop(path, None)
+        self._unsaved += 1
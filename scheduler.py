@@ -0,0 +1,154 @@
+import time
+
+# Monotonic ms/us ticks: native on MicroPython, emulated on CPython
+if hasattr(time, "ticks_ms"):
+    ticks_ms = time.ticks_ms
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+    ticks_add = time.ticks_add
+    sleep_ms = time.sleep_ms
+else:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_us():
+        return int(time.monotonic() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def ticks_add(a, b):
+        return a + b
+
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+
+# What to do with slots that were missed entirely (e.g. a long upload)
+SKIP = "skip"          # Drop missed slots and fire the most recent one
+CATCH_UP = "catchup"   # Fire every missed slot back to back
+
+
+class DeadlineScheduler:
+    """Fixed-phase periodic scheduler driven by monotonic deadlines.
+
+    Deadlines advance by exactly one period per slot, so time spent on
+    work never accumulates into drift. Slots are aligned to wall-clock
+    multiples of the period (plus phase), so stations using the same
+    period sample at the same instants and their readings can be joined.
+    wait() returns the slot's aligned wall-clock time for use as the
+    reading timestamp.
+    """
+
+    def __init__(self, period, policy=SKIP, phase=0, max_catch_up=10):
+        self.period = period
+        self.period_ms = int(period * 1000)
+        self.policy = policy
+        self.phase = phase
+        self.max_catch_up = max_catch_up
+
+        # Jitter statistics (ms the slot fired after its deadline)
+        self.slots = 0
+        self.skipped = 0
+        self.last_jitter = 0
+        self.max_jitter = 0
+        self.total_jitter = 0
+        self.last_slot = None
+
+        self.realign()
+
+    def realign(self):
+        """Recompute the next slot from the wall clock (call after NTP sync)"""
+        now = time.time()
+        slot = ((now - self.phase) // self.period + 1) * self.period + self.phase
+        # A clock step (or landing just short of a slot boundary) must not
+        # hand out a slot that already fired
+        if self.last_slot is not None and slot <= self.last_slot:
+            slot = self.last_slot + self.period
+        self.slot_time = slot
+        self.deadline = ticks_add(ticks_ms(), int((slot - now) * 1000))
+
+    def set_period(self, period):
+        """Change the period; the next slot is aligned to the new period"""
+        if period == self.period:
+            return
+        self.period = period
+        self.period_ms = int(period * 1000)
+        self.realign()
+
+    def remaining_ms(self):
+        """Milliseconds until the next slot (negative if it is overdue)"""
+        return ticks_diff(self.deadline, ticks_ms())
+
+    def _advance(self, slots):
+        """Move the deadline forward by a number of periods"""
+        self.deadline = ticks_add(self.deadline, slots * self.period_ms)
+        self.slot_time += slots * self.period
+
+    def _delay(self):
+        """Apply the missed-slot policy; return ms until the current slot"""
+        late = ticks_diff(ticks_ms(), self.deadline)
+        if late >= self.period_ms:
+            missed = late // self.period_ms
+            if self.policy == CATCH_UP:
+                # Keep at most max_catch_up missed slots, skip the rest
+                missed = max(0, missed - self.max_catch_up)
+            if missed:
+                self._advance(missed)
+                self.skipped += missed
+                late -= missed * self.period_ms
+        return -late
+
+    def _fire(self):
+        """Record jitter for the current slot and move to the next one"""
+        jitter = ticks_diff(ticks_ms(), self.deadline)
+        self.slots += 1
+        self.last_jitter = jitter
+        self.total_jitter += jitter
+        if jitter > self.max_jitter:
+            self.max_jitter = jitter
+
+        slot = self.slot_time
+        self.last_slot = slot
+        self._advance(1)
+        return slot
+
+    def wait(self, idle=None, idle_ms=1000):
+        """Block until the next slot; return its aligned wall-clock time.
+
+        If given, idle() is called about every idle_ms while waiting
+        (e.g. to poll a stream). It may change the period, and it may
+        return the ms until it needs to run again to sleep longer or
+        shorter than idle_ms.
+        """
+        delay = self._delay()
+        wake = idle_ms
+        while idle is not None and delay > 0:
+            sleep_ms(min(delay, wake))
+            wake = idle()
+            if wake is None:
+                wake = idle_ms
+            delay = self._delay()
+        if delay > 0:
+            sleep_ms(delay)
+        return self._fire()
+
+    async def wait_async(self):
+        """Like wait(), but yields to the (u)asyncio event loop"""
+        try:
+            import uasyncio as asyncio
+        except ImportError:
+            import asyncio
+        delay = self._delay()
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        return self._fire()
+
+    def stats(self):
+        """Return per-slot jitter statistics in milliseconds"""
+        return {
+            "slots": self.slots,
+            "skipped": self.skipped,
+            "last_jitter_ms": self.last_jitter,
+            "max_jitter_ms": self.max_jitter,
+            "mean_jitter_ms": self.total_jitter // self.slots if self.slots else 0,
+        }
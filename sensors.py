@@ -0,0 +1,441 @@
+from scheduler import ticks_ms, ticks_diff, ticks_add
+
+# Attempts remembered for the error rate; kept below 31 bits so the
+# history stays a small int on MicroPython
+ERROR_WINDOW = 30
+
+
+class CachedDHT:
+    """DHT11/DHT22 access with a minimum interval, cache and backoff.
+
+    read() measures at most once per min_interval_ms; callers asking
+    sooner get the cached values and their age. A failed measure never
+    sleeps: the cached values are served (while younger than
+    max_age_ms) and the sensor is tried again on a later read() or
+    poll() once a backoff has passed. The backoff starts at
+    min_interval_ms and doubles up to max_backoff_ms while failures
+    continue, so a flaky sensor is retried within seconds and a dead
+    one is not hammered.
+    """
+
+    def __init__(self, sensor, min_interval_ms=1100, max_backoff_ms=30000, max_age_ms=90000):
+        self.sensor = sensor
+        self.min_interval_ms = min_interval_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.max_age_ms = max_age_ms
+
+        self.temperature = None
+        self.humidity = None
+        self._read_at = None             # Ticks of the last good measure
+        self._tried_at = None            # Ticks of the last attempt
+        self._backoff = 0                # ms to wait after a failure, 0 = healthy
+        self.last_failed = False
+
+        # Counters for monitoring
+        self.measures = 0
+        self.failures = 0
+        self.cache_hits = 0
+        self._history = 0                # Bit per attempt, 1 = failed
+        self._attempts = 0
+
+    def _due(self, now):
+        """True if the sensor may be measured again"""
+        if self._tried_at is None:
+            return True
+        wait = self._backoff if self._backoff > self.min_interval_ms else self.min_interval_ms
+        return ticks_diff(now, self._tried_at) >= wait
+
+    def _measure(self, now):
+        """One measure attempt; return True on success"""
+        self._tried_at = now
+        try:
+            self.sensor.measure()
+            temperature = self.sensor.temperature()
+            humidity = self.sensor.humidity()
+        except OSError:
+            self.failures += 1
+            self.last_failed = True
+            self._record(1)
+            self._backoff = min(max(self._backoff * 2, self.min_interval_ms), self.max_backoff_ms)
+            return False
+        self.temperature = temperature
+        self.humidity = humidity
+        self._read_at = now
+        self._backoff = 0
+        self.measures += 1
+        self.last_failed = False
+        self._record(0)
+        return True
+
+    def _record(self, failed):
+        self._history = ((self._history << 1) | failed) & ((1 << ERROR_WINDOW) - 1)
+        if self._attempts < ERROR_WINDOW:
+            self._attempts += 1
+
+    def read(self):
+        """Return (temperature, humidity, age_ms).
+
+        age_ms is how old the values are (0 for a fresh measure).
+        Values are None when there is no measure younger than
+        max_age_ms; age_ms is None if the sensor never worked.
+        """
+        now = ticks_ms()
+        if self._due(now):
+            self._measure(now)
+        else:
+            self.cache_hits += 1
+        return self.cached(now)
+
+    def cached(self, now=None):
+        """Like read(), but never measures"""
+        if self._read_at is None:
+            return None, None, None
+        age = ticks_diff(ticks_ms() if now is None else now, self._read_at)
+        if age > self.max_age_ms:
+            return None, None, age
+        return self.temperature, self.humidity, age
+
+    def retry_ms(self):
+        """Milliseconds until the sensor may be measured again"""
+        if self._tried_at is None:
+            return 0
+        wait = self._backoff if self._backoff > self.min_interval_ms else self.min_interval_ms
+        return max(0, wait - ticks_diff(ticks_ms(), self._tried_at))
+
+    def poll(self):
+        """Retry after a failure once the backoff has passed (call while idle)"""
+        if self._backoff:
+            now = ticks_ms()
+            if self._due(now):
+                return self._measure(now)
+        return False
+
+    def error_rate(self):
+        """Fraction of the last ERROR_WINDOW attempts that failed"""
+        if not self._attempts:
+            return 0.0
+        failed = 0
+        history = self._history
+        while history:
+            failed += history & 1
+            history >>= 1
+        return failed / self._attempts
+
+    def stats(self):
+        return {
+            "measures": self.measures,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "error_rate": round(self.error_rate(), 3),
+            "backoff_ms": self._backoff,
+        }
+
+
+# RP2040 internal temperature sensor (datasheet 4.9.5)
+CHIP_TEMP_V27 = 0.706                # Volts at 27 C
+CHIP_TEMP_SLOPE = 0.001721           # Volts per degree C (falls as it warms)
+ADC_VREF = 3.3
+
+
+class Sensor:
+    """One source of reading fields, sampled on its own period.
+
+    Subclasses set name and fields and implement measure(), which
+    returns the values in fields order. The registry calls run() every
+    period_ms (the first time after delay_ms); fill() copies the latest
+    values into a reading, or None once they are older than max_age_ms.
+    cost_ms is about how long one sample blocks, so the registry can
+    keep slow sensors away from an upcoming reading. sample() may
+    return the ms to its next run to retry sooner than the period.
+    stored gives the (struct code, scale) of each field in the offline
+    queue; without it a field is stored as a 32-bit int in tenths.
+    """
+
+    name = "sensor"
+    fields = ()
+    stored = None
+
+    def __init__(self, period_ms, cost_ms=0, max_age_ms=None, delay_ms=0):
+        self.period_ms = period_ms
+        self.cost_ms = cost_ms
+        self.max_age_ms = 3 * period_ms if max_age_ms is None else max_age_ms
+        self.next_due = ticks_add(ticks_ms(), delay_ms)
+        self.values = None               # Last good values, in fields order
+        self.failed = False              # Last sample (or fill) failed
+        self._at = None                  # Ticks of the last good sample
+
+        # Counters for monitoring
+        self.samples = 0
+        self.errors = 0
+
+    def start(self):
+        """Called before sampling starts (e.g. to start a timer)"""
+
+    def stop(self):
+        """Called when the station stops"""
+
+    def measure(self):
+        raise NotImplementedError
+
+    def sample(self, now):
+        """Take one sample; return ms until the next, or None for period_ms"""
+        self.values = self.measure()
+        self._at = now
+        return None
+
+    def run(self, now):
+        """Sample and schedule the next sample (called by SensorRegistry)"""
+        self.failed = False
+        try:
+            delay = self.sample(now)
+        except Exception as e:
+            print(f"{self.name} sensor error: {e}")
+            self.failed = True
+            self.errors += 1
+            delay = None
+        if not self.failed:
+            self.samples += 1
+        self.next_due = ticks_add(now, self.period_ms if delay is None else delay)
+
+    def due_in(self, now):
+        """Milliseconds until the next sample (negative if overdue)"""
+        return ticks_diff(self.next_due, now)
+
+    def fill(self, reading, now):
+        """Copy the latest values into reading; return True if there were any"""
+        values = self.values
+        if values is not None and ticks_diff(now, self._at) > self.max_age_ms:
+            values = None
+        i = 0
+        for field in self.fields:
+            setattr(reading, field, None if values is None else values[i])
+            i += 1
+        return values is not None
+
+    def stats(self):
+        return {
+            "period_ms": self.period_ms,
+            "samples": self.samples,
+            "errors": self.errors,
+        }
+
+
+class ClimateSensor(Sensor):
+    """Temperature and humidity from a CachedDHT.
+
+    A failed measure is retried on the DHT backoff rather than after a
+    whole period; readings keep the cached values meanwhile.
+    """
+
+    name = "dht"
+    fields = ("temperature", "humidity")
+    stored = (("h", 10), ("H", 10))
+
+    def __init__(self, dht, period_ms=60000, cost_ms=250, delay_ms=0):
+        Sensor.__init__(self, period_ms, cost_ms, dht.max_age_ms, delay_ms)
+        self.dht = dht
+
+    def sample(self, now):
+        self.dht.read()
+        if self.dht.last_failed:
+            self.failed = True
+            self.errors += 1
+            return self.dht.retry_ms()
+        return None
+
+    def fill(self, reading, now):
+        temperature, humidity, age = self.dht.cached(now)
+        if self.failed:
+            if temperature is None:
+                print("DHT11 error - no recent values")
+            else:
+                print("DHT11 error - using values from", age // 1000, "s ago")
+        reading.temperature = temperature
+        reading.humidity = humidity
+        return temperature is not None
+
+
+class LightSensor(Sensor):
+    """Photoresistor window (mean, min, max, std) from a LightSampler.
+
+    start() starts timer sampling at rate Hz and each run() folds the
+    ring into the window, so period_ms must be shorter than the ring
+    lasts (size / rate seconds). fill() takes the window since the last
+    reading. With rate 0, or no samples, fill() reads the ADC once.
+    """
+
+    name = "light"
+    fields = ("light_raw", "light_min", "light_max", "light_std")
+    stored = (("H", 1), ("H", 1), ("H", 1), ("H", 1))
+
+    def __init__(self, adc, rate=100, size=256, median=1, period_ms=1000, cost_ms=5):
+        Sensor.__init__(self, period_ms, cost_ms)
+        self.adc = adc
+        self.rate = rate
+        self.size = size
+        self.median = median
+        self.sampler = None
+
+    def start(self):
+        if self.rate and self.sampler is None:
+            from light_sampler import LightSampler
+            self.sampler = LightSampler(self.adc, self.rate, self.size, self.median)
+            self.sampler.start()
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
+
+    def sample(self, now):
+        if self.sampler is not None:
+            self.sampler.drain()
+        return None
+
+    def fill(self, reading, now):
+        count = 0
+        if self.sampler is not None:
+            count, mean, low, high, std = self.sampler.summary()
+        if count:
+            reading.light_raw = int(mean + 0.5)
+            reading.light_min = low
+            reading.light_max = high
+            reading.light_std = int(std + 0.5)
+        else:
+            raw = self.adc.read_u16()
+            reading.light_raw = raw
+            reading.light_min = raw
+            reading.light_max = raw
+            reading.light_std = 0
+        return True
+
+
+class ChipTemperature(Sensor):
+    """RP2040 die temperature from the internal sensor on ADC channel 4.
+
+    The die runs a few degrees above the room, so this is its own field
+    rather than a fallback for the DHT11. A sample averages several ADC
+    reads to smooth the noise.
+    """
+
+    name = "chip"
+    fields = ("chip_temperature",)
+    stored = (("b", 1),)
+    CHANNEL = 4
+
+    def __init__(self, adc, period_ms=60000, reads=8):
+        Sensor.__init__(self, period_ms)
+        self.adc = adc
+        self.reads = reads
+
+    def measure(self):
+        total = 0
+        for _ in range(self.reads):
+            total += self.adc.read_u16()
+        volts = total / self.reads * ADC_VREF / 65535
+        # Whole degrees: the sensor is only good to about 2 C
+        return (round(27 - (volts - CHIP_TEMP_V27) / CHIP_TEMP_SLOPE),)
+
+
+class SensorRegistry:
+    """Sensors sampled each on its own period from one poll() loop.
+
+    poll() is called while the station waits for the next reading. It
+    runs every sensor that is due, or due within slack_ms so that close
+    deadlines share a wakeup, and next_ms() says how long the caller
+    may sleep before polling again. A sensor whose cost_ms is more than
+    budget_ms (the time left before the next reading) waits until just
+    after that reading. fill() merges the latest values of every sensor
+    into a reading.
+    """
+
+    def __init__(self, slack_ms=100):
+        self.slack_ms = slack_ms
+        self.sensors = []
+        self.wakeups = 0                 # poll() calls that sampled something
+
+    def register(self, sensor):
+        self.sensors.append(sensor)
+        return sensor
+
+    def get(self, name):
+        for sensor in self.sensors:
+            if sensor.name == name:
+                return sensor
+        return None
+
+    def start(self):
+        for sensor in self.sensors:
+            sensor.start()
+
+    def stop(self):
+        for sensor in self.sensors:
+            sensor.stop()
+
+    def _fits(self, sensor, budget_ms):
+        return budget_ms is None or sensor.cost_ms <= budget_ms
+
+    def poll(self, budget_ms=None):
+        """Sample the sensors that are due; return how many ran"""
+        now = ticks_ms()
+        ran = 0
+        for sensor in self.sensors:
+            if sensor.due_in(now) <= self.slack_ms and self._fits(sensor, budget_ms):
+                sensor.run(now)
+                ran += 1
+        if ran:
+            self.wakeups += 1
+        return ran
+
+    def next_ms(self, budget_ms=None):
+        """Milliseconds until poll() has work (None without sensors)"""
+        now = ticks_ms()
+        nearest = None
+        for sensor in self.sensors:
+            due = sensor.due_in(now)
+            if not self._fits(sensor, budget_ms) and due < budget_ms:
+                due = budget_ms          # Right after the reading
+            if nearest is None or due < nearest:
+                nearest = due
+        return None if nearest is None else max(0, nearest)
+
+    def fill(self, reading):
+        """Merge the latest values of all sensors into reading.
+
+        A sensor that has not run yet, or is half a period overdue (no
+        poll() loop, e.g. one-off reads), is sampled first. Returns True
+        if any sensor had values.
+        """
+        now = ticks_ms()
+        filled = False
+        for sensor in self.sensors:
+            if not (sensor.samples or sensor.errors) or sensor.due_in(now) <= -(sensor.period_ms // 2):
+                sensor.run(now)
+            try:
+                if sensor.fill(reading, now):
+                    filled = True
+            except Exception as e:
+                print(f"{sensor.name} sensor error: {e}")
+                sensor.failed = True
+                sensor.errors += 1
+                for field in sensor.fields:
+                    setattr(reading, field, None)
+        return filled
+
+    def queue_fields(self):
+        """(name, struct code, scale) of every field, for OfflineQueue"""
+        result = []
+        for sensor in self.sensors:
+            stored = sensor.stored or (("i", 10),) * len(sensor.fields)
+            i = 0
+            for field in sensor.fields:
+                code, scale = stored[i]
+                result.append((field, code, scale))
+                i += 1
+        return tuple(result)
+
+    def stats(self):
+        result = {"wakeups": self.wakeups}
+        for sensor in self.sensors:
+            result[sensor.name] = sensor.stats()
+        return result
@@ -0,0 +1,91 @@
+"""
+Host-side simulation of the weather station hardware and Firebase.
+
+install() puts fake `machine`, `dht`, `network`, `ntptime` and `keys`
+modules into sys.modules and patches the time module with an accelerated
+VirtualClock, so the unmodified device code can be imported and run on
+CPython:
+
+    from sim import install, FirebaseStandIn
+    server = FirebaseStandIn(latency=0.05, failure_rate=0.1).start()
+    install(firebase_url=server.url, duration=3600)
+    import weather_station
+    weather_station.main()      # Stops after one simulated hour
+
+See sim/run.py for a command-line runner.
+"""
+
+import binascii
+import gc
+import sys
+import types
+
+from sim import state
+from sim.clock import SimulationEnd, VirtualClock
+from sim.firebase_server import FirebaseStandIn
+from sim.traces import RecordedTrace, SyntheticTrace
+
+# Simulated heap of a Pico W after the firmware and network stack
+HEAP_SIZE = 192 * 1024
+
+
+def _install_gc_shims(trace_alloc):
+    """Provide gc.mem_free/mem_alloc, optionally backed by tracemalloc"""
+    if hasattr(gc, "mem_alloc"):
+        return
+    if trace_alloc:
+        import tracemalloc
+        tracemalloc.start()
+        gc.mem_alloc = lambda: tracemalloc.get_traced_memory()[0]
+    else:
+        gc.mem_alloc = lambda: 0
+    gc.mem_free = lambda: max(0, HEAP_SIZE - gc.mem_alloc())
+
+
+def install(firebase_url, trace=None, speed=None, duration=None, start=None,
+            unsynced=False, sensor_failure_rate=0.0, ntp_failure_rate=0.0,
+            wifi_outages=(), trace_alloc=False, station_id="sim", seed=0):
+    """Install the simulated hardware; returns the VirtualClock.
+
+    speed compresses sleeps (None = instant), duration ends the run with
+    SimulationEnd after that many simulated seconds, and unsynced starts
+    the RTC at 2021-01-01 like a Pico that has not done NTP yet.
+    """
+    from sim import dht, machine, network, ntptime
+
+    clock = VirtualClock(start=start, speed=speed, duration=duration)
+    clock.install()
+    if unsynced:
+        clock.set_time(1609459200)
+
+    state.clock = clock
+    state.trace = trace or SyntheticTrace(seed)
+    state.rng.seed(seed)
+    state.sensor_failure_rate = sensor_failure_rate
+    state.ntp_failure_rate = ntp_failure_rate
+    state.wifi_outages = tuple(wifi_outages)
+    state.wlans = {}
+
+    keys = types.ModuleType("keys")
+    keys.WIFI_SSID = "simulated"
+    keys.WIFI_PASS = "simulated"
+    keys.FIREBASE_URL = firebase_url
+    keys.FIREBASE_SECRET = ""
+    keys.STATION_ID = station_id
+
+    sys.modules.update({
+        "machine": machine,
+        "dht": dht,
+        "network": network,
+        "ntptime": ntptime,
+        "keys": keys,
+        "ubinascii": binascii,
+    })
+    _install_gc_shims(trace_alloc)
+    return clock
+
+
+__all__ = [
+    "install", "FirebaseStandIn", "VirtualClock", "SimulationEnd",
+    "SyntheticTrace", "RecordedTrace", "state",
+]
@@ -0,0 +1,89 @@
+import time as _time
+
+real_time = _time.time
+real_monotonic = _time.monotonic
+real_sleep = _time.sleep
+_real_localtime = _time.localtime
+_real_gmtime = _time.gmtime
+
+
+class SimulationEnd(KeyboardInterrupt):
+    """Raised from sleep() once the simulated run time is over.
+
+    It subclasses KeyboardInterrupt so the station's main loop shuts
+    down through its normal Ctrl-C path.
+    """
+
+
+class VirtualClock:
+    """Accelerated clock for running device code on a host.
+
+    Work (sensor reads, HTTP calls) takes real time, while sleeps are
+    compressed by speed (speed=None makes them instant). Virtual time
+    is therefore real elapsed time plus all the skipped sleep time.
+    """
+
+    def __init__(self, start=None, speed=None, duration=None):
+        self.speed = speed
+        self.duration = duration
+        self._real_start = real_monotonic()
+        self._start = real_time() if start is None else start
+        self._skipped = 0.0
+        self._offset = 0.0               # Wall-clock correction (RTC/NTP)
+        self.timers = []                 # Called with monotonic() after each sleep
+
+    def monotonic(self):
+        """Seconds since the clock started (never jumps)"""
+        return real_monotonic() - self._real_start + self._skipped
+
+    def time(self):
+        """Virtual wall-clock time in seconds since the epoch"""
+        return self._start + self._offset + self.monotonic()
+
+    def reference_time(self):
+        """True virtual time, ignoring RTC steps (what NTP servers report)"""
+        return self._start + self.monotonic()
+
+    def set_time(self, seconds):
+        """Step the wall clock (what the RTC/NTP does on the device)"""
+        self._offset += seconds - self.time()
+
+    def sleep(self, seconds):
+        """Sleep in virtual time, compressed by speed"""
+        if self.duration is not None and self.monotonic() + seconds >= self.duration:
+            raise SimulationEnd("Simulation finished")
+        if seconds <= 0:
+            return
+        real = 0 if not self.speed else seconds / self.speed
+        if real:
+            real_sleep(real)
+        self._skipped += seconds - real
+        # Fire the periodic timers that came due while "sleeping"
+        for timer in self.timers:
+            timer(self.monotonic())
+
+    def install(self):
+        """Patch the time module so imported device code uses this clock"""
+        _time.time = self.time
+        _time.sleep = self.sleep
+        _time.localtime = lambda secs=None: _real_localtime(self.time() if secs is None else secs)
+        _time.gmtime = lambda secs=None: _real_gmtime(self.time() if secs is None else secs)
+
+        # MicroPython tick API, so scheduler.py picks the virtual ticks
+        _time.ticks_ms = lambda: int(self.monotonic() * 1000)
+        _time.ticks_us = lambda: int(self.monotonic() * 1000000)
+        _time.ticks_diff = lambda a, b: a - b
+        _time.ticks_add = lambda a, b: a + b
+        _time.sleep_ms = lambda ms: self.sleep(ms / 1000)
+        _time.sleep_us = lambda us: self.sleep(us / 1000000)
+
+    @staticmethod
+    def uninstall():
+        """Restore the real time functions"""
+        _time.time = real_time
+        _time.sleep = real_sleep
+        _time.localtime = _real_localtime
+        _time.gmtime = _real_gmtime
+        for name in ("ticks_ms", "ticks_us", "ticks_diff", "ticks_add", "sleep_ms", "sleep_us"):
+            if hasattr(_time, name):
+                delattr(_time, name)
@@ -0,0 +1,39 @@
+"""Fake `dht` module driven by the simulation trace."""
+
+from sim import state
+
+
+class DHTBase:
+    MIN_INTERVAL = 1.0               # The DHT11 cannot be read faster than 1 Hz
+
+    def __init__(self, pin):
+        self.pin = pin
+        self._temperature = 0
+        self._humidity = 0
+        self._last_measure = None
+        self.measurements = 0
+        self.failures = 0
+
+    def measure(self):
+        now = state.clock.monotonic()
+        too_fast = self._last_measure is not None and now - self._last_measure < self.MIN_INTERVAL
+        self._last_measure = now
+        if too_fast or state.chance(state.sensor_failure_rate):
+            self.failures += 1
+            raise OSError(110)           # ETIMEDOUT, as the real driver raises
+        self.measurements += 1
+        self._temperature, self._humidity, _ = state.trace.sample(state.now())
+
+    def temperature(self):
+        return self._temperature
+
+    def humidity(self):
+        return self._humidity
+
+
+class DHT11(DHTBase):
+    pass
+
+
+class DHT22(DHTBase):
+    MIN_INTERVAL = 2.0
@@ -0,0 +1,390 @@
+"""In-process stand-in for the Firebase Realtime Database REST API."""
+
+import json
+import queue
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Latency is spent in real time even when the simulated clock is installed
+from sim.clock import real_sleep
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+
+def _parts(path):
+    """Split a database path into its non-empty segments"""
+    return [part for part in path.strip("/").split("/") if part]
+
+
+def _child(value, path):
+    """Value of a child path inside a node (None if missing)"""
+    for part in _parts(path):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _order_key(value):
+    """Firebase ordering: null < false < true < numbers < strings < objects"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+
+def _overlap(values):
+    """Return (ancestor, path) if one update path contains another"""
+    paths = set("/".join(_parts(key)) for key in values)
+    for path in paths:
+        parent = path
+        while "/" in parent:
+            parent = parent.rsplit("/", 1)[0]
+            if parent in paths:
+                return parent, path
+    return None
+
+
+class FirebaseStandIn:
+    """Local Firebase REST server holding the database in memory.
+
+    Supports GET, PUT, POST (push), PATCH (multi-path update) and DELETE
+    on <path>.json over HTTP/1.1 keep-alive, and streaming GETs (Accept:
+    text/event-stream) that receive put/patch events. latency (seconds, or a
+    (min, max) range) is added to every request. failure_rate answers
+    with HTTP 503, drop_rate closes the connection without answering,
+    and down(), when given, makes every request drop while it returns
+    True (e.g. during a simulated WiFi outage).
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0,
+                 drop_rate=0.0, down=None, seed=0, keep_alive_interval=30):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.down = down
+        self.rng = random.Random(seed)
+        self.root = None
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.failures = 0
+        self.drops = 0
+        self._server = None
+        self._thread = None
+        self._last_push_ms = 0
+        self._last_rand = [0] * 12
+
+        # Streaming listeners: (path parts, queue of (event, data))
+        self.keep_alive_interval = keep_alive_interval
+        self.listeners = []
+
+    # Database operations -------------------------------------------------
+
+    def get(self, path=""):
+        """Return the value stored at path (None if missing)"""
+        node = self.root
+        for part in _parts(path):
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def set(self, path, value):
+        """Store value at path; None deletes it"""
+        parts = _parts(path)
+        if not parts:
+            self.root = value if value not in ({}, None) else None
+            return
+        if value is None or value == {}:
+            self._delete(parts)
+            return
+        if not isinstance(self.root, dict):
+            self.root = {}
+        node = self.root
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = {}
+                node[part] = child
+            node = child
+        node[parts[-1]] = value
+
+    def _delete(self, parts):
+        """Delete a path and prune parents left empty"""
+        trail = []
+        node = self.root
+        for part in parts[:-1]:
+            if not isinstance(node, dict) or part not in node:
+                return
+            trail.append((node, part))
+            node = node[part]
+        if isinstance(node, dict):
+            node.pop(parts[-1], None)
+            while trail and not node:
+                parent, key = trail.pop()
+                del parent[key]
+                node = parent
+        if self.root == {}:
+            self.root = None
+
+    def update(self, path, values):
+        """Apply a multi-path update relative to path"""
+        base = "/".join(_parts(path))
+        for key, value in values.items():
+            self.set(base + "/" + key if base else key, value)
+
+    def push_key(self):
+        """Generate a Firebase-style chronological push key"""
+        now = int(time.time() * 1000)       # Virtual time if the clock is installed
+        if now == self._last_push_ms:
+            i = 11
+            while i >= 0 and self._last_rand[i] == 63:
+                self._last_rand[i] = 0
+                i -= 1
+            self._last_rand[i] += 1
+        else:
+            self._last_rand = [self.rng.randrange(64) for _ in range(12)]
+        self._last_push_ms = now
+        chars = []
+        for _ in range(8):
+            chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        return "".join(reversed(chars)) + "".join(PUSH_CHARS[i] for i in self._last_rand)
+
+    # HTTP handling ---------------------------------------------------------
+
+    def handle(self, method, path, query, body):
+        """Run one REST request; return (status, response value)"""
+        if path.endswith(".json"):
+            path = path[:-5]
+        with self.lock:
+            if method == "GET":
+                return self.query(path, query)
+            if method == "PUT":
+                self.set(path, body)
+                self._notify(path, body)
+                return 200, body
+            if method == "PATCH":
+                if not isinstance(body, dict):
+                    return 400, {"error": "PATCH body must be an object"}
+                overlap = _overlap(body)
+                if overlap:
+                    # Firebase rejects multi-path updates with nested paths
+                    return 400, {"error": "Path %s is an ancestor of %s" % overlap}
+                self.update(path, body)
+                self._notify(path, body, patch=True)
+                return 200, body
+            if method == "POST":
+                key = self.push_key()
+                self.set(path.rstrip("/") + "/" + key, body)
+                self._notify(path.rstrip("/") + "/" + key, body)
+                return 200, {"name": key}
+            if method == "DELETE":
+                self.set(path, None)
+                self._notify(path, None)
+                return 200, None
+        return 405, {"error": "Method not allowed"}
+
+    def query(self, path, query):
+        """GET with the REST query parameters; return (status, value).
+
+        Supports shallow, orderBy ("$key", "$value" or a child path),
+        startAt/endAt/equalTo and limitToFirst/limitToLast. Like
+        Firebase, filtered results come back as an object in no
+        particular order (they are shuffled here to catch clients that
+        rely on it).
+        """
+        params = {}
+        for name, values in query.items():
+            if name != "auth":
+                params[name] = values[-1]
+        node = self.get(path)
+        if not params:
+            return 200, node
+        if "shallow" in params:
+            if len(params) > 1:
+                return 400, {"error": "Mixing shallow with other query parameters is not supported"}
+            if isinstance(node, dict):
+                return 200, {key: True for key in node}
+            return 200, node
+
+        if "orderBy" not in params:
+            return 400, {"error": "orderBy must be defined when other query parameters are defined"}
+        try:
+            order_by = json.loads(params["orderBy"])
+            bounds = {}
+            for name in ("startAt", "endAt", "equalTo"):
+                if name in params:
+                    bounds[name] = json.loads(params[name])
+            first = int(params["limitToFirst"]) if "limitToFirst" in params else None
+            last = int(params["limitToLast"]) if "limitToLast" in params else None
+        except ValueError:
+            return 400, {"error": "Invalid query parameter"}
+        if not isinstance(node, dict):
+            return 200, None if node is None else node
+
+        def order(key):
+            if order_by == "$key":
+                return _order_key(key)
+            value = node[key] if order_by == "$value" else _child(node[key], order_by)
+            return _order_key(value)
+
+        items = sorted(node, key=lambda key: (order(key), key))
+        if "equalTo" in bounds:
+            items = [k for k in items if order(k) == _order_key(bounds["equalTo"])]
+        if "startAt" in bounds:
+            items = [k for k in items if order(k) >= _order_key(bounds["startAt"])]
+        if "endAt" in bounds:
+            items = [k for k in items if order(k) <= _order_key(bounds["endAt"])]
+        if first is not None:
+            items = items[:first]
+        if last is not None:
+            items = items[-last:] if last else []
+        self.rng.shuffle(items)
+        return 200, {key: node[key] for key in items}
+
+    def _notify(self, path, value, patch=False):
+        """Queue put/patch events for the listeners a write touched"""
+        written = _parts(path)
+        for parts, events in self.listeners:
+            if written[:len(parts)] == parts:
+                # Write at or below the listened location
+                relative = "/" + "/".join(written[len(parts):])
+                events.put(("patch" if patch else "put", {"path": relative, "data": value}))
+            elif parts[:len(written)] == written:
+                # Write above it: resend the listened node
+                events.put(("put", {"path": "/", "data": self.get("/".join(parts))}))
+
+    def listen(self, path):
+        """Register a listener; return its event queue (initial put queued)"""
+        events = queue.Queue()
+        with self.lock:
+            events.put(("put", {"path": "/", "data": self.get(path)}))
+            self.listeners.append((_parts(path), events))
+        return events
+
+    def unlisten(self, events):
+        with self.lock:
+            self.listeners = [l for l in self.listeners if l[1] is not events]
+
+    def _delay(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self.rng.uniform(latency[0], latency[1])
+        if latency:
+            real_sleep(latency)
+
+    def _make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                with standin.lock:
+                    standin.requests[self.command] = standin.requests.get(self.command, 0) + 1
+
+                standin._delay()
+                if (standin.down is not None and standin.down()) or \
+                        (standin.drop_rate and standin.rng.random() < standin.drop_rate):
+                    standin.drops += 1
+                    self.close_connection = True
+                    return
+                if standin.failure_rate and standin.rng.random() < standin.failure_rate:
+                    standin.failures += 1
+                    self._reply(503, {"error": "Service unavailable (injected)"})
+                    return
+
+                url = urlsplit(self.path)
+                if self.command == "GET" and \
+                        "text/event-stream" in (self.headers.get("Accept") or ""):
+                    self._stream(url.path[:-5] if url.path.endswith(".json") else url.path)
+                    return
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    self._reply(400, {"error": "Invalid JSON"})
+                    return
+                status, value = standin.handle(self.command, url.path, parse_qs(url.query), body)
+                self._reply(status, value)
+
+            def _reply(self, status, value):
+                out = json.dumps(value).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def _stream(self, path):
+                """Serve an event stream (chunked) until the client leaves"""
+                events = standin.listen(path)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    while standin._server is not None:
+                        try:
+                            event, data = events.get(timeout=standin.keep_alive_interval)
+                        except queue.Empty:
+                            event, data = "keep-alive", None
+                        out = ("event: %s\ndata: %s\n\n" % (event, json.dumps(data))).encode()
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(out), out))
+                        self.wfile.flush()
+                except OSError:
+                    pass                 # Client went away
+                finally:
+                    standin.unlisten(events)
+
+            do_GET = do_PUT = do_POST = do_PATCH = do_DELETE = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    # Lifecycle ------------------------------------------------------------
+
+    @property
+    def url(self):
+        return "http://%s:%d" % (self.host, self._server.server_address[1])
+
+    def start(self):
+        """Start serving in a background thread; returns self"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,162 @@
+"""Fake `machine` module: Pin, ADC, RTC, Timer and a few helpers."""
+
+import time
+
+from sim import state
+
+# Voltage the RP2040 temperature sensor reports at 27 C
+_TEMP_SENSOR_27C = int(0.706 / 3.3 * 65535)
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 4
+    IRQ_FALLING = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self._value = 0 if value is None else value
+        self.toggles = 0
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if value is not None:
+            self._value = value
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        value = 1 if value else 0
+        if value != self._value:
+            self.toggles += 1
+        self._value = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    high = on
+    low = off
+
+    def toggle(self):
+        self.value(not self._value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def __repr__(self):
+        return "Pin(%s)" % self.id
+
+
+class ADC:
+    CORE_TEMP = 4
+
+    def __init__(self, pin):
+        self.channel = pin.id if isinstance(pin, Pin) else pin
+        self._second = None
+        self._value = 0
+
+    def read_u16(self):
+        # Trace noise changes once a second; cache so high-rate sampling
+        # does not recompute the trace for every sample
+        second = int(state.now())
+        if second != self._second:
+            self._value = self._read(second)
+            self._second = second
+        return self._value
+
+    def _read(self, now):
+        if self.channel == self.CORE_TEMP:
+            # Roughly track the room temperature from the trace
+            temperature = state.trace.sample(now)[0]
+            volts = 0.706 - (temperature - 27) * 0.001721
+            return int(volts / 3.3 * 65535)
+        return state.trace.sample(now)[2]
+
+
+class RTC:
+    def datetime(self, datetimetuple=None):
+        if datetimetuple is None:
+            tm = time.gmtime()
+            return (tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0)
+        year, month, day, _, hour, minute, second = datetimetuple[:7]
+        state.clock.set_time(_timegm((year, month, day, hour, minute, second)))
+
+
+class Timer:
+    """Virtual-time timer: callbacks due during a sleep fire at its end.
+
+    Work between sleeps runs without interruption, so callbacks only
+    ever see the main code at a sleep, like a soft IRQ that was
+    scheduled while the CPU was busy.
+    """
+    ONE_SHOT = 0
+    PERIODIC = 1
+    MAX_CATCH_UP = 100000                # Callbacks fired per sleep at most
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self.callback = None
+        self.fired = 0
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None, hard=False):
+        self.deinit()
+        self.mode = mode
+        self.interval = 1.0 / freq if freq else (period or 1000) / 1000
+        self.callback = callback
+        self.due = state.clock.monotonic() + self.interval
+        state.clock.timers.append(self._run)
+
+    def deinit(self):
+        if self.callback is not None and self._run in state.clock.timers:
+            state.clock.timers.remove(self._run)
+        self.callback = None
+
+    def _run(self, now):
+        fired = 0
+        while self.callback is not None and self.due <= now and fired < self.MAX_CATCH_UP:
+            state.lag = now - self.due   # Sensors read at the callback's due time
+            try:
+                self.callback(self)
+            finally:
+                state.lag = 0.0
+            fired += 1
+            if self.mode == self.ONE_SHOT:
+                self.deinit()
+                break
+            self.due += self.interval
+        if self.due <= now:
+            self.due = now + self.interval   # Drop what could not catch up
+        self.fired += fired
+
+
+def _timegm(fields):
+    """UTC (year, month, day, hour, minute, second) to epoch seconds"""
+    import calendar
+    return calendar.timegm(tuple(fields) + (0, 0, 0))
+
+
+def unique_id():
+    return b"\xe6\x61\x38\x52\x83\x1f\x2a\x2b"
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def idle():
+    pass
+
+
+def reset():
+    raise SystemExit("machine.reset()")
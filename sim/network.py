@@ -0,0 +1,90 @@
+"""Fake `network` module: a station-mode WLAN with scripted outages."""
+
+from sim import state
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+    """Station interface. Like the real one, WLAN(STA_IF) returns the
+    same interface every time. An outage drops the association: the
+    status turns to STAT_CONNECT_FAIL and stays there until connect()
+    is called again, as on a Pico W after its access point reboots.
+    """
+
+    def __new__(cls, interface=STA_IF):
+        wlan = state.wlans.get(interface)
+        if wlan is None:
+            wlan = super().__new__(cls)
+            wlan.interface = interface
+            wlan._active = False
+            wlan._connect_started = None
+            wlan._lost = False
+            wlan._config = {"pm": 0, "rssi": -60}
+            wlan.connect_calls = 0
+            state.wlans[interface] = wlan
+        return wlan
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._connect_started = None
+
+    def connect(self, ssid=None, key=None):
+        self._active = True
+        self._connect_started = state.clock.monotonic()
+        self._lost = False
+        self.connect_calls += 1
+
+    def disconnect(self):
+        self._connect_started = None
+
+    def _joined(self):
+        """True once a connect() has had time to complete"""
+        return (self._connect_started is not None and
+                state.clock.monotonic() - self._connect_started >= state.wifi_connect_delay)
+
+    def associated(self):
+        """True if connected, without changing any state"""
+        return self._active and not self._lost and self._joined() and state.wifi_up()
+
+    def status(self, param=None):
+        if param == "rssi":
+            return self._config["rssi"] if self.associated() else 0
+        if self._lost:
+            return STAT_CONNECT_FAIL
+        if not self._active or self._connect_started is None:
+            return STAT_IDLE
+        if not state.wifi_up():
+            if self._joined():
+                # The access point went away under an established link
+                self._lost = True
+                self._connect_started = None
+                return STAT_CONNECT_FAIL
+            return STAT_NO_AP_FOUND
+        if not self._joined():
+            return STAT_CONNECTING
+        return STAT_GOT_IP
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self, config=None):
+        if self.isconnected():
+            return ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+        return ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
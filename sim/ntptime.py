@@ -0,0 +1,16 @@
+"""Fake `ntptime` module that steps the simulated clock."""
+
+from sim import state
+
+host = "pool.ntp.org"
+timeout = 1
+
+
+def time():
+    if not state.link_up() or state.chance(state.ntp_failure_rate):
+        raise OSError(110)
+    return state.clock.reference_time()
+
+
+def settime():
+    state.clock.set_time(time())
@@ -0,0 +1,99 @@
+"""
+Run the real weather_station.main() against simulated hardware and a
+local Firebase stand-in, at accelerated time.
+
+    python -m sim.run --hours 24 --latency 0.02 --failure-rate 0.05
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_outage(text):
+    """Parse 'START-END' (simulated seconds) into a tuple"""
+    start, end = text.split("-")
+    return float(start), float(end)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=1.0, help="simulated run time")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="sleep compression factor (default: instant)")
+    parser.add_argument("--trace", help="CSV or Firebase JSON export to replay")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="HTTP 503 probability")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="dropped connection probability")
+    parser.add_argument("--sensor-failure-rate", type=float, default=0.0)
+    parser.add_argument("--outage", type=parse_outage, action="append", default=[],
+                        help="WiFi outage window START-END in simulated seconds")
+    parser.add_argument("--unsynced", action="store_true", help="start with the RTC at 2021-01-01")
+    parser.add_argument("--trace-alloc", action="store_true", help="back gc.mem_alloc with tracemalloc")
+    parser.add_argument("--dump", help="write the final database to this JSON file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    import sim
+    from sim import state
+    from sim.traces import RecordedTrace
+
+    server = sim.FirebaseStandIn(latency=args.latency, failure_rate=args.failure_rate,
+                                 drop_rate=args.drop_rate, down=lambda: not state.link_up(),
+                                 seed=args.seed).start()
+    trace = None
+    if args.trace:
+        start = time.time()
+        if args.trace.endswith(".csv"):
+            trace = RecordedTrace.from_csv(args.trace, start)
+        else:
+            trace = RecordedTrace.from_firebase_export(args.trace, start)
+
+    clock = sim.install(server.url, trace=trace, speed=args.speed,
+                        duration=args.hours * 3600, unsynced=args.unsynced,
+                        sensor_failure_rate=args.sensor_failure_rate,
+                        wifi_outages=args.outage, trace_alloc=args.trace_alloc,
+                        seed=args.seed)
+
+    # Flash files (queue, rollups) go to a scratch directory
+    workdir = tempfile.mkdtemp(prefix="weather-sim-")
+    os.chdir(workdir)
+
+    started = time.perf_counter()
+    import weather_station
+    weather_station.main()
+    wall = time.perf_counter() - started
+    server.stop()
+
+    from compact import decode_node
+    readings = decode_node(server.get("weather_readings"))
+    rollups = server.get("rollups") or {}
+    summary = {
+        "simulated_hours": round(clock.monotonic() / 3600, 3),
+        "wall_seconds": round(wall, 2),
+        "speedup": round(clock.monotonic() / wall, 1) if wall else None,
+        "requests": server.requests,
+        "injected_failures": server.failures,
+        "dropped_requests": server.drops,
+        "stored_readings": len(readings),
+        "rollups": {name: len(nodes) for name, nodes in rollups.items()},
+        "offline_queue": weather_station.offline_queue.stats(),
+        "deadband": weather_station.deadband.stats(),
+        "workdir": workdir,
+    }
+    print(json.dumps(summary, indent=2))
+
+    if args.dump:
+        with open(args.dump, "w") as f:
+            json.dump(server.get(), f)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
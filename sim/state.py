@@ -0,0 +1,45 @@
+"""Shared state of the simulated world, set up by sim.install()."""
+
+import random
+
+clock = None                 # sim.clock.VirtualClock
+trace = None                 # Object with sample(timestamp) -> (temp, humidity, light)
+rng = random.Random(0)
+
+sensor_failure_rate = 0.0    # Probability that DHT11.measure() raises OSError
+ntp_failure_rate = 0.0       # Probability that ntptime.settime() fails
+wifi_outages = ()            # ((start, end), ...) in simulated seconds since start
+wifi_connect_delay = 2.0     # Seconds from WLAN.connect() to connected
+lag = 0.0                    # How late a catching-up timer callback runs
+wlans = {}                   # Interface -> sim.network.WLAN (one per interface)
+
+
+def now():
+    """Current simulated wall-clock time (as seen by a timer callback)"""
+    return clock.time() - lag
+
+
+def wifi_up():
+    """True unless the simulated clock is inside a WiFi outage window"""
+    elapsed = clock.monotonic()
+    for start, end in wifi_outages:
+        if start <= elapsed < end:
+            return False
+    return True
+
+
+def link_up():
+    """True if the station could reach the network right now.
+
+    Without a station WLAN (scripts that never touch the network module)
+    only the outage windows count.
+    """
+    wlan = wlans.get(0)
+    if wlan is not None and not wlan.associated():
+        return False
+    return wifi_up()
+
+
+def chance(probability):
+    """Return True with the given probability"""
+    return probability > 0 and rng.random() < probability
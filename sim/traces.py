@@ -0,0 +1,93 @@
+import bisect
+import csv
+import json
+import math
+import random
+
+
+class SyntheticTrace:
+    """Scripted sensor values: daily temperature/humidity/light cycles.
+
+    Values are deterministic for a given seed and timestamp. DHT11-style
+    whole numbers are returned for temperature and humidity.
+    """
+
+    def __init__(self, seed=0, mean_temp=21, temp_swing=4, mean_humidity=45,
+                 humidity_swing=10, noise=0.4):
+        self.seed = seed
+        self.mean_temp = mean_temp
+        self.temp_swing = temp_swing
+        self.mean_humidity = mean_humidity
+        self.humidity_swing = humidity_swing
+        self.noise = noise
+
+    def _phase(self, timestamp):
+        """Position in the day, 0 at 15:00 (warmest), in radians"""
+        return 2 * math.pi * ((timestamp - 15 * 3600) % 86400) / 86400
+
+    def _jitter(self, timestamp, channel):
+        return random.Random(hash((self.seed, int(timestamp), channel))).gauss(0, self.noise)
+
+    def sample(self, timestamp):
+        """Return (temperature, humidity, light_raw) at timestamp"""
+        phase = self._phase(timestamp)
+        temperature = self.mean_temp + self.temp_swing * math.cos(phase)
+        humidity = self.mean_humidity - self.humidity_swing * math.cos(phase)
+
+        # Daylight between 06:00 and 20:00, peaking at 13:00
+        hour = (timestamp % 86400) / 3600
+        if 6 <= hour <= 20:
+            light = 60000 * math.sin(math.pi * (hour - 6) / 14)
+        else:
+            light = 800
+        light += 2000 * self._jitter(timestamp, 2)
+
+        return (
+            int(round(temperature + self._jitter(timestamp, 0))),
+            int(round(humidity + self._jitter(timestamp, 1))),
+            max(0, min(65535, int(light))),
+        )
+
+
+class RecordedTrace:
+    """Replays recorded readings; returns the latest sample at or before t.
+
+    Recorded timestamps are shifted so the first one lines up with start
+    (the simulated clock's start time) unless start is None.
+    """
+
+    def __init__(self, rows, start=None):
+        rows = sorted(rows, key=lambda row: row["timestamp"])
+        if not rows:
+            raise ValueError("Empty trace")
+        shift = 0 if start is None else start - rows[0]["timestamp"]
+        self.times = [row["timestamp"] + shift for row in rows]
+        self.rows = rows
+
+    def sample(self, timestamp):
+        """Return (temperature, humidity, light_raw) at timestamp"""
+        i = max(0, bisect.bisect_right(self.times, timestamp) - 1)
+        row = self.rows[i]
+        return row["temperature"], row["humidity"], row["light_raw"]
+
+    @classmethod
+    def from_csv(cls, path, start=None):
+        """Load a CSV with timestamp,temperature,humidity,light_raw columns"""
+        with open(path, newline="") as f:
+            rows = []
+            for row in csv.DictReader(f):
+                rows.append({
+                    "timestamp": int(float(row["timestamp"])),
+                    "temperature": int(float(row["temperature"])),
+                    "humidity": int(float(row["humidity"])),
+                    "light_raw": int(float(row["light_raw"])),
+                })
+        return cls(rows, start)
+
+    @classmethod
+    def from_firebase_export(cls, path, start=None):
+        """Load the weather_readings node of a Firebase JSON export"""
+        with open(path) as f:
+            data = json.load(f)
+        readings = data.get("weather_readings", data)
+        return cls(list(readings.values()), start)
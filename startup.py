@@ -0,0 +1,139 @@
+import json
+import time
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+from scheduler import ticks_ms, ticks_diff, sleep_ms
+
+# Cold-start helpers: flash caches for DNS results and the last known
+# time, event-driven waits instead of fixed sleeps, and boot milestones
+# (ms since power-on) for the time-to-first-upload report.
+
+DNS_CACHE_FILE = "dns.json"
+DNS_TTL = 86400                      # Seconds a cached address is trusted
+TIME_CACHE_FILE = "time.json"
+MIN_VALID_YEAR = 2024                # RTC years before this mean "not set"
+
+
+class BootTimer:
+    """Milliseconds from power-on (ticks_ms starts at reset) to each milestone"""
+
+    def __init__(self):
+        self.marks = []
+        self.reported = False
+
+    def mark(self, name):
+        """Record a milestone the first time it is reached"""
+        for mark, _ in self.marks:
+            if mark == name:
+                return
+        self.marks.append((name, ticks_ms()))
+
+    def elapsed(self, name):
+        for mark, ms in self.marks:
+            if mark == name:
+                return ms
+        return None
+
+    def report(self):
+        """{milestone: ms since power-on}"""
+        result = {}
+        for name, ms in self.marks:
+            result[name + "_ms"] = ms
+        return result
+
+
+boot = BootTimer()
+
+
+class DnsCache:
+    """getaddrinfo results kept in flash so a reboot skips DNS lookups.
+
+    resolve() fits firebase_client.resolver. A cached address is used
+    until it is DNS_TTL seconds old or a connection to it fails (fresh).
+    """
+
+    def __init__(self, path=DNS_CACHE_FILE, ttl=DNS_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}                # "host:port" -> [ip, port, saved at]
+        self.hits = 0
+        self.lookups = 0
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def resolve(self, host, port, fresh=False):
+        """Socket address for host:port, from the cache when possible"""
+        key = "%s:%d" % (host, port)
+        entry = self.entries.get(key)
+        # Before NTP the clock may be behind the saved time; trust the entry
+        if entry and not fresh and time.time() - entry[2] < self.ttl:
+            self.hits += 1
+            return (entry[0], entry[1])
+        self.lookups += 1
+        addr = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+        self.entries[key] = [addr[0], addr[1], int(time.time())]
+        self.save()
+        return addr
+
+    def cached(self, host, port):
+        """Saved address for host:port whatever its age, or None (no lookup)"""
+        entry = self.entries.get("%s:%d" % (host, port))
+        return (entry[0], entry[1]) if entry else None
+
+    def save(self):
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f)
+        except OSError as e:
+            print(f"DNS cache not saved: {e}")
+
+
+def clock_valid():
+    """True if the RTC holds a plausible date (set by NTP or the cache)"""
+    return time.gmtime()[0] >= MIN_VALID_YEAR
+
+
+def save_time(path=TIME_CACHE_FILE):
+    """Remember the current time in flash (call after a good NTP sync)"""
+    if not clock_valid():
+        return False
+    try:
+        with open(path, "w") as f:
+            f.write(str(int(time.time())))
+        return True
+    except OSError as e:
+        print(f"Time cache not saved: {e}")
+        return False
+
+
+def restore_time(path=TIME_CACHE_FILE):
+    """Set an unset RTC to the last saved time; return True if it did.
+
+    The result is only a lower bound (time spent powered off is not
+    known), but it keeps timestamps in the right year and ordered
+    after earlier uploads until NTP answers.
+    """
+    if clock_valid():
+        return False
+    try:
+        with open(path) as f:
+            seconds = int(f.read())
+    except (OSError, ValueError):
+        return False
+    from machine import RTC
+    tm = time.gmtime(seconds)
+    RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+    return True
+
+
+def wait_until(boot_ms, poll_ms=50, idle=None):
+    """Sleep until boot_ms after power-on, calling idle() meanwhile"""
+    while ticks_diff(boot_ms, ticks_ms()) > 0:
+        if idle is not None:
+            idle()
+        sleep_ms(min(poll_ms, max(1, ticks_diff(boot_ms, ticks_ms()))))
@@ -0,0 +1,385 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    import usocket as socket
+except ImportError:
+    import socket
+import gc
+import struct
+import sys
+import time
+from machine import RTC
+import weather_station as ws
+from scheduler import DeadlineScheduler
+
+# Concurrent runtime: sampling, uploading, time sync, LEDs and housekeeping
+# run as separate tasks joined by bounded queues, so a slow Firebase
+# response or NTP server never delays the next sensor reading.
+# Run this file instead of weather_station.py to use it.
+
+UPLOAD_QUEUE_SIZE = 8                # Readings waiting in RAM for upload
+UPLOAD_BATCH = 8                     # Readings coalesced into one PATCH
+TIME_SYNC_INTERVAL = 3600            # Seconds between NTP resyncs
+FIRST_SYNC_TIMEOUT = 10              # Seconds sampling waits for first sync
+HOUSEKEEPING_INTERVAL = 60           # Seconds between gc/stats runs
+CONTROL_POLL_INTERVAL = 1            # Seconds between checks while the stream is off
+LINK_POLL_INTERVAL = 1               # Seconds between WiFi link checks
+
+NTP_HOST = "pool.ntp.org"
+NTP_TIMEOUT = 2                      # Seconds to wait for an NTP reply
+# Seconds between 1900 (NTP epoch) and the board's epoch (1970 or 2000)
+NTP_DELTA = 2208988800 if time.gmtime(0)[0] == 1970 else 3155673600
+
+
+class BoundedQueue:
+    """Minimal bounded FIFO for one consumer task (uasyncio has no Queue)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = []
+        self.event = asyncio.Event()
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put_nowait(self, item):
+        """Add an item; return False (and count it) if the queue is full"""
+        if len(self.items) >= self.maxsize:
+            self.rejected += 1
+            return False
+        self.items.append(item)
+        self.event.set()
+        return True
+
+    def put_latest(self, item):
+        """Add an item, discarding the oldest one if the queue is full"""
+        if len(self.items) >= self.maxsize:
+            self.items.pop(0)
+        self.items.append(item)
+        self.event.set()
+
+    async def get(self):
+        """Wait for and remove the oldest item"""
+        while not self.items:
+            self.event.clear()
+            await self.event.wait()
+        return self.items.pop(0)
+
+    def get_many_nowait(self, count):
+        """Remove up to count items that are already waiting"""
+        items = self.items[:count]
+        del self.items[:count]
+        return items
+
+
+async def ntp_time():
+    """Query the NTP server without blocking the event loop"""
+    # getaddrinfo() blocks, so only the address resolve_ntp_host() cached
+    addr = ws.dns_cache.cached(NTP_HOST, 123)
+    if addr is None:
+        raise OSError("NTP server not resolved")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        query = bytearray(48)
+        query[0] = 0x1B                  # LI=0, VN=3, Mode=3 (client)
+        sock.sendto(query, addr)
+
+        start = time.time()
+        while time.time() - start < NTP_TIMEOUT:
+            try:
+                msg = sock.recv(48)
+            except OSError:
+                await asyncio.sleep(0.05)
+                continue
+            return struct.unpack("!I", msg[40:44])[0] - NTP_DELTA
+        raise OSError("NTP timeout")
+    finally:
+        sock.close()
+
+
+def resolve_ntp_host():
+    """Look the NTP server up before the event loop starts.
+
+    With nothing cached yet, waits up to FIRST_SYNC_TIMEOUT seconds for
+    the link first. A failed lookup keeps any older cached address.
+    """
+    if ws.dns_cache.cached(NTP_HOST, 123) is None:
+        ws.link.wait_up(FIRST_SYNC_TIMEOUT * 1000)
+    try:
+        ws.dns_cache.resolve(NTP_HOST, 123, ws.ntp_failed)
+    except OSError as e:
+        print(f"NTP server lookup failed: {e}")
+
+
+async def sync_time():
+    """Set the RTC from NTP; return True on success"""
+    try:
+        print("Synchronizing time with NTP server...")
+        with ws.metrics.stage("ntp"):
+            seconds = await ntp_time()
+        tm = time.gmtime(seconds)
+        RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+        print("Time synchronized successfully!")
+        ws.ntp_failed = False
+        ws.startup.save_time()
+        ws.boot.mark("ntp")
+        return True
+    except Exception as e:
+        print(f"Time sync failed: {e}")
+        ws.ntp_failed = True
+        ws.metrics.fail("ntp")
+        return False
+
+
+async def time_sync_task(synced, schedule):
+    """Sync time at startup and then every TIME_SYNC_INTERVAL seconds"""
+    while True:
+        if await sync_time():
+            synced.set()
+            schedule.realign()
+            await asyncio.sleep(TIME_SYNC_INTERVAL)
+        else:
+            # Retry sooner after a failure
+            await asyncio.sleep(60)
+
+
+async def sampling_task(upload_queue, led_queue, synced, schedule):
+    """Read sensors on a fixed cadence, independent of network latency"""
+    # Timestamps are only meaningful after the first sync; don't wait forever
+    try:
+        await asyncio.wait_for(synced.wait(), FIRST_SYNC_TIMEOUT)
+    except asyncio.TimeoutError:
+        print("Starting without time sync")
+        schedule.realign()
+
+    reading_count = 0
+    while True:
+        slot_time = await schedule.wait_async()
+        reading_count += 1
+        print(f"\n--- Reading #{reading_count} ---")
+
+        sensor_data = ws.read_sensor_data(slot_time)
+        if sensor_data:
+            ws.rollups.add(sensor_data)
+            led_queue.put_latest(sensor_data)
+            if not ws.should_upload(sensor_data):
+                print("No significant change - upload skipped")
+            elif not upload_queue.put_nowait(sensor_data):
+                # Uploader is behind - keep the reading in flash instead
+                ws.offline_queue.push(sensor_data)
+                print("Upload queue full - reading queued offline")
+        ws.display_data(sensor_data)
+        sensor_data = None
+
+
+async def upload_task(upload_queue):
+    """Upload queued readings, coalescing whatever is waiting into one PATCH"""
+    while True:
+        readings = [await upload_queue.get()]
+        readings.extend(upload_queue.get_many_nowait(UPLOAD_BATCH - 1))
+
+        if not ws.link.is_up():
+            # No link: don't wait for a socket timeout, keep them for later
+            for reading in readings:
+                ws.offline_queue.push(reading)
+            print(f"Link down - {len(readings)} reading(s) queued")
+            readings = None
+            continue
+
+        values = ws.history_paths(readings)
+        if ws.memory.pressure == ws.OK:
+            values["latest_reading"] = ws.wire(readings[-1])
+        pending = ws.rollups.pending()
+        values.update(pending)
+        with ws.metrics.stage("upload"):
+            success, message = await ws.firebase.update_async("", values)
+        values = None
+
+        if success:
+            print(f"Uploaded {len(readings)} reading(s)")
+            if not ws.boot.reported:
+                success, message = await ws.firebase.update_async(
+                    f"stations/{ws.STATION_ID}", {"boot": ws.boot_report()})
+                if not success:
+                    print(f"Boot report failed: {message}")
+            if pending:
+                ws.rollups.published(pending)
+            if ws.offline_queue.depth():
+                await drain_offline_queue()
+        else:
+            print(f"Upload failed: {message}")
+            ws.metrics.fail("upload")
+            for reading in readings:
+                ws.offline_queue.push(reading)
+        readings = None
+
+
+async def drain_offline_queue():
+    """Replay the offline queue as bulk writes (async version)"""
+    for _ in range(ws.QUEUE_DRAIN_REQUESTS):
+        readings = ws.offline_queue.peek(ws.drain_batch())
+        if not readings:
+            break
+        success, message = await ws.firebase.update_async("", ws.history_paths(readings))
+        if not success:
+            print(f"Queue replay failed: {message}")
+            break
+        ws.offline_queue.pop(len(readings))
+        print(f"Replayed {len(readings)} queued readings ({ws.offline_queue.depth()} left)")
+
+
+async def led_task(led_queue):
+    """Refresh the weather LEDs whenever a new reading arrives"""
+    while True:
+        data = await led_queue.get()
+        if data["temperature"] is not None:
+            ws.set_weather_leds(ws.get_weather_quality(data["temperature"], data["humidity"]))
+
+
+async def housekeeping_task(upload_queue, schedule):
+    """Periodic garbage collection, status output and metrics publishing"""
+    last_metrics_time = time.time()
+    while True:
+        await asyncio.sleep(HOUSEKEEPING_INTERVAL)
+        ws.metrics.sample_memory()
+        ws.memory.cycle()
+        ws.metrics.sample_memory()
+        ws.apply_memory_pressure()
+        print(f"Free memory: {gc.mem_free()} bytes | "
+              f"upload queue: {len(upload_queue)} | offline queue: {ws.offline_queue.depth()}")
+        print(f"Schedule: {schedule.stats()}")
+        print(f"Deadband: {ws.deadband.stats()}")
+
+        # Publish rollups that are not riding along with readings
+        pending = ws.rollups.pending()
+        if len(pending) >= ws.ROLLUP_FLUSH_PENDING:
+            success, message = await ws.firebase.update_async("", pending)
+            if success:
+                ws.rollups.published(pending)
+            else:
+                print(f"Rollup upload failed: {message}")
+                ws.metrics.fail("rollups")
+
+        if ws.memory.pressure < ws.CRITICAL and \
+                time.time() - last_metrics_time >= ws.METRICS_INTERVAL:
+            if await publish_metrics(upload_queue):
+                last_metrics_time = time.time()
+
+
+async def publish_metrics(upload_queue):
+    """Write the metrics snapshot without blocking the event loop"""
+    snapshot = ws.metrics_snapshot()
+    snapshot["upload_queue_rejected"] = upload_queue.rejected
+    success, message = await ws.firebase.update_async(
+        f"stations/{ws.STATION_ID}", {"metrics": snapshot})
+    if success:
+        print("Metrics published")
+    else:
+        print(f"Metrics publish failed: {message}")
+    return success
+
+
+async def run_pending_command(schedule, upload_queue):
+    """Run a command from the control stream (async version, never blocks)"""
+    command = ws.pending_command
+    if command is None:
+        return None
+    ws.pending_command = None
+    print(f"Control: running {command}")
+    if command == "sync_time":
+        if await sync_time():
+            schedule.realign()
+    elif command == "publish_metrics":
+        await publish_metrics(upload_queue)
+    elif command == "flush_queue":
+        ws.offline_queue.flush()
+    # Clear it so a reconnect does not run it again
+    success, message = await ws.firebase.update_async(ws.CONTROL_PATH, {"command": None})
+    if not success:
+        print(f"Control: could not clear command: {message}")
+    return command
+
+
+async def sensor_task(schedule):
+    """Sample each registered sensor on its own period between readings"""
+    ws.sensors.start()
+    while True:
+        ws.sensors.poll(schedule.remaining_ms())
+        wake = ws.sensors.next_ms(schedule.remaining_ms())
+        if wake is None:
+            return
+        await asyncio.sleep(max(wake, 1) / 1000)
+
+
+async def link_task():
+    """Keep the WiFi link up (reconnects with backoff, never blocks)"""
+    ws.link.start()
+    while True:
+        ws.link.poll()
+        await asyncio.sleep(LINK_POLL_INTERVAL)
+
+
+async def control_task(schedule, upload_queue):
+    """Apply remote config and commands from the control stream"""
+    stream = ws.start_control_stream()
+    if stream is None:
+        return
+    while True:
+        if not ws.link.is_up() or ws.memory.pressure >= ws.CRITICAL:
+            await asyncio.sleep(CONTROL_POLL_INTERVAL)
+            continue
+        # Waits for the next event; connecting yields to the other tasks
+        await stream.poll_async()
+        schedule.set_period(ws.CONFIG["reading_interval"])
+        await run_pending_command(schedule, upload_queue)
+
+
+async def main_async():
+    """Start all tasks and run them forever"""
+    ws.start_rollups()
+    upload_queue = BoundedQueue(UPLOAD_QUEUE_SIZE)
+    led_queue = BoundedQueue(1)
+    synced = asyncio.Event()
+    schedule = DeadlineScheduler(ws.CONFIG["reading_interval"], ws.SCHEDULE_POLICY)
+
+    await asyncio.gather(
+        time_sync_task(synced, schedule),
+        sampling_task(upload_queue, led_queue, synced, schedule),
+        upload_task(upload_queue),
+        led_task(led_queue),
+        housekeeping_task(upload_queue, schedule),
+        control_task(schedule, upload_queue),
+        link_task(),
+        sensor_task(schedule),
+    )
+
+
+def run():
+    """Entry point for the concurrent weather station"""
+    print("Weather Station Starting (async runtime)...")
+    ws.boot.mark("main")
+    ws.startup.restore_time()
+    resolve_ntp_host()
+    try:
+        asyncio.run(main_async())
+    except KeyboardInterrupt:
+        print("\nWeather Station Stopped")
+        ws.RED.off()
+        ws.YELLOW.off()
+        ws.GREEN.off()
+        ws.sensors.stop()
+        ws.offline_queue.flush()
+        if ws.rollups is not None:
+            ws.rollups.flush()
+    finally:
+        if sys.implementation.name == "micropython":
+            # uasyncio keeps its loop after run(); reset it for the REPL
+            asyncio.new_event_loop()
+
+
+if __name__ == "__main__":
+    run()
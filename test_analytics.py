@@ -0,0 +1,60 @@
+"""
+Checks that the vectorized classifiers in analytics.py agree with the
+scalar ones in weather_station.py (runs on a computer with NumPy)
+Run with: python -m pytest test_analytics.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import analytics
+
+NAN = float("nan")
+
+# Every band edge, a step either side of it, the extremes and NaN
+LIGHT = [0, 1, 4999, 5000, 5000.5, 5001, 14999, 15000, 15001, 29999, 30000, 30001,
+         49999, 50000, 50001, 65535, -1, NAN]
+TEMPERATURE = [-40, 4.9, 5, 5.1, 9.9, 10, 10.1, 14.9, 15, 24.9, 25, 29.9, 30, 30.1,
+               34.9, 35, 35.1, 60, NAN]
+HUMIDITY = [0, 69.9, 70, 70.1, 79.9, 80, 80.1, 100, NAN]
+
+# The scalar classifiers need the simulated hardware to import, so they
+# run in their own process and leave this one untouched
+SCALAR = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import sim
+sim.install("http://127.0.0.1:9")
+import weather_station as ws
+light, temperature, humidity = json.loads(sys.stdin.read())
+print(json.dumps({
+    "light": [ws.get_light_level(raw) for raw in light],
+    "description": [ws.get_weather_description(t, 50) for t in temperature],
+    "quality": [[ws.get_weather_quality(t, h) for h in humidity] for t in temperature],
+}))
+"""
+
+
+def _scalar():
+    root = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c", SCALAR, root],
+                            input=json.dumps([LIGHT, TEMPERATURE, HUMIDITY]),
+                            capture_output=True, text=True, cwd=tempfile.mkdtemp(),
+                            check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_classifiers_match_scalar_versions():
+    scalar = _scalar()
+    assert analytics.light_level(LIGHT).tolist() == scalar["light"]
+    assert analytics.weather_description(TEMPERATURE).tolist() == scalar["description"]
+    temperature = [[t] * len(HUMIDITY) for t in TEMPERATURE]
+    humidity = [HUMIDITY] * len(TEMPERATURE)
+    assert analytics.weather_quality(temperature, humidity).tolist() == scalar["quality"]
+
+
+if __name__ == "__main__":
+    test_classifiers_match_scalar_versions()
+    print("✅ Analytics checks passed")
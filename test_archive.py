@@ -0,0 +1,53 @@
+"""
+Checks for the binary archive (runs on a computer with NumPy)
+Run with: python -m pytest test_archive.py
+"""
+
+import io
+import math
+import tempfile
+from archive import Archive, import_firebase, export_csv, values
+
+
+def test_import_null_temperature():
+    export = {"weather_readings": {
+        "-a": {"timestamp": 100, "temperature": 21.5, "humidity": 40, "light_raw": 1000,
+               "light_level": "Very Dark"},
+        "-b": {"timestamp": 130, "temperature": None, "humidity": None, "light_raw": 65535,
+               "light_level": "Very Bright"},
+        "-c": {"t": 160, "c": None, "h": 420, "l": 2000},
+    }}
+    with Archive(tempfile.mkdtemp()) as archive:
+        assert import_firebase(archive, export) == 3
+        records = archive.read("default")
+        temperature = values(records, "temperature")
+        assert temperature[0] == 21.5
+        assert math.isnan(temperature[1]) and math.isnan(temperature[2])
+        assert values(records, "humidity")[2] == 42
+        # The light values of a reading without temperature are kept
+        assert values(records, "light_raw").tolist() == [1000, 65535, 2000]
+
+        history = archive.history()
+        assert len(history) == 3
+        assert math.isnan(history.temperature[1])
+
+        out = io.StringIO()
+        export_csv(archive, out)
+        rows = out.getvalue().splitlines()
+        assert rows[2] == "default,130,,,65535,Very Bright"
+
+
+def test_append_null_temperature():
+    with Archive(tempfile.mkdtemp()) as archive:
+        archive.append("s1", {"timestamp": 100, "temperature": None, "humidity": 55,
+                              "light_raw": 300, "light_level": "Very Dark"})
+        records = archive.read("s1")
+        assert math.isnan(values(records, "temperature")[0])
+        assert values(records, "humidity")[0] == 55
+        assert values(records, "light_raw")[0] == 300
+
+
+if __name__ == "__main__":
+    test_import_null_temperature()
+    test_append_null_temperature()
+    print("✅ Archive checks passed")
@@ -0,0 +1,105 @@
+"""
+Checks for the GC budget in memory.py against a small model of the
+MicroPython allocator (counts collections and honours gc.threshold())
+Run with: python -m pytest test_memory.py
+"""
+
+import memory
+from memory import MemoryManager, OK, LOW
+
+
+class ShimGC:
+    """Heap with live and dead bytes, an allocation threshold and a block limit"""
+
+    def __init__(self, heap, live, max_block=None):
+        self.heap = heap
+        self.live = live
+        self.dead = 0
+        self.max_block = max_block
+        self.amount = 0                  # Bytes allocated since the last collection
+        self.limit = None
+        self.enabled = True
+        self.collections = 0
+        self.auto = 0                    # Collections the allocator started
+
+    def mem_alloc(self):
+        return self.live + self.dead
+
+    def mem_free(self):
+        return self.heap - self.mem_alloc()
+
+    def collect(self):
+        self.collections += 1
+        self.dead = 0
+        self.amount = 0
+
+    def threshold(self, amount=None):
+        self.limit = amount
+
+    def disable(self):
+        self.enabled = False
+
+    def enable(self):
+        self.enabled = True
+
+    def alloc(self, size):
+        """Allocate a block that is garbage once the caller drops it"""
+        if self.enabled and self.limit is not None and self.amount >= self.limit:
+            self.auto += 1
+            self.collect()
+        largest = self.mem_free()
+        if self.max_block is not None:
+            largest = min(largest, self.max_block)
+        if size > largest:
+            raise MemoryError
+        self.amount += size
+        self.dead += size
+        return size
+
+
+def _install(shim, monkeypatch):
+    monkeypatch.setattr(memory, "gc", shim)
+    monkeypatch.setattr(memory, "bytearray", shim.alloc, raising=False)
+
+
+def _run(manager, shim, cycles, per_cycle):
+    for _ in range(cycles):
+        shim.alloc(per_cycle)
+        manager.cycle()
+        manager.maybe_collect()
+
+
+def test_probe_does_not_force_a_second_collection(monkeypatch):
+    shim = ShimGC(heap=64000, live=30000)
+    _install(shim, monkeypatch)
+    manager = MemoryManager(probe_every=4)
+    _run(manager, shim, 60, 2000)
+    assert manager.pressure == LOW
+    # Every collection was ours: the probe's trial block never pushed
+    # the allocator over its threshold
+    assert shim.auto == 0
+    assert shim.collections == manager.collections + manager.probe_collections
+    # A short heap explains LOW without probing after every collection
+    assert manager.probe_collections <= manager.collections // 4 + 1
+
+
+def test_probe_sees_fragmentation(monkeypatch):
+    shim = ShimGC(heap=200000, live=20000, max_block=10000)
+    _install(shim, monkeypatch)
+    manager = MemoryManager()
+    manager.collect()
+    assert manager.largest_free <= 10000
+    assert manager.fragmentation > 0.9
+    assert manager.pressure == LOW
+    assert shim.auto == 0
+
+    # Once the heap defragments, the next collection notices
+    shim.max_block = None
+    manager.collect()
+    assert manager.pressure == OK
+    assert manager.largest_free > 100000
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__]))
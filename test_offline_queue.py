@@ -0,0 +1,145 @@
+"""
+Checks for the offline queue file: round trips, reopening, torn header
+writes and moving readings over from other formats
+Run with: python -m pytest test_offline_queue.py
+"""
+
+import os
+import struct
+import tempfile
+import offline_queue
+from offline_queue import OfflineQueue, FIELDS, HEADER_FORMAT, HEADER_SLOT
+
+
+def _path():
+    return os.path.join(tempfile.mkdtemp(), "queue.bin")
+
+
+def _reading(timestamp, **values):
+    reading = {"timestamp": timestamp, "temperature": 21.5, "humidity": 40,
+               "light_raw": 1000, "light_min": 900, "light_max": 1100, "light_std": 30,
+               "chip_temperature": 24}
+    reading.update(values)
+    return reading
+
+
+def _legacy_file(path, magic, records, capacity=8, head=None, tail=0):
+    """Write a queue file in a format from before the layout block"""
+    record_format = "<IHhHH" if magic == b"WQ02" else "<IhHH"
+    size = struct.calcsize(record_format)
+    data = bytearray(2 * HEADER_SLOT + capacity * size)
+    head = tail + len(records) if head is None else head
+    header = bytearray(struct.pack(HEADER_FORMAT, magic, 1, capacity, head, tail, 0))
+    struct.pack_into("<H", header, len(header) - 2, offline_queue._checksum(header[:-2]))
+    data[HEADER_SLOT:HEADER_SLOT + len(header)] = header
+    for i, record in enumerate(records):
+        struct.pack_into(record_format, data, 2 * HEADER_SLOT + (tail + i) % capacity * size,
+                         *record)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_round_trip_and_reopen():
+    path = _path()
+    queue = OfflineQueue(path, 10, 2)
+    queue.push(_reading(1, temperature=None, light_raw=65535, light_max=65535))
+    queue.push(_reading(2, humidity=None, temperature=-3.2, chip_temperature=None))
+    queue.push({"timestamp": 3, "temperature": 0, "humidity": 0, "light_raw": 0})
+    assert queue.depth() == 3
+
+    # The third reading is still in RAM; reopening keeps the flushed two
+    readings = OfflineQueue(path, 10, 2).peek(10)
+    assert len(readings) == 2
+    assert readings[0]["temperature"] is None
+    assert readings[0]["light_raw"] == 65535 and readings[0]["light_max"] == 65535
+    assert readings[0]["humidity"] == 40 and readings[0]["chip_temperature"] == 24
+    assert readings[1]["temperature"] == -3.2 and readings[1]["humidity"] is None
+    assert readings[1]["chip_temperature"] is None
+
+    queue.flush()
+    queue.pop(1)
+    reopened = OfflineQueue(path, 10, 2)
+    readings = reopened.peek(10)
+    assert [r["timestamp"] for r in readings] == [2, 3]
+    assert readings[1]["light_min"] is None and readings[1]["light_raw"] == 0
+
+
+def test_torn_header_write_keeps_previous_state():
+    path = _path()
+    queue = OfflineQueue(path, 10, 2)
+    for t in range(4):
+        queue.push(_reading(t))
+    # The last flush wrote the slot for its sequence number; tear it
+    with open(path, "r+b") as f:
+        f.seek((queue.seq % 2) * HEADER_SLOT + 8)
+        f.write(b"\xff\xff")
+
+    reopened = OfflineQueue(path, 10, 2)
+    assert [r["timestamp"] for r in reopened.peek(10)] == [0, 1]
+    reopened.push(_reading(9))
+    reopened.flush()
+    assert [r["timestamp"] for r in OfflineQueue(path, 10, 2).peek(10)] == [0, 1, 9]
+
+    # With both slots torn the file is replaced by an empty queue
+    with open(path, "r+b") as f:
+        for slot in (0, HEADER_SLOT):
+            f.seek(slot + 8)
+            f.write(b"\xff\xff")
+    assert OfflineQueue(path, 10, 2).depth() == 0
+
+
+def test_move_from_wq02():
+    path = _path()
+    flags = 1                            # Temperature missing
+    _legacy_file(path, b"WQ02", [(100, flags, 0, 455, 65535), (130, 0, -21, 0, 7)],
+                 capacity=8, tail=6)   # Wraps around the end of the ring
+    queue = OfflineQueue(path, 10, 4)
+    assert not os.path.exists(path + ".old")
+    readings = queue.peek(10)
+    assert [r["timestamp"] for r in readings] == [100, 130]
+    assert readings[0]["temperature"] is None and readings[0]["humidity"] == 45.5
+    assert readings[0]["light_raw"] == 65535 and readings[0]["light_min"] is None
+    assert readings[1]["temperature"] == -2.1 and readings[1]["light_raw"] == 7
+    assert queue.enqueued == 0
+    # The moved readings are in the new file for good
+    assert OfflineQueue(path, 10, 4).depth() == 2
+
+
+def test_move_from_wq01():
+    path = _path()
+    _legacy_file(path, b"WQ01", [(100, -32768, 455, 0xFFFF), (130, 215, 0xFFFF, 3000)])
+    readings = OfflineQueue(path, 10, 4).peek(10)
+    assert readings[0]["temperature"] is None and readings[0]["light_raw"] is None
+    assert readings[0]["humidity"] == 45.5
+    assert readings[1]["temperature"] == 21.5 and readings[1]["humidity"] is None
+
+
+def test_move_to_other_fields_and_capacity():
+    path = _path()
+    queue = OfflineQueue(path, 10, 1)
+    for t in range(5):
+        queue.push(_reading(t))
+    fields = FIELDS + (("wind", "H", 10),)
+    moved = OfflineQueue(path, 3, 2, fields)
+    readings = moved.peek(10)
+    # The smaller ring keeps the newest readings
+    assert [r["timestamp"] for r in readings] == [2, 3, 4]
+    assert readings[0]["wind"] is None and readings[0]["light_std"] == 30
+    assert moved.dropped == 2
+
+
+def test_interrupted_move_restarts_without_repeats():
+    path = _path()
+    # Power cut after part of the copy had been written to the new file
+    partial = OfflineQueue(path, 10, 1)
+    partial.push(_reading(0))
+    partial.push(_reading(1))
+    _legacy_file(path + ".old", b"WQ02", [(t, 0, 200, 400, t) for t in range(5)])
+    readings = OfflineQueue(path, 10, 1).peek(10)
+    assert [r["timestamp"] for r in readings] == [0, 1, 2, 3, 4]
+    assert not os.path.exists(path + ".old")
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,75 @@
+"""
+Checks for the LinkManager state machine in wifi_link.py, driven through
+an access point outage by the simulator's WLAN
+Run with: python -m pytest test_wifi_link.py
+"""
+
+import random
+import wifi_link
+from sim import network, state
+from sim.clock import VirtualClock
+from wifi_link import LinkManager, OFF, DOWN, CONNECTING, UP
+
+STEP = 0.1                           # Seconds between polls
+
+
+def _install(monkeypatch, outages):
+    """Point the sim WLAN and the link's ticks at a clock of our own"""
+    clock = VirtualClock(start=1718000000)
+    monkeypatch.setattr(state, "clock", clock)
+    monkeypatch.setattr(state, "wifi_outages", outages)
+    monkeypatch.setattr(state, "wifi_connect_delay", 2.0)
+    monkeypatch.setattr(state, "wlans", {})
+    monkeypatch.setattr(wifi_link, "ticks_ms", lambda: int(clock.monotonic() * 1000))
+    random.seed(0)
+    return clock
+
+
+def _run(link, clock, until):
+    """Poll every STEP up to until; return the states it passed through"""
+    states = [link.state]
+    while clock.monotonic() < until:
+        clock.sleep(STEP)
+        link.poll()
+        if link.state != states[-1]:
+            states.append(link.state)
+    return states
+
+
+def test_drop_and_recover(monkeypatch):
+    clock = _install(monkeypatch, ((30, 100),))
+    wlan = network.WLAN(network.STA_IF)
+    link = LinkManager(wlan, "ssid", "password", connect_timeout_ms=5000,
+                       min_backoff_ms=1000, max_backoff_ms=8000)
+    link.start()
+    assert _run(link, clock, 29) == [CONNECTING, UP]
+    assert link.last_link_ms < 2500
+
+    # The access point goes away: one rejoin at once, then backoff
+    # between attempts that fail until it is back
+    states = _run(link, clock, 140)
+    assert states[:4] == [UP, CONNECTING, DOWN, CONNECTING]
+    assert states[-2:] == [CONNECTING, UP]
+    assert states.count(UP) == 2
+    for before, after in zip(states[1:-2], states[2:-1]):
+        assert {before, after} == {CONNECTING, DOWN}
+    assert link.is_up() and link.outages == 1 and link.ups == 2
+    assert link.failures == link.attempts - 2
+    assert wlan.connect_calls == link.attempts
+    # Backed off but capped: the link came back within the longest
+    # jittered backoff plus a connect after the outage ended
+    assert 70000 <= link.last_outage_ms <= 70000 + 12000 + 2500
+    assert link.failures < 70 // 4
+
+    # Powering down is not an outage, and start() brings the link back
+    link.sleep()
+    assert not link.poll() and link.state == OFF
+    clock.sleep(60)
+    link.start()
+    assert _run(link, clock, clock.monotonic() + 5) == [CONNECTING, UP]
+    assert link.outages == 1 and link.ups == 3
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__]))
@@ -1,57 +1,246 @@
 import json
 import time
 import gc
+try:
+    import ubinascii as binascii
+except ImportError:
+    import binascii
+import machine
 from machine import Pin, ADC
 import dht
 import ntptime
 import network
+import firebase_client
 from firebase_client import FirebaseClient
+from offline_queue import OfflineQueue
+from scheduler import DeadlineScheduler, SKIP
+from deadband import DeadbandFilter
+from reading import Reading
+from sensors import CachedDHT, SensorRegistry, ClimateSensor, LightSensor, ChipTemperature
+import wifi_link
+from wifi_link import LinkManager
+import startup
+from startup import boot
+from scheduler import ticks_ms, ticks_diff
+from alloc_probe import AllocProbe
+from metrics import Metrics
+from memory import MemoryManager, OK, LOW, CRITICAL
+import keys
 
 # Hardware setup - LED indicators for weather quality
 RED = Pin(0, Pin.OUT)                # Red LED for bad weather
 YELLOW = Pin(1, Pin.OUT)             # Yellow LED for okay weather
 GREEN = Pin(2, Pin.OUT)              # Green LED for nice weather
 dht_sensor = dht.DHT11(Pin(14))      # DHT11 on GPIO 14
+
+# DHT11 reads go through a cache: at most one measure per 1.1 s, failed
+# reads retried with backoff while idle, and readings fall back to the
+# last good values for up to DHT_MAX_AGE seconds
+DHT_MAX_AGE = 90
+DHT_WARMUP_MS = 1000                 # DHT11 needs ~1 s after power-up
+climate = CachedDHT(dht_sensor, max_age_ms=DHT_MAX_AGE * 1000)
 light_sensor = ADC(Pin(26))          # Photoresistor on GPIO 26 (ADC0)
 
-# Firebase setup
-firebase = FirebaseClient()
+# Sample the photoresistor from a timer so flicker and passing shadows
+# average out instead of aliasing into a single sample per reading
+LIGHT_SAMPLE_RATE = 100              # Hz, 0 = one read per reading
+LIGHT_RING_SIZE = 256                # Samples buffered between drains
+LIGHT_MEDIAN = 3                     # Median-of-N spike filter, 1 = off
+
+# Sensor registry: each source is sampled on its own period while the
+# station waits for the next slot, and every reading takes the latest
+# values of all of them. To add a sensor, write a sensors.Sensor
+# subclass, list its fields in reading.FIELDS and register it here; the
+# main loop does not change. The offline queue stores the fields of the
+# registered sensors. With COMPACT_UPLOAD a new field is only sent once
+# it has a key in compact.OPTIONAL_KEYS, and archive.py does not keep it.
+DHT_PERIOD = 60                      # Seconds; room temperature moves slowly
+LIGHT_DRAIN_PERIOD = 1               # Seconds; the ring holds 2.5 s at 100 Hz
+CHIP_TEMP_PERIOD = 60                # Seconds
+SENSOR_SLACK_MS = 100                # Sensors due this close share a wakeup
+IDLE_POLL_MS = 1000                  # Link/control checks while the radio is on
+sensors = SensorRegistry(SENSOR_SLACK_MS)
+sensors.register(ClimateSensor(climate, DHT_PERIOD * 1000, delay_ms=DHT_WARMUP_MS))
+sensors.register(LightSensor(light_sensor, LIGHT_SAMPLE_RATE, LIGHT_RING_SIZE,
+                             LIGHT_MEDIAN, LIGHT_DRAIN_PERIOD * 1000))
+sensors.register(ChipTemperature(ADC(ChipTemperature.CHANNEL), CHIP_TEMP_PERIOD * 1000))
+
+# Reading reused every cycle so the hot loop does not allocate
+current_reading = Reading()
+hot_path_probe = AllocProbe("collect+display")
+SEPARATOR = "=" * 50
+
+# Per-stage latency histograms, memory watermarks and failure counters,
+# published to stations/<id>/metrics every METRICS_INTERVAL seconds
+STATION_ID = getattr(keys, "STATION_ID", None) or binascii.hexlify(machine.unique_id()).decode()
+METRICS_INTERVAL = 600
+metrics = Metrics()
+
+# Garbage collection by allocation budget instead of every cycle, with
+# largest-free-block tracking (memory.py). Under memory pressure the
+# station sheds optional work: smaller replay batches, no latest_reading
+# write, and at CRITICAL no control stream or metrics.
+memory = MemoryManager(largest_needed=firebase_client.TLS_HEAP, timer=metrics.stage("gc"))
+firebase_client.reserve = memory.ensure
+memory_level = OK                    # Pressure level the shedding was set for
+
+# Cold start: overlap WiFi association with DHT11 warm-up and the first
+# reading instead of connecting, syncing and then measuring in turn
+FAST_START = True
+WIFI_TIMEOUT_MS = 20000
+NTP_HOST = "pool.ntp.org"
+ntp_failed = False                   # Last sync failed: look NTP_HOST up again
+
+# DNS answers survive reboots in flash; connects skip the lookup
+dns_cache = startup.DnsCache()
+firebase_client.resolver = dns_cache.resolve
+
+# Firebase setup - reuse one keep-alive connection for all uploads.
+# Set GATEWAY_URL in keys.py (e.g. "http://192.168.1.10:8080") to send
+# through a LAN gateway (gateway.py) instead of straight to Firebase
+GATEWAY_URL = getattr(keys, "GATEWAY_URL", None)
+firebase = FirebaseClient(keep_alive=True, metrics=metrics, url=GATEWAY_URL,
+                          station_id=STATION_ID if GATEWAY_URL else None)
+
+# Write history entry and latest_reading in one multi-path PATCH
+BATCHED_UPLOAD = True
+
+# Send readings in the compact schema (compact.py): short keys, scaled
+# integers, no light_level, and delta-encoded batches when replaying the
+# offline queue. Readers must decode with compact.decode_node().
+COMPACT_UPLOAD = False
+
+# Sampling cadence - readings land on wall-clock multiples of the interval
+READING_INTERVAL = 30                # Seconds between readings
+SCHEDULE_POLICY = SKIP               # Drop slots missed during long stalls
+
+# Settings that can be changed at runtime from stations/<id>/control/config.
+# The station listens on stations/<id>/control over a REST event stream;
+# writing e.g. {"reading_interval": 60} there takes effect without a
+# reflash, and null (or deleting a key) restores the default below.
+REMOTE_CONTROL = True
+CONTROL_PATH = f"stations/{STATION_ID}/control"
+CONFIG = {
+    "reading_interval": READING_INTERVAL,
+    # Light bands: level rises when the raw ADC value is above the bound
+    "light_dark": 5000,
+    "light_dim": 15000,
+    "light_bright": 30000,
+    "light_very_bright": 50000,
+    # Weather quality: bad/okay outside these temperature/humidity limits
+    "bad_temp_low": 5,
+    "bad_temp_high": 35,
+    "bad_humidity": 80,
+    "okay_temp_low": 10,
+    "okay_temp_high": 30,
+    "okay_humidity": 70,
+}
+CONFIG_DEFAULTS = dict(CONFIG)
+CONFIG_LIMITS = {                    # Accepted (min, max) per key
+    "reading_interval": (5, 3600),
+    "light_dark": (0, 65535),
+    "light_dim": (0, 65535),
+    "light_bright": (0, 65535),
+    "light_very_bright": (0, 65535),
+    "bad_temp_low": (-40, 60),
+    "bad_temp_high": (-40, 60),
+    "bad_humidity": (0, 100),
+    "okay_temp_low": (-40, 60),
+    "okay_temp_high": (-40, 60),
+    "okay_humidity": (0, 100),
+}
+COMMANDS = ("sync_time", "publish_metrics", "flush_queue")
+pending_command = None
+control_stream = None
+
+# Report-by-exception: only upload readings that changed noticeably
+DEADBAND_ENABLED = True
+DEADBAND_THRESHOLDS = {
+    "temperature": 1,                # Degrees C
+    "humidity": 2,                   # Percent
+    "light_raw": 3000,               # ADC counts
+}
+DEADBAND_LABELS = ("light_level",)   # Upload whenever the label changes
+HEARTBEAT_INTERVAL = 600             # Upload at least every 10 minutes
+deadband = DeadbandFilter(DEADBAND_THRESHOLDS, DEADBAND_LABELS, HEARTBEAT_INTERVAL)
+
+# Minute/hour/day min/max/mean rollups published under rollups/<window>/,
+# loaded from flash by start_rollups() once the first reading is out
+ROLLUP_FILE = "rollups.json"
+ROLLUP_FLUSH_PENDING = 5             # Publish on their own once this many wait
+ROLLUP_SAVE_EVERY = 20               # Readings between saves (plus hour/day closes)
+rollups = None
+
+# Offline store-and-forward queue for readings that could not be uploaded
+QUEUE_FILE = "queue.bin"
+QUEUE_CAPACITY = 2880                # One day of readings at 30 s
+QUEUE_WRITE_BATCH = 4                # Readings buffered per flash write
+QUEUE_DRAIN_BATCH = 50               # Readings per bulk upload on reconnect
+QUEUE_DRAIN_BATCH_LOW = 10           # The same under memory pressure
+QUEUE_DRAIN_REQUESTS = 2             # Bulk uploads per cycle at most
+offline_queue = OfflineQueue(QUEUE_FILE, QUEUE_CAPACITY, QUEUE_WRITE_BATCH,
+                             sensors.queue_fields())
+
+# WiFi link manager (wifi_link.py): rejoins a lost link with a growing,
+# jittered backoff and tracks link-up time, outages and RSSI
+WIFI_POWER_MODE = wifi_link.PM_NONE  # PM_PERFORMANCE/PM_POWERSAVE save power, add latency
+WIFI_MIN_BACKOFF_MS = 1000
+WIFI_MAX_BACKOFF_MS = 60000          # Retry a missing AP at least every minute
+link = LinkManager(network.WLAN(network.STA_IF), keys.WIFI_SSID, keys.WIFI_PASS,
+                   WIFI_TIMEOUT_MS, WIFI_MIN_BACKOFF_MS, WIFI_MAX_BACKOFF_MS, WIFI_POWER_MODE)
+
+# Radio power policy: with RADIO_OFF_BETWEEN_UPLOADS the radio is
+# powered down between uploads. Readings wait in the offline queue and
+# go out in one batch every UPLOAD_EVERY readings; the radio is powered
+# up RADIO_LEAD_TIME seconds before that slot so the link is ready.
+RADIO_OFF_BETWEEN_UPLOADS = False
+UPLOAD_EVERY = 10                    # Readings per upload with the radio off
+RADIO_LEAD_TIME = 5                  # Seconds
 
 
 def sync_time_with_ntp():
     """Synchronize time with NTP server"""
+    global ntp_failed
     try:
         print("Synchronizing time with NTP server...")
+        try:
+            # Cached address: no DNS round trip before the first sync
+            ntptime.host = dns_cache.resolve(NTP_HOST, 123, ntp_failed)[0]
+        except OSError:
+            ntptime.host = NTP_HOST
         ntptime.settime()
+        ntp_failed = False
+        startup.save_time()
         current_time = time.localtime()
         print(
             f"Time synchronized successfully! Current time: {current_time[0]}-{current_time[1]:02d}-{current_time[2]:02d} {current_time[3]:02d}:{current_time[4]:02d}:{current_time[5]:02d}")
         return True
     except Exception as e:
         print(f"Time sync failed: {e}")
+        metrics.fail("ntp")
+        ntp_failed = True
         return False
 
 
 def check_wifi_connection():
-    """Check if WiFi is connected"""
-    wlan = network.WLAN(network.STA_IF)
-    if wlan.isconnected():
-        print(f"WiFi connected - IP: {wlan.ifconfig()[0]}")
+    """Check if WiFi is connected (and move the reconnect along if not)"""
+    if link.poll():
+        print(f"WiFi connected - IP: {link.wlan.ifconfig()[0]} ({link.rssi} dBm)")
         return True
     else:
-        print("WiFi not connected")
+        print(f"WiFi not connected ({link.state})")
         return False
 
 
 def get_light_level(raw_value):
     """Convert raw ADC reading to descriptive light level"""
-    if raw_value > 50000:
+    if raw_value > CONFIG["light_very_bright"]:
         return "Very Bright"
-    elif raw_value > 30000:
+    elif raw_value > CONFIG["light_bright"]:
         return "Bright"
-    elif raw_value > 15000:
+    elif raw_value > CONFIG["light_dim"]:
         return "Dim"
-    elif raw_value > 5000:
+    elif raw_value > CONFIG["light_dark"]:
         return "Dark"
     else:
         return "Very Dark"
@@ -73,13 +262,13 @@ def get_weather_description(temp, humidity):
 
 def get_weather_quality(temp, humidity):
     """Determine if weather is nice, okay, or bad"""
-    if temp < 5 or temp > 35:  # Too cold or too hot
+    if temp < CONFIG["bad_temp_low"] or temp > CONFIG["bad_temp_high"]:  # Too cold or too hot
         return "bad"
-    elif humidity > 80:  # Too humid
+    elif humidity > CONFIG["bad_humidity"]:  # Too humid
         return "bad"
-    elif temp < 10 or temp > 30:  # Somewhat uncomfortable
+    elif temp < CONFIG["okay_temp_low"] or temp > CONFIG["okay_temp_high"]:  # Somewhat uncomfortable
         return "okay"
-    elif humidity > 70:  # Somewhat humid
+    elif humidity > CONFIG["okay_humidity"]:  # Somewhat humid
         return "okay"
     else:  # Comfortable temperature and humidity
         return "nice"
@@ -101,42 +290,53 @@ def set_weather_leds(weather_quality):
         GREEN.on()
 
 
-def collect_sensor_data():
-    """Collect data from all sensors and format for Firebase"""
-    try:
-        # Read DHT11 sensor
-        dht_sensor.measure()
-        temperature = dht_sensor.temperature()
-        humidity = dht_sensor.humidity()
-
-        # Read light sensor
-        light_raw = light_sensor.read_u16()
-        light_level = get_light_level(light_raw)
-
-        # Get weather quality for LED control (not stored in data)
-        weather_quality = get_weather_quality(temperature, humidity)
-
-        # Set LED indicators based on weather quality
-        set_weather_leds(weather_quality)
-
-        # Create clean data structure for Firebase (only essential sensor data)
-        data = {
-            "timestamp": int(time.time()),
-            "temperature": temperature,
-            "humidity": humidity,
-            "light_raw": light_raw,
-            "light_level": light_level
-        }
-
-        return data
-
-    except OSError as e:
-        print(f"Sensor error: {e}")
-        return None
-    except Exception as e:
-        print(f"Data collection error: {e}")
+def collect_sensor_data(timestamp=None):
+    """Collect data from all sensors, update LEDs and format for Firebase
+
+    Returns the shared current_reading (refilled every call) or None.
+    """
+    if not read_into(current_reading, timestamp):
         return None
 
+    if current_reading.temperature is not None:
+        with metrics.stage("classify"):
+            # Get weather quality for LED control (not stored in data)
+            weather_quality = get_weather_quality(current_reading.temperature, current_reading.humidity)
+
+            # Set LED indicators based on weather quality
+            set_weather_leds(weather_quality)
+    return current_reading
+
+
+def read_sensor_data(timestamp=None):
+    """Read all sensors into a new dict (LEDs untouched)"""
+    reading = Reading()
+    if read_into(reading, timestamp):
+        return reading.as_dict()
+    return None
+
+
+def read_into(reading, timestamp=None):
+    """Fill a Reading in place from the sensors; return True on success
+
+    timestamp is the scheduled slot time; defaults to the current time.
+    Each registered sensor fills its own fields from its latest sample,
+    so a failed sensor leaves only its fields None (the DHT11 keeps its
+    last good values while they are recent enough).
+    """
+    with metrics.stage("sensor"):
+        filled = sensors.fill(reading)
+    for sensor in sensors.sensors:
+        if sensor.failed:
+            metrics.fail(sensor.name)
+    if not filled:
+        metrics.fail("sensor")
+        return False
+    raw = reading.light_raw
+    reading.light_level = None if raw is None else get_light_level(raw)
+    reading.timestamp = int(time.time() if timestamp is None else timestamp)
+    return True
+
 
 def get_led_status():
     """Get current LED status for display"""
@@ -156,15 +356,20 @@ def display_data(data):
         print("Failed to read sensors")
         return
 
-    print("\n" + "="*50)
+    # Print values as separate arguments so no strings are built per cycle
+    print()
+    print(SEPARATOR)
     print("WEATHER STATION DATA")
-    print("="*50)
-    print(f"Temperature: {data['temperature']}C")
-    print(f"Humidity: {data['humidity']}%")
-    print(f"Light Level: {data['light_level']} ({data['light_raw']})")
-    print(f"LED Status: {get_led_status()}")
-    print(f"Timestamp: {data['timestamp']}")
-    print("="*50)
+    print(SEPARATOR)
+    print("Temperature: ", data["temperature"], "C", sep="")
+    print("Humidity: ", data["humidity"], "%", sep="")
+    print("Light Level: ", data["light_level"], " (", data["light_raw"], ")", sep="")
+    print("Light Window: ", data["light_min"], "-", data["light_max"],
+          " (std ", data["light_std"], ")", sep="")
+    print("Chip Temperature: ", data["chip_temperature"], "C", sep="")
+    print("LED Status:", get_led_status())
+    print("Timestamp:", data["timestamp"])
+    print(SEPARATOR)
 
 
 def upload_to_firebase(data):
@@ -175,7 +380,7 @@ def upload_to_firebase(data):
 
     try:
         print("Uploading to Firebase...")
-        success, message = firebase.push("weather_readings", data)
+        success, message = firebase.push("weather_readings", wire(data))
 
         if success:
             print("Data uploaded successfully!")
@@ -195,7 +400,7 @@ def upload_latest_reading(data):
         return False
 
     try:
-        success, message = firebase.set("latest_reading", data)
+        success, message = firebase.set("latest_reading", wire(data))
         if success:
             print("Latest reading updated")
             return True
@@ -207,76 +412,558 @@ def upload_latest_reading(data):
         return False
 
 
+def upload_reading(data):
+    """Upload history entry and latest reading in one atomic request"""
+    if data is None:
+        print("No data to upload")
+        return False
+
+    try:
+        print("Uploading to Firebase...")
+        key = firebase.generate_push_key()
+        # Finished rollup windows ride along with the reading
+        pending = rollups.pending() if rollups is not None else {}
+        record = wire(data)
+        values = {f"weather_readings/{key}": record}
+        if memory.pressure == OK:
+            values["latest_reading"] = record
+        values.update(pending)
+        with metrics.stage("upload"):
+            success, message = firebase.update("", values)
+
+        if success:
+            print("Data and latest reading uploaded successfully!")
+            if pending:
+                rollups.published(pending)
+            return True
+        else:
+            print(f"Upload failed: {message}")
+            metrics.fail("upload")
+            return False
+
+    except Exception as e:
+        print(f"Firebase upload error: {e}")
+        return False
+
+
+def start_rollups():
+    """Load the rollup state (imported here to keep it out of boot)"""
+    global rollups
+    if rollups is None:
+        from rollups import Rollups
+        rollups = Rollups(ROLLUP_FILE, save_every=ROLLUP_SAVE_EVERY)
+    return rollups
+
+
+def upload_rollups(minimum=1):
+    """Publish pending rollups on their own once at least minimum wait"""
+    pending = rollups.pending()
+    if len(pending) < minimum:
+        return False
+
+    try:
+        with metrics.stage("rollups"):
+            success, message = firebase.update("", pending)
+        if success:
+            rollups.published(pending)
+            print(f"Published {len(pending)} rollup(s)")
+            return True
+        else:
+            print(f"Rollup upload failed: {message}")
+            metrics.fail("rollups")
+            return False
+    except Exception as e:
+        print(f"Rollup upload error: {e}")
+        return False
+
+
+def wire(reading):
+    """The reading as it is sent: compact if COMPACT_UPLOAD is set"""
+    if COMPACT_UPLOAD:
+        import compact
+        return compact.encode_reading(reading)
+    return reading
+
+
+def history_paths(readings):
+    """Map readings to weather_readings/<key> paths for a multi-path write"""
+    if COMPACT_UPLOAD:
+        import compact
+        # One delta-encoded batch, keyed by its first reading's time
+        key = firebase.generate_push_key(readings[0]["timestamp"] * 1000)
+        return {f"weather_readings/{key}": compact.encode_batch(readings)}
+    values = {}
+    for reading in readings:
+        if "light_level" not in reading and reading["light_raw"] is not None:
+            # Queued records leave out light_level
+            reading["light_level"] = get_light_level(reading["light_raw"])
+        key = firebase.generate_push_key(reading["timestamp"] * 1000)
+        values[f"weather_readings/{key}"] = reading
+    return values
+
+
+def drain_batch():
+    """Readings per replay request: fewer (smaller JSON) under memory pressure"""
+    return QUEUE_DRAIN_BATCH if memory.pressure == OK else QUEUE_DRAIN_BATCH_LOW
+
+
+def apply_memory_pressure():
+    """Shed optional work when the heap runs short, restore it once it recovers"""
+    global memory_level
+    level = memory.pressure
+    if level == memory_level:
+        return level
+    print(f"Memory pressure {memory_level} -> {level}: {memory.free_after} bytes free, "
+          f"largest block {memory.largest_free}")
+    if level >= LOW:
+        # Replays grow the encode buffers; give that memory back
+        firebase.writer.shrink()
+        if firebase.async_writer is not None:
+            firebase.async_writer.shrink()
+    if level == CRITICAL and control_stream is not None:
+        # The stream's TLS session is the largest optional allocation
+        control_stream.close()
+    memory_level = level
+    return level
+
+
+def drain_offline_queue():
+    """Replay queued readings as a few bulk multi-path writes"""
+    sent = 0
+    for _ in range(QUEUE_DRAIN_REQUESTS):
+        readings = offline_queue.peek(drain_batch())
+        if not readings:
+            break
+
+        with metrics.stage("replay"):
+            success, message = firebase.update("", history_paths(readings))
+        if not success:
+            print(f"Queue replay failed: {message}")
+            metrics.fail("replay")
+            break
+
+        offline_queue.pop(len(readings))
+        sent += len(readings)
+
+    if sent:
+        print(f"Replayed {sent} queued readings ({offline_queue.depth()} left)")
+    return sent
+
+
+def set_config(key, value):
+    """Apply one config value; None restores the default"""
+    if key not in CONFIG:
+        print(f"Config: unknown key {key}")
+        return False
+    if value is None:
+        value = CONFIG_DEFAULTS[key]
+    low, high = CONFIG_LIMITS[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        print(f"Config: rejected {key}={value}")
+        return False
+    if CONFIG[key] != value:
+        CONFIG[key] = value
+        print(f"Config: {key} = {value}")
+    return True
+
+
+def replace_config(values):
+    """Apply a whole config node; keys it lacks go back to their defaults"""
+    if not isinstance(values, dict):
+        values = {}
+    for key in CONFIG:
+        set_config(key, values.get(key))
+    for key in values:
+        if key not in CONFIG:
+            print(f"Config: unknown key {key}")
+
+
+def handle_control_event(event, path, data):
+    """Apply a put/patch event from the control stream.
+
+    Paths are relative to CONTROL_PATH: "/" (the whole node),
+    "/config", "/config/<key>" or "/command". A patch carries the
+    children to update, which are applied as puts one by one.
+    """
+    global pending_command
+    if event == "patch":
+        if isinstance(data, dict):
+            base = path.rstrip("/")
+            for key, value in data.items():
+                handle_control_event("put", base + "/" + key, value)
+        return
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        node = data if isinstance(data, dict) else {}
+        replace_config(node.get("config"))
+        handle_control_event("put", "/command", node.get("command"))
+    elif parts[0] == "config":
+        if len(parts) == 1:
+            replace_config(data)
+        elif len(parts) == 2:
+            set_config(parts[1], data)
+    elif parts[0] == "command" and len(parts) == 1:
+        if data is None or data in COMMANDS:
+            pending_command = data
+        else:
+            print(f"Control: unknown command {data}")
+
+
+def start_control_stream():
+    """Open the control stream (it connects on its first poll)"""
+    global control_stream
+    if REMOTE_CONTROL and control_stream is None:
+        # Streams go straight to Firebase; the gateway only relays requests
+        control_stream = firebase.stream(CONTROL_PATH, handle_control_event,
+                                         base_url=keys.FIREBASE_URL if GATEWAY_URL else None)
+    return control_stream
+
+
+def poll_control():
+    """Process waiting control events; safe to call often"""
+    if control_stream is not None and memory.pressure < CRITICAL:
+        control_stream.poll()
+
+
+def run_pending_command(schedule=None):
+    """Run a command received over the control stream, then clear it"""
+    global pending_command
+    command = pending_command
+    if command is None:
+        return None
+    pending_command = None
+    print(f"Control: running {command}")
+    if command == "sync_time":
+        if sync_time_with_ntp() and schedule is not None:
+            schedule.realign()
+    elif command == "publish_metrics":
+        publish_metrics()
+    elif command == "flush_queue":
+        offline_queue.flush()
+    # Clear it so a reconnect does not run it again
+    success, message = firebase.update(CONTROL_PATH, {"command": None})
+    if not success:
+        print(f"Control: could not clear command: {message}")
+    return command
+
+
+def should_upload(data):
+    """Apply the deadband filter (if enabled) to a reading"""
+    if not DEADBAND_ENABLED:
+        return True
+    return deadband.check(data)
+
+
+def metrics_snapshot():
+    """Metrics snapshot with the state of every subsystem"""
+    snapshot = metrics.snapshot(int(time.time()))
+    snapshot["queue_depth"] = offline_queue.depth()
+    snapshot["deadband"] = deadband.stats()
+    snapshot["connection"] = firebase.connection_stats()
+    snapshot["dht"] = climate.stats()
+    snapshot["sensors"] = sensors.stats()
+    snapshot["boot"] = boot.report()
+    snapshot["wifi"] = link.stats()
+    snapshot["gc"] = memory.stats()
+    return snapshot
+
+
+def publish_metrics():
+    """Write a compact metrics snapshot to stations/<id>/metrics"""
+    success, message = firebase.set(f"stations/{STATION_ID}/metrics", metrics_snapshot())
+    if success:
+        print("Metrics published")
+    else:
+        print(f"Metrics publish failed: {message}")
+    return success
+
+
+def radio_sleep():
+    """Drop the connections and power the radio down until the next upload"""
+    firebase.close()
+    if control_stream is not None:
+        control_stream.close()
+    link.sleep()
+
+
+def fast_start():
+    """Bring up WiFi, sensors and the clock in parallel; return the first reading.
+
+    The radio associates in the background (boot.py only starts it)
+    while the sensors start, the DHT11 warms up and the first
+    reading is taken. Its timestamp is corrected once NTP answers.
+    Returns (reading dict or None, synced).
+    """
+    boot.mark("main")
+    if startup.restore_time():
+        print("Clock set from the flash time cache until NTP answers")
+
+    link.start()
+    sensors.start()
+
+    # First reading while WiFi associates
+    startup.wait_until(DHT_WARMUP_MS, idle=sensors.poll)
+    taken = ticks_ms()
+    first = collect_sensor_data()
+    if first is not None:
+        first = first.as_dict()
+        boot.mark("first_reading")
+
+    if link.wait_up(WIFI_TIMEOUT_MS, idle=sensors.poll):
+        boot.mark("wifi")
+    else:
+        print("WiFi not connected yet - continuing")
+    with metrics.stage("ntp"):
+        synced = sync_time_with_ntp()
+    if synced:
+        boot.mark("ntp")
+    if first is not None:
+        # Taken before the clock was set: date it from the tick count
+        first["timestamp"] = int(time.time() - ticks_diff(ticks_ms(), taken) / 1000)
+    return first, synced
+
+
+def boot_report():
+    """Mark the first upload and print the boot milestones; return them"""
+    boot.mark("first_upload")
+    boot.reported = True
+    report = boot.report()
+    print(f"Time to first upload: {report['first_upload_ms']} ms {report}")
+    return report
+
+
+def report_boot():
+    """Print and publish the boot milestones once the first upload is done"""
+    success, message = firebase.update(f"stations/{STATION_ID}", {"boot": boot_report()})
+    if not success:
+        print(f"Boot report failed: {message}")
+
+
+def measure_hot_path(cycles=5):
+    """Bytes allocated per collect -> classify -> LED -> encode cycle"""
+    probe = AllocProbe("hot path")
+    for _ in range(cycles):
+        with probe:
+            reading = collect_sensor_data()
+            if reading is not None:
+                firebase.writer.encode(reading)
+        time.sleep(1)                    # DHT11 needs ~1 s between reads
+    return probe.stats()
+
+
 def main():
     """Main loop - collect and upload weather data every 30 seconds"""
     print("Weather Station Starting...")
     print("Hardware data collection mode")
     print("Firebase integration enabled")
     print("LED Weather Indicators: GREEN Nice | YELLOW Okay | RED Bad")
-    print("Collecting and uploading data every 30 seconds...")
+    print(f"Collecting and uploading data every {CONFIG['reading_interval']} seconds...")
 
     reading_count = 0
+    readings_since_upload = 0
+    first = None
 
-    # Synchronize time with NTP server at startup
-    sync_time_with_ntp()
+    if FAST_START:
+        first, _ = fast_start()
+    else:
+        # boot.py has connected already; the link manager takes over
+        link.start()
+        # Synchronize time with NTP server at startup
+        with metrics.stage("ntp"):
+            sync_time_with_ntp()
 
     # Keep track of last sync time for periodic resync
     last_sync_time = time.time()
+    last_metrics_time = last_sync_time
+
+    # Schedule slots from the synchronized wall clock
+    schedule = DeadlineScheduler(CONFIG["reading_interval"], SCHEDULE_POLICY)
+
+    sensors.start()
+
+    if first is not None:
+        # Upload the reading taken during start-up right away
+        reading_count += 1
+        should_upload(first)
+        if upload_reading(first):
+            report_boot()
+        else:
+            offline_queue.push(first)
+
+    # Rollups and the control stream are only set up after that upload
+    start_rollups()
+    if first is not None:
+        rollups.add(first)
+        first = None
+
+    # Remote config/commands arrive over a stream polled while waiting
+    start_control_stream()
+
+    if RADIO_OFF_BETWEEN_UPLOADS:
+        radio_sleep()
+
+    def idle():
+        # Runs while waiting for the next slot, when a sensor is due and
+        # about once a second while the radio is on; returns the ms to
+        # sleep until it is needed again
+        remaining = schedule.remaining_ms()
+        sensors.poll(remaining)
+        memory.maybe_collect()
+        upload_next = RADIO_OFF_BETWEEN_UPLOADS and readings_since_upload + 1 >= UPLOAD_EVERY
+        if link.poll():
+            poll_control()
+        elif upload_next and remaining <= RADIO_LEAD_TIME * 1000:
+            # The next slot uploads: power the radio up ahead of it
+            link.start()
+        schedule.set_period(CONFIG["reading_interval"])
+
+        wake = sensors.next_ms(schedule.remaining_ms())
+        if wake is None:
+            wake = IDLE_POLL_MS
+        if link.state != wifi_link.OFF:
+            wake = min(wake, IDLE_POLL_MS)
+        elif upload_next:
+            wake = min(wake, max(1, schedule.remaining_ms() - RADIO_LEAD_TIME * 1000))
+        return wake
 
     while True:
         try:
+            # Wait for the next aligned slot (no drift from work time)
+            slot_time = schedule.wait(idle)
+            run_pending_command(schedule)
+
             reading_count += 1
+            readings_since_upload += 1
             print(f"\n--- Reading #{reading_count} ---")
 
+            # Upload this slot? With the radio policy only every
+            # UPLOAD_EVERY readings; either way only with a link
+            upload_slot = not RADIO_OFF_BETWEEN_UPLOADS or readings_since_upload >= UPLOAD_EVERY
+            online = link.poll()
+            if upload_slot and not online and RADIO_OFF_BETWEEN_UPLOADS:
+                online = link.wait_up(WIFI_TIMEOUT_MS, idle=sensors.poll)
+            online = online and upload_slot
+
             # Resync time every hour (3600 seconds) to maintain accuracy
             current_time = time.time()
-            if current_time - last_sync_time > 3600:
+            if online and current_time - last_sync_time > 3600:
                 print("Periodic time sync (hourly)...")
-                if sync_time_with_ntp():
+                with metrics.stage("ntp"):
+                    synced = sync_time_with_ntp()
+                if synced:
                     last_sync_time = current_time
+                    schedule.realign()
+
+            with hot_path_probe:
+                # Collect sensor data
+                sensor_data = collect_sensor_data(slot_time)
+
+                # Display data locally
+                display_data(sensor_data)
+            print("Hot path allocated:", hot_path_probe.last, "bytes")
 
-            # Collect sensor data
-            sensor_data = collect_sensor_data()
+            # Every reading counts towards the rollups, even unsent ones
+            if sensor_data:
+                rollups.add(sensor_data)
 
-            # Display data locally
-            display_data(sensor_data)
+            if sensor_data and not should_upload(sensor_data):
+                stats = deadband.stats()
+                print(f"No significant change - upload skipped ({stats['suppressed']} skipped, {stats['sent']} sent)")
+                sensor_data = None
+
+            upload_success = None
+            if sensor_data and not online:
+                offline_queue.push(sensor_data)
+                reason = "link down" if upload_slot else "radio off"
+                print(f"Not uploading ({reason}) - reading queued ({offline_queue.depth()} waiting)")
+                sensor_data = None
 
             if sensor_data:
-                # Upload to Firebase (historical data)
-                upload_success = upload_to_firebase(sensor_data)
+                if BATCHED_UPLOAD:
+                    # History entry + latest reading in a single round trip
+                    upload_success = upload_reading(sensor_data)
+                else:
+                    # Upload to Firebase (historical data)
+                    upload_success = upload_to_firebase(sensor_data)
 
-                # Update latest reading for real-time access
-                upload_latest_reading(sensor_data)
+                    # Update latest reading for real-time access
+                    upload_latest_reading(sensor_data)
 
                 if upload_success:
                     print("Data successfully uploaded to Firebase!")
+                    if not boot.reported:
+                        report_boot()
                 else:
-                    print("Upload failed - data displayed locally only")
+                    offline_queue.push(sensor_data)
+                    print(f"Upload failed - reading queued ({offline_queue.depth()} waiting)")
 
                 # Clear sensor data from memory after upload attempt
                 sensor_data = None
 
-            # Force garbage collection to free up RAM
-            gc.collect()
+            if online and upload_success is not False:
+                # Connection is there - send anything stored while offline
+                if offline_queue.depth():
+                    drain_offline_queue()
+
+                # Rollups piggyback on reading uploads; send them alone if
+                # readings are being suppressed or uploaded separately
+                upload_rollups(1 if RADIO_OFF_BETWEEN_UPLOADS or not BATCHED_UPLOAD
+                               else ROLLUP_FLUSH_PENDING)
+
+            # Report how often the keep-alive connection was reused
+            stats = firebase.connection_stats()
+            if stats:
+                print(f"Connection: {stats['reused']} reused, {stats['reconnects']} reconnects")
+
+            # Collect only once this cycle's budget is used up
+            metrics.sample_memory()
+            memory.cycle()
+            metrics.sample_memory()
+            apply_memory_pressure()
 
             # Print memory usage for monitoring
-            print(f"Free memory: {gc.mem_free()} bytes")
+            print(f"Free memory: {gc.mem_free()} bytes (gc budget {memory.budget}, "
+                  f"largest block {memory.largest_free})")
+
+            # Publish the metrics snapshot on a slow interval
+            if online and memory.pressure < CRITICAL and current_time - last_metrics_time >= METRICS_INTERVAL:
+                with metrics.stage("metrics"):
+                    publish_metrics()
+                last_metrics_time = current_time
+
+            if RADIO_OFF_BETWEEN_UPLOADS and online:
+                readings_since_upload = 0
+                radio_sleep()
+            elif not RADIO_OFF_BETWEEN_UPLOADS:
+                readings_since_upload = 0
 
-            # Wait 30 seconds before next reading
-            print("Waiting 30 seconds until next reading...")
-            time.sleep(30)
+            # Report how far the last slot fired from its deadline
+            stats = schedule.stats()
+            print(f"Schedule jitter: {stats['last_jitter_ms']} ms (max {stats['max_jitter_ms']} ms, {stats['skipped']} skipped)")
 
         except KeyboardInterrupt:
             print("\nWeather Station Stopped")
+            if control_stream is not None:
+                control_stream.close()
+            sensors.stop()
+            # Keep buffered readings for the next start
+            offline_queue.flush()
+            rollups.flush()
             # Turn off all LEDs
             RED.off()
             YELLOW.off()
             GREEN.off()
             print(f"Total readings taken: {reading_count}")
             break
+        except MemoryError:
+            # Drop this cycle's data, collect and shed work instead of crashing
+            sensor_data = None
+            memory.memory_error()
+            apply_memory_pressure()
+            print(f"Out of memory - {gc.mem_free()} bytes free after collecting")
         except Exception as e:
+            # The scheduler paces the retry at the next slot
             print(f"Error: {e}")
-            time.sleep(30)
 
 
 # Run the weather station
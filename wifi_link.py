@@ -0,0 +1,209 @@
+import random
+from scheduler import ticks_ms, ticks_diff, ticks_add, sleep_ms
+
+# Link states
+OFF = "off"                          # Radio powered down by the power policy
+DOWN = "down"                        # Waiting out the backoff before retrying
+CONNECTING = "connecting"
+UP = "up"
+
+# network.WLAN status codes (CYW43)
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+
+# CYW43 power management modes for wlan.config(pm=...)
+PM_NONE = 0xa11140                   # Always awake: lowest latency
+PM_PERFORMANCE = 0xa11142            # Sleeps between beacons when idle
+PM_POWERSAVE = 0xa11c82              # Sleeps longest, slowest to respond
+
+
+class LinkManager:
+    """WiFi station link kept up by a non-blocking state machine.
+
+    poll() checks the link and moves it along; it never sleeps, so it
+    can run between readings. A lost link is rejoined at once, then
+    after a jittered backoff that starts at min_backoff_ms and doubles
+    up to max_backoff_ms while attempts keep failing. An attempt fails
+    on a negative status (wrong password, no AP) or after
+    connect_timeout_ms. sleep() powers the radio down for the power
+    policy and start() brings it back.
+
+    Metrics: link_ms is the time from asking for the link (start() or
+    a loss) until it is up, outage_ms how long an unplanned loss lasted,
+    and radio_on_ms how long the radio has been powered.
+    """
+
+    def __init__(self, wlan, ssid, password, connect_timeout_ms=20000,
+                 min_backoff_ms=1000, max_backoff_ms=60000, pm=PM_NONE):
+        self.wlan = wlan
+        self.ssid = ssid
+        self.password = password
+        self.connect_timeout_ms = connect_timeout_ms
+        self.min_backoff_ms = min_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.pm = pm
+
+        now = ticks_ms()
+        self.state = DOWN
+        self.status = None               # Last wlan.status()
+        self.rssi = None                 # dBm, updated while up
+        self._since = now                # Ticks the current attempt started
+        self._retry_at = now
+        self._backoff = 0
+        self._wanted_at = now            # Ticks the link was asked for
+        self._lost_at = None             # Ticks of an unplanned loss
+        self._on_at = now                # Ticks the radio was powered (None = off)
+
+        # Counters for monitoring
+        self.attempts = 0
+        self.failures = 0
+        self.outages = 0
+        self.ups = 0
+        self.last_link_ms = None
+        self.max_link_ms = 0
+        self.total_link_ms = 0
+        self.last_outage_ms = 0
+        self.max_outage_ms = 0
+        self.total_outage_ms = 0
+        self.radio_on_ms = 0
+
+    def is_up(self):
+        return self.state == UP
+
+    def start(self):
+        """Ask for the link; returns at once (poll() or wait_up() follow it)"""
+        if self.state in (UP, CONNECTING):
+            return
+        now = ticks_ms()
+        if self.state == OFF:
+            self._on_at = now
+        self._wanted_at = now
+        self._backoff = 0
+        if self.wlan.isconnected():
+            self._up(now)
+        elif self.wlan.status() == STAT_CONNECTING:
+            # Already joining (started in boot.py): follow that attempt
+            self.attempts += 1
+            self._since = now
+            self.state = CONNECTING
+        else:
+            self._connect(now)
+
+    def _connect(self, now):
+        self.wlan.active(True)
+        self.wlan.connect(self.ssid, self.password)
+        self.attempts += 1
+        self._since = now
+        self.state = CONNECTING
+
+    def _up(self, now):
+        self.state = UP
+        self.ups += 1
+        self._backoff = 0
+        self.wlan.config(pm=self.pm)
+        self.rssi = self.wlan.status("rssi")
+        link_ms = ticks_diff(now, self._wanted_at)
+        self.last_link_ms = link_ms
+        self.total_link_ms += link_ms
+        if link_ms > self.max_link_ms:
+            self.max_link_ms = link_ms
+        if self._lost_at is not None:
+            outage = ticks_diff(now, self._lost_at)
+            self._lost_at = None
+            self.last_outage_ms = outage
+            self.total_outage_ms += outage
+            if outage > self.max_outage_ms:
+                self.max_outage_ms = outage
+            print(f"WiFi link back after {outage} ms")
+
+    def _fail(self, now):
+        """Give up on this attempt and wait a jittered backoff"""
+        self.failures += 1
+        self.wlan.disconnect()
+        self._backoff = min(max(self._backoff * 2, self.min_backoff_ms), self.max_backoff_ms)
+        delay = int(self._backoff * (0.5 + random.getrandbits(8) / 256))
+        self._retry_at = ticks_add(now, delay)
+        self.state = DOWN
+        print(f"WiFi connect failed (status {self.status}), retry in {delay} ms")
+
+    def poll(self):
+        """Advance the state machine; return True if the link is up"""
+        if self.state == OFF:
+            return False
+        now = ticks_ms()
+        status = self.wlan.status()
+        self.status = status
+
+        if self.state == UP:
+            if status == STAT_GOT_IP:
+                self.rssi = self.wlan.status("rssi")
+                return True
+            # Lost: rejoin at once, back off only if that fails
+            print(f"WiFi link lost (status {status})")
+            self.outages += 1
+            self._lost_at = now
+            self._wanted_at = now
+            self._connect(now)
+            return False
+
+        if self.state == CONNECTING:
+            if status == STAT_GOT_IP:
+                self._up(now)
+                return True
+            if status < 0 or status == STAT_IDLE or \
+                    ticks_diff(now, self._since) >= self.connect_timeout_ms:
+                self._fail(now)
+            return False
+
+        # DOWN: retry once the backoff has passed
+        if ticks_diff(now, self._retry_at) >= 0:
+            self._connect(now)
+        return False
+
+    def wait_up(self, timeout_ms, idle=None, poll_ms=50):
+        """Poll until the link is up or timeout_ms passes; return is_up().
+
+        Returns as soon as the status changes rather than sleeping in
+        whole seconds. idle() is called between polls.
+        """
+        self.start()
+        start = ticks_ms()
+        while not self.poll():
+            if ticks_diff(ticks_ms(), start) >= timeout_ms:
+                return False
+            if idle is not None:
+                idle()
+            sleep_ms(poll_ms)
+        return True
+
+    def sleep(self):
+        """Power the radio down until the next start()"""
+        if self.state == OFF:
+            return
+        if self._on_at is not None:
+            self.radio_on_ms += ticks_diff(ticks_ms(), self._on_at)
+            self._on_at = None
+        self.wlan.disconnect()
+        self.wlan.active(False)
+        self.state = OFF
+        self._lost_at = None             # Not an outage
+
+    def stats(self):
+        on_ms = self.radio_on_ms
+        if self._on_at is not None:
+            on_ms += ticks_diff(ticks_ms(), self._on_at)
+        return {
+            "state": self.state,
+            "rssi": self.rssi,
+            "attempts": self.attempts,
+            "failures": self.failures,
+            "outages": self.outages,
+            "last_link_ms": self.last_link_ms,
+            "max_link_ms": self.max_link_ms,
+            "avg_link_ms": self.total_link_ms // self.ups if self.ups else None,
+            "last_outage_ms": self.last_outage_ms,
+            "max_outage_ms": self.max_outage_ms,
+            "total_outage_ms": self.total_outage_ms,
+            "radio_on_ms": on_ms,
+        }